@@ -0,0 +1,284 @@
+"""ChromiumTo性能基准测试
+
+生成可复现的模拟目录树（模拟的Chromium应用、较深的干扰目录和会被排除的目录），
+测量扫描、重定向、恢复和备份统计的耗时、文件操作次数、复制字节数和内存峰值，
+结果以JSON输出，并可以与保存的基准结果对比，发现性能退化。
+
+用法：
+    python benchmark.py --apps 20 --output result.json
+    python benchmark.py --baseline result.json --threshold 0.2
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+
+# 模拟内核文件及其真实大小（字节），生成时按比例缩小
+KERNEL_FILE_SIZES = {
+    'chrome.dll': 200 * 1024 * 1024,
+    'chrome_elf.dll': 1536 * 1024,
+    'chrome.exe': 2560 * 1024,
+    'icudtl.dat': 10 * 1024 * 1024,
+    'resources.pak': 12 * 1024 * 1024,
+    'chrome_100_percent.pak': 800 * 1024,
+    'chrome_200_percent.pak': 1200 * 1024,
+    'v8_context_snapshot.bin': 640 * 1024,
+    'snapshot_blob.bin': 300 * 1024,
+    'libEGL.dll': 500 * 1024,
+    'libGLESv2.dll': 7 * 1024 * 1024,
+    'locales/en-US.pak': 500 * 1024,
+    'locales/zh-CN.pak': 450 * 1024,
+    'locales/de.pak': 520 * 1024,
+    'swiftshader/libEGL.dll': 400 * 1024,
+    'swiftshader/libGLESv2.dll': 3 * 1024 * 1024,
+}
+
+# 快速扫描使用的环境变量，指向模拟目录树中的子目录
+QUICK_SCAN_ENV = {
+    'ProgramFiles': 'Program Files',
+    'ProgramFiles(x86)': 'Program Files (x86)',
+    'LOCALAPPDATA': os.path.join('Users', 'bench', 'AppData', 'Local'),
+    'APPDATA': os.path.join('Users', 'bench', 'AppData', 'Roaming'),
+}
+
+# 文件操作计数，通过审计钩子统计
+file_operation_stats = {
+    'enabled': False,
+    'operations': {},
+    'bytes_copied': 0,
+}
+
+# 计入文件操作的审计事件
+FILE_AUDIT_EVENTS = {
+    'open', 'os.scandir', 'os.listdir', 'os.remove', 'os.rename', 'os.symlink',
+    'os.link', 'os.mkdir', 'os.rmdir', 'os.truncate', 'shutil.copyfile',
+    'shutil.copytree', 'shutil.rmtree', 'shutil.move',
+}
+
+
+def auditHook(event, args):
+    """统计文件操作次数和复制的字节数"""
+    if not file_operation_stats['enabled'] or event not in FILE_AUDIT_EVENTS:
+        return
+    operations = file_operation_stats['operations']
+    operations[event] = operations.get(event, 0) + 1
+    if event == 'shutil.copyfile':
+        try:
+            file_operation_stats['bytes_copied'] += os.path.getsize(args[0])
+        except OSError:
+            pass
+
+
+def writeFile(path, size):
+    """写入指定大小的文件"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        block = b'\xcc' * min(size, 1024 * 1024)
+        remaining = size
+        while remaining > 0:
+            f.write(block[:remaining])
+            remaining -= len(block)
+
+
+def writeKernel(directory, scale, rng):
+    """在目录中写入一套模拟内核文件"""
+    for name, size in KERNEL_FILE_SIZES.items():
+        writeFile(os.path.join(directory, name), max(1, int(size * scale * rng.uniform(0.9, 1.1))))
+
+
+def writeDecoys(directory, depth, width, rng):
+    """写入较深的干扰目录，其中只有普通文件"""
+    if depth <= 0:
+        return
+    for i in range(width):
+        child = os.path.join(directory, f'decoy_{depth}_{i}')
+        os.makedirs(child, exist_ok=True)
+        for j in range(rng.randint(1, 4)):
+            writeFile(os.path.join(child, f'data_{j}.txt'), rng.randint(16, 512))
+        writeDecoys(child, depth - 1, width, rng)
+
+
+def generateTree(root, apps=20, scale=0.001, decoy_depth=4, decoy_width=3, seed=0):
+    """生成可复现的模拟目录树，返回目录树信息"""
+    rng = random.Random(seed)
+    scan_dirs = [os.path.join(root, relative) for relative in QUICK_SCAN_ENV.values()]
+    app_paths = []
+
+    for i in range(apps):
+        base = scan_dirs[i % len(scan_dirs)]
+        app_path = os.path.join(base, f'Vendor{i}', f'App{i}')
+        writeKernel(app_path, scale, rng)
+        writeFile(os.path.join(app_path, f'app{i}.exe'), rng.randint(1024, 8192))
+        app_paths.append(app_path)
+
+    for base in scan_dirs:
+        writeDecoys(base, decoy_depth, decoy_width, rng)
+
+    # 会被排除的目录，其中的应用不应被全盘扫描发现
+    for excluded in ('Windows', '$Recycle.Bin', os.path.join('Users', 'bench', 'AppData', 'Local', 'Temp')):
+        excluded_path = os.path.join(root, excluded)
+        writeKernel(os.path.join(excluded_path, 'HiddenApp'), scale, rng)
+        writeDecoys(excluded_path, decoy_depth, decoy_width, rng)
+
+    shared_path = os.path.join(root, 'SharedChrome')
+    writeKernel(shared_path, scale, rng)
+
+    return {
+        'root': root,
+        'scan_dirs': scan_dirs,
+        'apps': app_paths,
+        'shared_path': shared_path,
+    }
+
+
+def measure(name, func):
+    """运行一次操作，返回耗时、文件操作次数、复制字节数和内存峰值"""
+    file_operation_stats['operations'] = {}
+    file_operation_stats['bytes_copied'] = 0
+    tracemalloc.start()
+    file_operation_stats['enabled'] = True
+    start = time.perf_counter()
+    try:
+        result = func()
+    finally:
+        wall_time = time.perf_counter() - start
+        file_operation_stats['enabled'] = False
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    operations = dict(file_operation_stats['operations'])
+    return {
+        'name': name,
+        'wall_time': round(wall_time, 6),
+        'file_operations': sum(operations.values()),
+        'operations': operations,
+        'bytes_copied': file_operation_stats['bytes_copied'],
+        'peak_memory': peak_memory,
+        'result': result,
+    }
+
+
+def runBenchmarks(tree):
+    """依次运行各项基准测试"""
+    from config import updateConfig
+    from scanner import quickScan, scanSystem
+    import scanner
+    from redirector import (
+        setSharedChromePath, redirectAppToSharedChrome,
+        restoreAppFromSharedChrome, getBackupDirs
+    )
+
+    for key, relative in QUICK_SCAN_ENV.items():
+        os.environ[key] = os.path.join(tree['root'], relative)
+    # 全盘扫描只扫描模拟目录树
+    scanner.getDiskPartitions = lambda: [tree['root']]
+
+    results = []
+    updateConfig('scan_incremental', False)
+    results.append(measure('quickScan', lambda: len(quickScan())))
+    results.append(measure('scanSystem', lambda: len(scanSystem())))
+    updateConfig('scan_incremental', True)
+    scanSystem()
+    results.append(measure('scanSystem (incremental)', lambda: len(scanSystem())))
+
+    setSharedChromePath(tree['shared_path'])
+    apps = [{'name': os.path.basename(path), 'path': path, 'version': '', 'size': 0} for path in tree['apps']]
+
+    def redirectAll():
+        return sum(1 for app in apps if redirectAppToSharedChrome(app)[0])
+
+    def restoreAll():
+        return sum(1 for app in apps if restoreAppFromSharedChrome(app)[0])
+
+    results.append(measure('redirectAppToSharedChrome', redirectAll))
+    results.append(measure('getBackupDirs', lambda: len(getBackupDirs())))
+    results.append(measure('restoreAppFromSharedChrome', restoreAll))
+    return results
+
+
+def compareWithBaseline(results, baseline, threshold):
+    """与基准结果对比，返回性能退化列表"""
+    baseline_by_name = {item['name']: item for item in baseline.get('results', [])}
+    regressions = []
+    for item in results:
+        previous = baseline_by_name.get(item['name'])
+        if not previous:
+            continue
+        for metric in ('wall_time', 'file_operations', 'bytes_copied', 'peak_memory'):
+            old_value = previous.get(metric, 0)
+            new_value = item.get(metric, 0)
+            if old_value and new_value > old_value * (1 + threshold):
+                regressions.append({
+                    'name': item['name'],
+                    'metric': metric,
+                    'baseline': old_value,
+                    'current': new_value,
+                    'ratio': round(new_value / old_value, 3),
+                })
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='ChromiumTo性能基准测试')
+    parser.add_argument('--apps', type=int, default=20, help='模拟应用数量')
+    parser.add_argument('--scale', type=float, default=0.001, help='内核文件大小相对真实大小的比例')
+    parser.add_argument('--decoy-depth', type=int, default=4, help='干扰目录深度')
+    parser.add_argument('--decoy-width', type=int, default=3, help='干扰目录每层的子目录数')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--workdir', help='生成目录树的位置，默认使用临时目录')
+    parser.add_argument('--keep', action='store_true', help='保留生成的目录树')
+    parser.add_argument('--output', help='结果JSON文件，默认输出到标准输出')
+    parser.add_argument('--baseline', help='用于对比的基准结果JSON文件')
+    parser.add_argument('--threshold', type=float, default=0.2, help='超过基准多少比例视为性能退化')
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='chromiumto-bench-')
+    tree_root = os.path.join(workdir, 'tree')
+    # 使用独立的数据目录，不影响真实配置
+    os.environ['CHROMIUMTO_DATA_DIR'] = os.path.join(workdir, 'appdata')
+
+    sys.addaudithook(auditHook)
+    try:
+        tree = generateTree(tree_root, args.apps, args.scale, args.decoy_depth, args.decoy_width, args.seed)
+        results = runBenchmarks(tree)
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'parameters': {
+            'apps': args.apps,
+            'scale': args.scale,
+            'decoy_depth': args.decoy_depth,
+            'decoy_width': args.decoy_width,
+            'seed': args.seed,
+        },
+        'platform': sys.platform,
+        'python': sys.version.split()[0],
+        'results': results,
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        report['regressions'] = compareWithBaseline(results, baseline, args.threshold)
+        if report['regressions']:
+            exit_code = 1
+
+    output = json.dumps(report, indent=4, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,10 +1,40 @@
 import os
+import copy
 import json
 import time
+import atexit
+import threading
+import contextlib
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 from utils import getAppDataPath
+import statedb
+from statedb import isStateDbEnabled, loadState, saveState
+# 日志函数保留在config中导出，兼容原有调用
+from logger import (
+    LOG_FILE_NAME, getLogPath, writeLog, clearLog, getLogContent, getLogLines,
+    getLogTail, readLogUpdates, configureLog
+)
 
 CONFIG_FILE_NAME = 'config.json'
-LOG_FILE_NAME = 'chromiumto.log'
+
+# 配置修改后延迟写入磁盘的时间（秒）
+CONFIG_FLUSH_DELAY = 1.0
+
+# 等待其他进程释放配置文件锁的最长时间（秒）
+CONFIG_LOCK_TIMEOUT = 5.0
+
+# 替换配置文件被其他进程占用时的重试次数
+CONFIG_REPLACE_RETRIES = 10
+
+# config.json中记录写入版本的键，每次写入加1
+CONFIG_VERSION_KEY = '_version'
 
 # 默认配置
 default_config = {
@@ -16,136 +46,585 @@ default_config = {
         '$Recycle.Bin',
         'System Volume Information',
         'AppData\\Local\\Temp'
-    ]
+    ],
+    # 上次扫描各目录的文件数，用于单遍扫描时估算进度
+    'scan_file_counts': {},
+    # 并行扫描线程数，0表示自动，1表示串行扫描
+    'scan_workers': 0,
+    # 是否启用增量扫描，未变化的目录直接使用上次扫描的结果
+    'scan_incremental': True,
+    # 日志文件超过该大小（字节）时轮转，0表示不按大小轮转
+    'log_max_size': 5 * 1024 * 1024,
+    # 日志文件按时间轮转的间隔（秒），0表示不按时间轮转
+    'log_rotate_interval': 0,
+    # 保留的历史日志文件数
+    'log_backup_count': 5,
+    # 是否额外写入结构化操作日志operations.jsonl
+    'structured_log': False,
+    # 是否使用SQLite状态数据库state.db保存配置，启用后首次读取时一次性导入config.json
+    'state_db': False,
+    # 批量重定向线程数，0表示每个磁盘卷一个线程（最多4个），1表示依次处理
+    'redirect_workers': 0
+}
+
+# 按路径索引的应用列表
+APP_REGISTRY_KEYS = ('detected_apps', 'redirected_apps')
+
+# 进程内的配置缓存，修改先写入内存，再批量写入磁盘
+# dirty为整体修改过的配置项，dirty_apps为应用列表中单独修改过的应用
+# version为内存中的配置所基于的config.json版本
+_config_store = {
+    'config': None,
+    'registries': None,
+    'dirty': set(),
+    'dirty_apps': {},
+    'version': 0,
+    'lock': threading.RLock(),
+    'flush_lock': threading.Lock(),
+    'timer': None,
+    'batch_depth': 0
 }
 
 def getConfigPath():
     """获取配置文件路径"""
     return os.path.join(getAppDataPath(), CONFIG_FILE_NAME)
 
-def loadConfig():
-    """加载配置文件"""
-    config_path = getConfigPath()
-    if os.path.exists(config_path):
+def mergeDefaultConfig(config):
+    """合并默认配置和现有配置"""
+    for key, value in default_config.items():
+        if key not in config:
+            config[key] = copy.deepcopy(value)
+        elif key == 'scan_exclusions':
+            # 确保排除列表不包含Program Files目录
+            # 首先获取默认排除列表
+            default_exclusions = default_config['scan_exclusions']
+            # 创建新的排除列表，只包含默认排除列表中的项目
+            config['scan_exclusions'] = list(default_exclusions)
+    return config
+
+def readConfigSnapshot():
+    """从磁盘读取配置并合并默认配置，返回(配置, 版本)，启用SQLite状态数据库时从数据库读取
+
+    config.json总是整体替换，读取时不需要加锁，也不会读到写了一半的文件。
+    """
+    if isStateDbEnabled():
         try:
-            with open(config_path, 'r', encoding='utf-8') as f:
-                config = json.load(f)
-                # 合并默认配置和现有配置
-                for key, value in default_config.items():
-                    if key not in config:
-                        config[key] = value
-                    elif key == 'scan_exclusions':
-                        # 确保排除列表不包含Program Files目录
-                        # 首先获取默认排除列表
-                        default_exclusions = default_config['scan_exclusions']
-                        # 创建新的排除列表，只包含默认排除列表中的项目
-                        config['scan_exclusions'] = default_exclusions
-                return config
+            return mergeDefaultConfig(loadState()), 0
         except Exception:
-            return default_config.copy()
-    else:
-        return default_config.copy()
+            return copy.deepcopy(default_config), 0
+    
+    config, version = readConfigJson()
+    if config.get('state_db'):
+        # config.json中启用了状态数据库，导入后之后的读写都使用数据库，导入失败时继续使用config.json
+        try:
+            statedb.migrateFromJson(config, normalizeAppPath)
+        except Exception:
+            pass
+    return config, version
+
+def readConfigJson():
+    """读取config.json并合并默认配置，返回(配置, 版本)，不使用状态数据库"""
+    config_path = getConfigPath()
+    if not os.path.exists(config_path):
+        return copy.deepcopy(default_config), 0
+    try:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        version = config.pop(CONFIG_VERSION_KEY, 0)
+        return mergeDefaultConfig(config), version
+    except Exception:
+        return copy.deepcopy(default_config), 0
+
+def readConfigFile():
+    """从磁盘读取配置文件并合并默认配置"""
+    return readConfigSnapshot()[0]
+
+def replaceConfigFile(temp_path, config_path):
+    """用临时文件替换配置文件，文件被其他进程短暂占用时重试"""
+    for attempt in range(CONFIG_REPLACE_RETRIES):
+        try:
+            os.replace(temp_path, config_path)
+            return
+        except PermissionError:
+            if attempt == CONFIG_REPLACE_RETRIES - 1:
+                raise
+            time.sleep(0.05 * (attempt + 1))
 
-def saveConfig(config):
-    """保存配置文件"""
+def writeConfigFile(config, keys=None, version=None, dirty_apps=None):
+    """将配置写入磁盘，先写临时文件再替换，避免写入中途失败损坏配置
+
+    version不为None时写入版本号。启用SQLite状态数据库时，只在一个事务中写入keys中修改过的配置项
+    和dirty_apps中修改过的应用。
+    """
+    if isStateDbEnabled():
+        return saveState(config, list(keys) if keys is not None else list(config), normalizeAppPath, dirty_apps)
+    return writeConfigJson(config, version)
+
+def writeConfigJson(config, version=None):
+    """将配置写入config.json，不使用状态数据库"""
     config_path = getConfigPath()
+    temp_path = f"{config_path}.{os.getpid()}.tmp"
+    if version is not None:
+        config = dict(config)
+        config[CONFIG_VERSION_KEY] = version
     try:
-        with open(config_path, 'w', encoding='utf-8') as f:
+        with open(temp_path, 'w', encoding='utf-8') as f:
             json.dump(config, f, indent=4, ensure_ascii=False)
+        replaceConfigFile(temp_path, config_path)
         return True
     except Exception:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
         return False
 
-def updateConfig(key, value):
-    """更新配置项"""
-    config = loadConfig()
-    config[key] = value
-    return saveConfig(config)
+def acquireFileLock(f):
+    """对文件加排他锁，无法立即加锁时抛出OSError"""
+    if msvcrt is not None:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    elif fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+def releaseFileLock(f):
+    """释放文件锁"""
+    if msvcrt is not None:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    elif fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+@contextlib.contextmanager
+def lockFile(lock_path, timeout, message):
+    """跨进程锁定lock_path，等待其他进程释放超过timeout秒时抛出TimeoutError(message)"""
+    with open(lock_path, 'a+b') as f:
+        deadline = time.monotonic() + timeout
+        delay = 0.01
+        while True:
+            try:
+                acquireFileLock(f)
+                break
+            except OSError:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(message)
+                time.sleep(delay)
+                delay = min(delay * 2, 0.2)
+        try:
+            yield
+        finally:
+            releaseFileLock(f)
+
+def lockConfigFile(timeout=CONFIG_LOCK_TIMEOUT):
+    """跨进程锁定配置文件，只有写入方需要加锁，超时抛出TimeoutError"""
+    return lockFile(getConfigPath() + '.lock', timeout, "配置文件被其他进程锁定")
+
+def normalizeAppPath(path):
+    """标准化应用路径作为索引键，Windows下不区分大小写"""
+    if not path:
+        return ''
+    return os.path.normcase(os.path.normpath(path))
+
+def buildAppRegistry(apps):
+    """将应用列表转换为按标准化路径索引的有序字典，重复的路径保留第一个"""
+    registry = {}
+    for app in apps or []:
+        registry.setdefault(normalizeAppPath(app.get('path', '')), app)
+    return registry
+
+def splitAppRegistries(config):
+    """从配置中取出应用列表并建立索引，配置中只保留占位以维持键的顺序"""
+    registries = {}
+    for key in APP_REGISTRY_KEYS:
+        registries[key] = buildAppRegistry(config.get(key))
+        config[key] = None
+    return registries
+
+def applyLogSettings(config):
+    """将配置中的日志轮转参数应用到日志写入"""
+    configureLog(config.get('log_max_size'), config.get('log_rotate_interval'), config.get('log_backup_count'))
+
+def getStoreConfig():
+    """获取内存中的配置，首次调用时从磁盘加载，调用方需持有_config_store['lock']
+
+    应用列表不在返回的配置中，而是按路径索引保存在_config_store['registries']中。
+    """
+    if _config_store['config'] is None:
+        config, _config_store['version'] = readConfigSnapshot()
+        setStoreConfig(config)
+    return _config_store['config']
+
+def setStoreConfig(config):
+    """用完整配置替换内存中的配置，调用方需持有_config_store['lock']"""
+    _config_store['registries'] = splitAppRegistries(config)
+    _config_store['config'] = config
+    applyLogSettings(config)
+
+def getAppRegistry(key):
+    """获取按路径索引的应用字典，调用方需持有_config_store['lock']"""
+    getStoreConfig()
+    return _config_store['registries'][key]
+
+def materializeConfig():
+    """生成与config.json格式相同的完整配置，调用方需持有_config_store['lock']"""
+    config = dict(getStoreConfig())
+    for key in APP_REGISTRY_KEYS:
+        config[key] = list(_config_store['registries'][key].values())
+    return config
+
+def markConfigDirty(*keys):
+    """标记整体修改过的配置项，并安排延迟写入"""
+    _config_store['dirty'].update(keys)
+    for key in keys:
+        _config_store['dirty_apps'].pop(key, None)
+    scheduleConfigFlush()
+
+def markAppDirty(key, path_key):
+    """标记应用列表中单独修改过的应用，写入时只合并这些应用，不覆盖其他进程的修改"""
+    if key not in _config_store['dirty']:
+        _config_store['dirty_apps'].setdefault(key, set()).add(path_key)
+    scheduleConfigFlush()
+
+def mergeConfigChanges(base, changes, dirty, dirty_apps):
+    """将changes中修改过的配置项和应用合并到base上，两者都是完整配置，返回新的配置"""
+    merged = copy.deepcopy(base)
+    for key in dirty:
+        if key in changes:
+            merged[key] = copy.deepcopy(changes[key])
+        else:
+            merged.pop(key, None)
+    for key, path_keys in dirty_apps.items():
+        if key in dirty:
+            continue
+        registry = buildAppRegistry(merged.get(key))
+        changed = buildAppRegistry(changes.get(key))
+        for path_key in path_keys:
+            if path_key in changed:
+                registry[path_key] = copy.deepcopy(changed[path_key])
+            else:
+                registry.pop(path_key, None)
+        merged[key] = list(registry.values())
+    return merged
+
+def scheduleConfigFlush():
+    """安排延迟写入，批量操作期间不写入，结束时统一写入"""
+    if _config_store['batch_depth'] > 0 or _config_store['timer'] is not None:
+        return
+    timer = threading.Timer(CONFIG_FLUSH_DELAY, flushConfig)
+    timer.daemon = True
+    _config_store['timer'] = timer
+    timer.start()
+
+def flushConfig():
+    """将修改过的配置写入磁盘
+
+    写入时对config.json加跨进程锁，并比较版本号：如果其他进程在本进程加载之后写入过，
+    先读取磁盘上的配置，只把本进程修改过的配置项和应用合并上去，再写入新版本，
+    不会覆盖其他进程的修改。加锁失败时保留修改，稍后重试。
+    等待文件锁期间不持有内存配置的锁，本进程的读取不会被阻塞。
+    """
+    with _config_store['flush_lock']:
+        with _config_store['lock']:
+            timer = _config_store['timer']
+            _config_store['timer'] = None
+            if timer is not None and timer is not threading.current_thread():
+                timer.cancel()
+            if not _config_store['dirty'] and not _config_store['dirty_apps']:
+                return True
+            snapshot = copy.deepcopy(materializeConfig())
+            dirty = set(_config_store['dirty'])
+            dirty_apps = {key: set(path_keys) for key, path_keys in _config_store['dirty_apps'].items()}
+            base_version = _config_store['version']
+            _config_store['dirty'].clear()
+            _config_store['dirty_apps'].clear()
+        
+        merged = snapshot
+        version = base_version
+        try:
+            if isStateDbEnabled():
+                # 数据库在一个事务中只写入修改过的配置项和应用，由SQLite保证跨进程互斥
+                success = writeConfigFile(snapshot, dirty, dirty_apps=dirty_apps)
+            else:
+                with lockConfigFile():
+                    disk_config, disk_version = readConfigSnapshot()
+                    if disk_version != base_version:
+                        merged = mergeConfigChanges(disk_config, snapshot, dirty, dirty_apps)
+                    version = disk_version + 1
+                    success = writeConfigFile(merged, version=version)
+        except (OSError, TimeoutError):
+            success = False
+        
+        with _config_store['lock']:
+            if not success:
+                # 恢复修改标记，稍后重试
+                _config_store['dirty'] |= dirty
+                for key, path_keys in dirty_apps.items():
+                    if key not in _config_store['dirty']:
+                        _config_store['dirty_apps'].setdefault(key, set()).update(path_keys)
+                scheduleConfigFlush()
+                return False
+            _config_store['version'] = version
+            if merged is not snapshot:
+                # 采用其他进程的修改，保留本进程在写入期间新做的修改
+                setStoreConfig(mergeConfigChanges(
+                    merged, materializeConfig(), _config_store['dirty'], _config_store['dirty_apps']))
+            return True
+
+@contextlib.contextmanager
+def configBatch():
+    """批量修改配置，期间只修改内存中的配置，结束时统一写入一次"""
+    with _config_store['lock']:
+        _config_store['batch_depth'] += 1
+    try:
+        yield
+    finally:
+        with _config_store['lock']:
+            _config_store['batch_depth'] -= 1
+            finished = _config_store['batch_depth'] == 0
+        if finished:
+            flushConfig()
+
+def reloadConfig():
+    """丢弃内存中的配置，下次访问时重新从磁盘加载"""
+    flushConfig()
+    with _config_store['lock']:
+        _config_store['config'] = None
+        _config_store['registries'] = None
+
+def loadConfig():
+    """加载配置，返回内存中配置的副本"""
+    with _config_store['lock']:
+        return copy.deepcopy(materializeConfig())
+
+def saveConfig(config, persist=False):
+    """保存配置，先更新内存中的配置，再延迟写入磁盘
+
+    persist为True时立即写入磁盘，返回是否写入成功；否则总是返回True，写入失败时稍后重试。
+    """
+    with _config_store['lock']:
+        current = materializeConfig()
+        changed = [key for key in set(current) | set(config) if current.get(key) != config.get(key)]
+        old_registries = _config_store['registries']
+        if changed:
+            setStoreConfig(copy.deepcopy(config))
+        for key in changed:
+            if key in APP_REGISTRY_KEYS:
+                # 应用列表只标记增删改的应用，合并时不覆盖其他进程对其他应用的修改
+                new_registry = _config_store['registries'][key]
+                for path_key in set(old_registries[key]) | set(new_registry):
+                    if old_registries[key].get(path_key) != new_registry.get(path_key):
+                        markAppDirty(key, path_key)
+            else:
+                markConfigDirty(key)
+    if persist:
+        return flushConfig()
+    return True
+
+def updateConfig(key, value, persist=False):
+    """更新配置项，persist为True时立即写入磁盘，返回是否写入成功"""
+    with _config_store['lock']:
+        getStoreConfig()
+        if key in APP_REGISTRY_KEYS:
+            _config_store['registries'][key] = buildAppRegistry(copy.deepcopy(value))
+        else:
+            getStoreConfig()[key] = copy.deepcopy(value)
+            if key.startswith('log_'):
+                applyLogSettings(getStoreConfig())
+        markConfigDirty(key)
+    if persist:
+        return flushConfig()
+    return True
 
 def getConfig(key, default=None):
     """获取单个配置项"""
-    config = loadConfig()
-    return config.get(key, default)
+    with _config_store['lock']:
+        config = getStoreConfig()
+        if key in APP_REGISTRY_KEYS:
+            return copy.deepcopy(list(getAppRegistry(key).values()))
+        if key not in config:
+            return default
+        return copy.deepcopy(config[key])
+
+def findApp(key, app_path):
+    """按路径查找应用，返回应用信息的副本，不存在时返回None"""
+    with _config_store['lock']:
+        app = getAppRegistry(key).get(normalizeAppPath(app_path))
+        return copy.deepcopy(app) if app is not None else None
+
+def getDetectedApp(app_path):
+    """按路径查找已检测的应用"""
+    return findApp('detected_apps', app_path)
+
+def getRedirectedApp(app_path):
+    """按路径查找已重定向的应用"""
+    return findApp('redirected_apps', app_path)
+
+def isAppRedirected(app_path):
+    """检查应用是否已重定向"""
+    with _config_store['lock']:
+        return normalizeAppPath(app_path) in getAppRegistry('redirected_apps')
+
+def getRedirectedAppPaths():
+    """获取所有已重定向应用的标准化路径集合"""
+    with _config_store['lock']:
+        return set(getAppRegistry('redirected_apps'))
+
+def getAppsSize(key, exclude_key=None):
+    """累加应用列表中应用的大小，exclude_key列表中的应用不计入，不复制应用列表"""
+    with _config_store['lock']:
+        excluded = getAppRegistry(exclude_key) if exclude_key else {}
+        return sum(app.get('size', 0) for path_key, app in getAppRegistry(key).items() if path_key not in excluded)
 
 def addDetectedApp(app_info):
     """添加已检测的应用"""
-    config = loadConfig()
-    # 检查是否已存在
-    for app in config['detected_apps']:
-        if app['path'] == app_info['path']:
+    with _config_store['lock']:
+        registry = getAppRegistry('detected_apps')
+        # 检查是否已存在
+        key = normalizeAppPath(app_info['path'])
+        if key in registry:
             return False
-    config['detected_apps'].append(app_info)
-    return saveConfig(config)
+        registry[key] = copy.deepcopy(app_info)
+        markAppDirty('detected_apps', key)
+    return True
+
+def updateDetectedApp(app_info):
+    """更新或添加已检测的应用"""
+    with _config_store['lock']:
+        key = normalizeAppPath(app_info['path'])
+        getAppRegistry('detected_apps')[key] = copy.deepcopy(app_info)
+        markAppDirty('detected_apps', key)
+    return True
+
+def removeDetectedApp(app_path):
+    """移除已检测的应用"""
+    with _config_store['lock']:
+        key = normalizeAppPath(app_path)
+        if getAppRegistry('detected_apps').pop(key, None) is None:
+            return False
+        markAppDirty('detected_apps', key)
+    return True
 
 def addRedirectedApp(app_info):
     """添加已重定向的应用"""
-    config = loadConfig()
-    # 检查是否已存在
-    for app in config['redirected_apps']:
-        if app['path'] == app_info['path']:
+    with _config_store['lock']:
+        registry = getAppRegistry('redirected_apps')
+        # 检查是否已存在
+        key = normalizeAppPath(app_info['path'])
+        if key in registry:
             return False
-    config['redirected_apps'].append(app_info)
-    return saveConfig(config)
+        registry[key] = copy.deepcopy(app_info)
+        markAppDirty('redirected_apps', key)
+    return True
 
 def removeRedirectedApp(app_path):
     """移除已重定向的应用"""
-    config = loadConfig()
-    config['redirected_apps'] = [app for app in config['redirected_apps'] if app['path'] != app_path]
-    return saveConfig(config)
+    with _config_store['lock']:
+        key = normalizeAppPath(app_path)
+        getAppRegistry('redirected_apps').pop(key, None)
+        markAppDirty('redirected_apps', key)
+    return True
 
 def clearDetectedApps():
     """清空已检测的应用列表"""
-    config = loadConfig()
-    config['detected_apps'] = []
-    return saveConfig(config)
+    with _config_store['lock']:
+        getStoreConfig()
+        _config_store['registries']['detected_apps'] = {}
+        markConfigDirty('detected_apps')
+    return True
 
+def enableStateDb():
+    """启用SQLite状态数据库：在config.json中记录启用，再将当前配置一次性导入数据库
 
-def getLogPath():
-    """获取日志文件路径"""
-    return os.path.join(getAppDataPath(), LOG_FILE_NAME)
+    也可以直接在config.json中设置state_db为true，下次启动时导入。
+    """
+    if not updateConfig('state_db', True, persist=True):
+        return False
+    with _config_store['lock']:
+        config = materializeConfig()
+        return statedb.migrateFromJson(config, normalizeAppPath)
 
+def disableStateDb():
+    """停用SQLite状态数据库：将数据库中的配置导出到config.json，再删除数据库
 
-def writeLog(message, level="INFO"):
-    """写入日志到文件"""
-    log_path = getLogPath()
-    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-    log_entry = f"[{timestamp}] [{level}] {message}\n"
-    
-    try:
-        with open(log_path, 'a', encoding='utf-8') as f:
-            f.write(log_entry)
+    导出前先在数据库中记录停用，数据库被其他进程占用无法删除时也不再使用。返回是否已改回使用config.json。
+    """
+    if not isStateDbEnabled():
         return True
-    except Exception:
+    if not flushConfig():
         return False
+    with _config_store['flush_lock']:
+        try:
+            config = mergeDefaultConfig(loadState())
+        except Exception:
+            return False
+        config['state_db'] = False
+        try:
+            with lockConfigFile():
+                version = readConfigJson()[1] + 1
+                if not writeConfigJson(config, version):
+                    return False
+                if not saveState(config, ['state_db'], normalizeAppPath):
+                    return False
+        except (OSError, TimeoutError):
+            return False
+        try:
+            statedb.removeStateDb()
+        except OSError:
+            pass
+        with _config_store['lock']:
+            # 保留导出期间本进程新做的修改
+            _config_store['version'] = version
+            setStoreConfig(mergeConfigChanges(
+                config, materializeConfig(), _config_store['dirty'], _config_store['dirty_apps']))
+    return True
 
+def getRedirectEntries(app_path):
+    """获取应用的逐文件重定向记录，未启用状态数据库或没有记录时返回None"""
+    if not isStateDbEnabled():
+        return None
+    try:
+        return statedb.getRedirectEntries(normalizeAppPath(app_path)) or None
+    except Exception:
+        return None
 
-def clearLog():
-    """清空日志文件"""
-    log_path = getLogPath()
+def getBackupRecords():
+    """获取备份记录：{标准化的应用路径: {'backup_path', 'size', 'created'}}，未启用状态数据库时返回None"""
+    if not isStateDbEnabled():
+        return None
     try:
-        with open(log_path, 'w', encoding='utf-8') as f:
-            f.write("")
-        return True
+        return {record.pop('app_key'): record for record in statedb.getBackupRecords()}
     except Exception:
+        return None
+
+def recordRedirectEntries(app_path, entries):
+    """记录应用的逐文件重定向信息，未启用状态数据库时不记录"""
+    if not isStateDbEnabled():
         return False
+    return statedb.replaceRedirectEntries(normalizeAppPath(app_path), entries)
 
+def recordBackup(app_path, backup_path, size):
+    """记录应用的备份，未启用状态数据库时不记录"""
+    if not isStateDbEnabled():
+        return False
+    return statedb.recordBackup(normalizeAppPath(app_path), backup_path, size)
 
-def getLogContent():
-    """获取日志内容"""
-    log_path = getLogPath()
-    try:
-        with open(log_path, 'r', encoding='utf-8') as f:
-            return f.read()
-    except Exception:
-        return ""
+def removeBackupRecord(app_path):
+    """删除应用的备份记录"""
+    if not isStateDbEnabled():
+        return False
+    return statedb.removeBackupRecord(normalizeAppPath(app_path))
 
+def startScanRun(kind):
+    """记录扫描开始，返回扫描记录ID，未启用状态数据库时返回None"""
+    if not isStateDbEnabled():
+        return None
+    return statedb.startScanRun(kind)
 
-def getLogLines(max_lines=1000):
-    """获取日志的最后N行"""
-    log_path = getLogPath()
-    try:
-        with open(log_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        return lines[-max_lines:]
-    except Exception:
-        return []
+def finishScanRun(run_id, apps_found, files_scanned, completed):
+    """记录扫描结束"""
+    if run_id is None or not isStateDbEnabled():
+        return False
+    return statedb.finishScanRun(run_id, apps_found, files_scanned, completed)
+
+# 退出时写入未保存的配置
+atexit.register(flushConfig)
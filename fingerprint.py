@@ -0,0 +1,143 @@
+import os
+import json
+import mmap
+import atexit
+import hashlib
+import threading
+from utils import getAppDataPath
+
+FINGERPRINT_CACHE_FILE_NAME = 'fingerprints.json'
+
+# 通过mmap计算哈希时每次处理的字节数
+FINGERPRINT_CHUNK_SIZE = 16 * 1024 * 1024
+
+# 缓存的最大条目数，超出时丢弃最早加入的条目
+FINGERPRINT_CACHE_MAX_ENTRIES = 100000
+
+# 文件指纹缓存：{标准化路径: [大小, 修改时间, 哈希]}
+_fingerprint_cache = {
+    'entries': None,
+    'dirty': False,
+    'lock': threading.RLock()
+}
+
+
+def getFingerprintCachePath():
+    """获取指纹缓存文件路径"""
+    return os.path.join(getAppDataPath(), FINGERPRINT_CACHE_FILE_NAME)
+
+
+def getCacheEntries():
+    """获取缓存条目，首次调用时从磁盘加载，调用方需持有_fingerprint_cache['lock']"""
+    if _fingerprint_cache['entries'] is None:
+        entries = {}
+        try:
+            with open(getFingerprintCachePath(), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == 1:
+                entries = data.get('entries', {})
+        except (OSError, ValueError, AttributeError):
+            pass
+        _fingerprint_cache['entries'] = entries
+    return _fingerprint_cache['entries']
+
+
+def flushFingerprintCache():
+    """将修改过的指纹缓存写入磁盘"""
+    with _fingerprint_cache['lock']:
+        if not _fingerprint_cache['dirty']:
+            return True
+        entries = getCacheEntries()
+        while len(entries) > FINGERPRINT_CACHE_MAX_ENTRIES:
+            del entries[next(iter(entries))]
+        cache_path = getFingerprintCachePath()
+        temp_path = cache_path + '.tmp'
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': 1, 'entries': entries}, f, ensure_ascii=False)
+            os.replace(temp_path, cache_path)
+            _fingerprint_cache['dirty'] = False
+            return True
+        except Exception:
+            return False
+
+
+def hashFileContents(path):
+    """通过mmap分块计算文件的BLAKE2哈希"""
+    digest = hashlib.blake2b(digest_size=32)
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                view = memoryview(data)
+                try:
+                    for offset in range(0, size, FINGERPRINT_CHUNK_SIZE):
+                        digest.update(view[offset:offset + FINGERPRINT_CHUNK_SIZE])
+                finally:
+                    view.release()
+    return digest.hexdigest()
+
+
+def listTreeFiles(path):
+    """列出目录中的全部文件，返回按相对路径排序的[(相对路径, 大小)]，相对路径用/分隔"""
+    files = []
+    for root, dirs, names in os.walk(path):
+        dirs.sort()
+        for name in names:
+            file_path = os.path.join(root, name)
+            relative = os.path.relpath(file_path, path).replace(os.sep, '/')
+            files.append((relative, os.path.getsize(file_path)))
+    files.sort()
+    return files
+
+
+def getTreeFingerprint(path):
+    """获取目录内容的哈希，由每个文件的相对路径和哈希计算"""
+    digest = hashlib.blake2b(digest_size=32)
+    for relative, _ in listTreeFiles(path):
+        digest.update(f"{relative}\0{getFingerprint(os.path.join(path, relative))}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def getFingerprint(path):
+    """获取文件内容的哈希，按(路径, 大小, 修改时间)缓存，文件未变化时不再读取
+
+    符号链接按链接指向的文件计算，目录按其中全部文件计算。
+    """
+    real_path = os.path.realpath(path)
+    if os.path.isdir(real_path):
+        return getTreeFingerprint(real_path)
+    stat = os.stat(real_path)
+    key = os.path.normcase(real_path)
+
+    with _fingerprint_cache['lock']:
+        entry = getCacheEntries().get(key)
+        if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            return entry[2]
+
+    digest = hashFileContents(real_path)
+
+    with _fingerprint_cache['lock']:
+        entries = getCacheEntries()
+        # 重新加入放到末尾，超出上限时先丢弃最久未更新的条目
+        entries.pop(key, None)
+        entries[key] = [stat.st_size, stat.st_mtime_ns, digest]
+        _fingerprint_cache['dirty'] = True
+    return digest
+
+
+def isSameContent(first, second):
+    """比较两个文件或目录内容是否相同，大小不同时不计算哈希"""
+    try:
+        if os.path.isdir(first) or os.path.isdir(second):
+            if not (os.path.isdir(first) and os.path.isdir(second)) or listTreeFiles(first) != listTreeFiles(second):
+                return False
+        elif os.path.getsize(first) != os.path.getsize(second):
+            return False
+        return getFingerprint(first) == getFingerprint(second)
+    except OSError:
+        return False
+
+
+# 退出时写入未保存的指纹缓存
+atexit.register(flushFingerprintCache)
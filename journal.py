@@ -0,0 +1,226 @@
+"""重定向和恢复的预写日志
+
+每个重定向、恢复和批量重定向是一个事务，开始、每个文件的步骤和结束都在执行前写入journal.jsonl
+并刷新到磁盘。进程中途退出后，启动时根据日志回滚或继续未完成的事务。
+"""
+import os
+import json
+import time
+import ctypes
+import itertools
+import threading
+import contextlib
+from utils import getAppDataPath
+from config import lockFile
+
+JOURNAL_FILE_NAME = 'journal.jsonl'
+
+# 等待其他进程释放预写日志锁的最长时间（秒），其他进程恢复或压缩日志期间写入需要等待
+JOURNAL_LOCK_TIMEOUT = 60.0
+
+# Windows查询进程状态所需的权限、拒绝访问的错误码和进程仍在运行时的退出码
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+ERROR_ACCESS_DENIED = 5
+STILL_ACTIVE = 259
+
+# 日志写入状态，open为本进程中未结束的事务，lock_depth为本进程持有跨进程锁的嵌套层数
+_journal = {
+    'lock': threading.RLock(),
+    'open': set(),
+    'counter': itertools.count(1),
+    'lock_depth': 0
+}
+
+
+def getJournalPath():
+    """获取预写日志路径"""
+    return os.path.join(getAppDataPath(), JOURNAL_FILE_NAME)
+
+
+@contextlib.contextmanager
+def lockJournal(timeout=JOURNAL_LOCK_TIMEOUT):
+    """跨进程锁定预写日志，写入、恢复和压缩时持有，同一进程内可以嵌套，超时抛出TimeoutError"""
+    with _journal['lock']:
+        if _journal['lock_depth']:
+            lock = contextlib.nullcontext()
+        else:
+            lock = lockFile(getJournalPath() + '.lock', timeout, "预写日志被其他进程锁定")
+        with lock:
+            _journal['lock_depth'] += 1
+            try:
+                yield
+            finally:
+                _journal['lock_depth'] -= 1
+
+
+def isProcessRunning(pid):
+    """检查进程是否仍在运行，无法确定时按仍在运行处理"""
+    if pid == os.getpid():
+        return True
+    if os.name == 'nt':
+        kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+        handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            # 进程存在但没有权限打开
+            return ctypes.get_last_error() == ERROR_ACCESS_DENIED
+        try:
+            exit_code = ctypes.c_ulong()
+            if not kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code)):
+                return True
+            return exit_code.value == STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+def getTransactionPid(tx):
+    """获取创建事务的进程ID，事务ID格式不正确时返回None"""
+    try:
+        return int(str(tx).split('-', 1)[0])
+    except ValueError:
+        return None
+
+
+def appendRecord(record):
+    """写入一条日志记录，返回前刷新到磁盘"""
+    line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+    with lockJournal():
+        with open(getJournalPath(), 'ab') as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def beginTransaction(operation, app_info=None, **data):
+    """开始事务，返回事务ID，data为恢复时需要的信息"""
+    tx = f"{os.getpid()}-{time.time_ns()}-{next(_journal['counter'])}"
+    with _journal['lock']:
+        appendRecord({'tx': tx, 'type': 'begin', 'operation': operation, 'app': app_info,
+                      'time': time.time(), 'data': data})
+        _journal['open'].add(tx)
+    return tx
+
+
+def logStep(tx, action, file=None, **data):
+    """记录事务中将要执行的一步"""
+    appendRecord({'tx': tx, 'type': 'step', 'action': action, 'file': file, 'data': data})
+
+
+def endTransaction(tx, state):
+    """结束事务，state为commit或abort"""
+    with _journal['lock']:
+        appendRecord({'tx': tx, 'type': state})
+        _journal['open'].discard(tx)
+
+
+def commitTransaction(tx):
+    """提交事务"""
+    endTransaction(tx, 'commit')
+
+
+def abortTransaction(tx):
+    """回滚后结束事务"""
+    endTransaction(tx, 'abort')
+
+
+def readRecords():
+    """读取全部日志记录，忽略进程退出时没有写完的行"""
+    records = []
+    try:
+        with open(getJournalPath(), 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    except OSError:
+        pass
+    return records
+
+
+def readTransactions():
+    """按开始顺序返回日志中的事务
+
+    每个事务为{'tx', 'operation', 'app', 'data', 'steps', 'state'}，state为open、commit或abort。
+    """
+    transactions = {}
+    for record in readRecords():
+        tx = record.get('tx')
+        if record.get('type') == 'begin':
+            transactions[tx] = {
+                'tx': tx,
+                'operation': record.get('operation'),
+                'app': record.get('app'),
+                'data': record.get('data') or {},
+                'steps': [],
+                'state': 'open'
+            }
+        elif tx in transactions:
+            if record.get('type') == 'step':
+                transactions[tx]['steps'].append(record)
+            elif record.get('type') in ('commit', 'abort'):
+                transactions[tx]['state'] = record['type']
+    return list(transactions.values())
+
+
+def getIncompleteTransactions(operation=None):
+    """获取进程退出时未结束的事务
+
+    本进程正在执行的事务和仍在运行的其他进程的事务不返回。进程ID被新进程复用时，
+    该事务留到新进程退出后再处理。
+    """
+    with _journal['lock']:
+        active = set(_journal['open'])
+    running = {}
+    incomplete = []
+    for transaction in readTransactions():
+        if transaction['state'] != 'open' or transaction['tx'] in active:
+            continue
+        if operation is not None and transaction['operation'] != operation:
+            continue
+        pid = getTransactionPid(transaction['tx'])
+        if pid is not None and pid != os.getpid():
+            if pid not in running:
+                running[pid] = isProcessRunning(pid)
+            if running[pid]:
+                continue
+        incomplete.append(transaction)
+    return incomplete
+
+
+def compactJournal():
+    """删除已结束事务的记录，只保留未结束的事务
+
+    持有跨进程锁，读取和替换之间其他进程不能写入，不会丢失其他进程的记录。
+    """
+    journal_path = getJournalPath()
+    try:
+        with lockJournal():
+            records = readRecords()
+            closed = {record.get('tx') for record in records if record.get('type') in ('commit', 'abort')}
+            remaining = [record for record in records if record.get('tx') not in closed]
+            if not remaining:
+                if os.path.exists(journal_path):
+                    os.remove(journal_path)
+                return True
+            temp_path = journal_path + '.tmp'
+            with open(temp_path, 'wb') as f:
+                for record in remaining:
+                    f.write((json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, journal_path)
+            return True
+    except OSError:
+        # 包括等待其他进程释放锁超时
+        return False
@@ -0,0 +1,249 @@
+"""内核文件清单
+
+Chrome、Edge、Brave、CEF和Electron的内核文件在KERNEL_FILE_MANIFEST中统一声明，
+导入时编译为按小写文件名查找的字典和一个匹配通配符的正则表达式。
+识别应用、计算内核大小、重定向和初始化共享内核都使用同一份清单，每个目录只需要一次os.scandir。
+"""
+import os
+import re
+
+# 文件用途
+ROLE_FEATURE = 1    # 用于识别Chromium应用
+ROLE_SIZE = 2       # 计入应用的Chromium文件大小
+ROLE_LINK = 4       # 重定向时备份并链接到共享内核
+ROLE_SHARE = 8      # 初始化共享内核时保存
+ROLE_MAIN = 16      # 用于读取内核版本的主DLL
+
+ROLE_NAMES = {
+    'feature': ROLE_FEATURE,
+    'size': ROLE_SIZE,
+    'link': ROLE_LINK,
+    'share': ROLE_SHARE,
+    'main': ROLE_MAIN
+}
+
+# 内核文件清单：{框架: [(文件名, 用途)]}
+# 文件名以/结尾表示目录，整个目录链接到共享内核；包含*或?时按通配符匹配，不区分大小写
+KERNEL_FILE_MANIFEST = {
+    'chrome': [
+        ('chrome.dll', 'main feature size link share'),
+        ('chrome_elf.dll', 'feature size link share'),
+        ('chrome.exe', 'feature size share'),
+        ('chrome_child.dll', 'size'),
+    ],
+    'edge': [
+        ('msedge.dll', 'main feature size link share'),
+        ('msedge_elf.dll', 'link share'),
+        ('msedge.exe', 'feature size'),
+        ('msedge_child.dll', 'size'),
+    ],
+    'brave': [
+        ('brave.dll', 'main feature size link share'),
+        ('brave_elf.dll', 'link share'),
+        ('brave.exe', 'feature size'),
+        ('brave_child.dll', 'size'),
+    ],
+    'cef': [
+        ('libcef.dll', 'main link share'),
+        ('cef_sandbox.dll', 'link share'),
+    ],
+    'electron': [
+        ('electron.exe', 'link share'),
+    ],
+    # 各框架共用的文件
+    'chromium': [
+        # 多媒体和安全相关
+        ('widevinecdmadapter.dll', 'feature size link share'),
+        ('widevinecdmadapter64.dll', 'link share'),
+        ('pdf.dll', 'link share'),
+        ('ui.dll', 'link share'),
+        # V8引擎和核心资源
+        ('v8_context_snapshot.bin', 'size link share'),
+        ('natives_blob.bin', 'size link share'),
+        ('snapshot_blob.bin', 'size link share'),
+        ('icudtl.dat', 'size link share'),
+        # 图形相关，应用可能自带不同版本，不链接
+        ('libEGL.dll', 'size share'),
+        ('libGLESv2.dll', 'size share'),
+        # .pak资源文件，允许带前缀
+        ('*chrome_100_percent.pak', 'link share'),
+        ('*chrome_200_percent.pak', 'link share'),
+        ('*resources.pak', 'link share'),
+        # 整个目录链接的子目录
+        ('locales/', 'link share'),
+        ('swiftshader/', 'link share'),
+    ],
+}
+
+# 不属于内核的文件，文件名包含其中任意一项时排除，不区分大小写
+EXCLUDED_PATTERNS = [
+    # 系统API集文件
+    'api-ms-win-',
+    'ext-ms-win-',
+    # C++运行时库
+    'msvcp',
+    'vcruntime',
+    'concrt140',
+    'ucrtbase',
+    # 第三方库
+    '7-zip.dll',
+    'ffmpeg.dll',
+    'libzmq-',
+    'sqlite3',
+    # 图形驱动相关
+    'd3dcompiler_',
+    'vk_swiftshader.dll',
+    'vulkan-1.dll',
+    # Qt框架
+    'Qt5',
+    # 其他非Chromium核心文件
+    'adj.dll',
+    'aria2c.exe',
+    'CrashHunter_PC3.dll',
+    'FeverGames',
+    'IPCPlugin.dll',
+    'mpay.dll',
+    'NtUniSdk',
+    'OrbitSDK.dll',
+    'QCefView.dll',
+    'rlottie.dll',
+    'TxBugReport.exe',
+    'UniCrashReporter.exe',
+    'WXWorkWeb.exe',
+    'xyvodsdk.dll',
+]
+
+
+def parseRoles(roles):
+    """将空格分隔的用途转换为位标志"""
+    flags = 0
+    for role in roles.split():
+        flags |= ROLE_NAMES[role]
+    return flags
+
+
+def translatePattern(pattern):
+    """将*和?通配符转换为正则表达式"""
+    return re.escape(pattern).replace(r'\*', '.*').replace(r'\?', '.')
+
+
+def compileManifest(manifest, excluded_patterns):
+    """编译清单：精确文件名放入字典，通配符合并为一个正则表达式，排除项合并为另一个正则表达式
+
+    每个条目为(顺序, 用途, 是否为目录, 框架, 文件名)，顺序用于按清单中的顺序返回文件。
+    """
+    names = {}
+    patterns = []
+    order = 0
+    for framework, entries in manifest.items():
+        for name, roles in entries:
+            is_dir = name.endswith('/')
+            name = name.rstrip('/')
+            entry = (order, parseRoles(roles), is_dir, framework, name)
+            order += 1
+            if '*' in name or '?' in name:
+                patterns.append((name.lower(), entry))
+            else:
+                names[name.lower()] = entry
+    # 所有通配符合并为一个正则表达式，用命名分组区分命中的通配符
+    pattern_regex = None
+    if patterns:
+        alternatives = '|'.join(
+            f"(?P<p{index}>{translatePattern(name)})" for index, (name, _) in enumerate(patterns))
+        pattern_regex = re.compile(f"(?:{alternatives})\\Z")
+    excluded_regex = re.compile('|'.join(re.escape(pattern.lower()) for pattern in excluded_patterns))
+    return {
+        'names': names,
+        'patterns': [entry for _, entry in patterns],
+        'pattern_regex': pattern_regex,
+        'excluded_regex': excluded_regex
+    }
+
+
+# 导入时编译一次
+_compiled_manifest = compileManifest(KERNEL_FILE_MANIFEST, EXCLUDED_PATTERNS)
+
+
+def classifyName(name, is_dir=False):
+    """查找文件名在清单中的条目，不是内核文件或被排除时返回None"""
+    lower = name.lower()
+    entry = _compiled_manifest['names'].get(lower)
+    if entry is None and _compiled_manifest['pattern_regex'] is not None:
+        match = _compiled_manifest['pattern_regex'].match(lower)
+        if match:
+            entry = _compiled_manifest['patterns'][int(match.lastgroup[1:])]
+    if entry is None or entry[2] != is_dir:
+        return None
+    if _compiled_manifest['excluded_regex'].search(lower):
+        return None
+    return entry
+
+
+def getManifestNames(role):
+    """获取清单中具有某个用途的精确文件名，按清单中的顺序"""
+    entries = sorted(entry for entry in _compiled_manifest['names'].values() if entry[1] & role)
+    return [entry[4] for entry in entries]
+
+
+def hasFeatureName(names):
+    """根据名称列表检查是否为Chromium应用，不访问磁盘"""
+    for name in names:
+        entry = _compiled_manifest['names'].get(name.lower())
+        if entry is not None and entry[1] & ROLE_FEATURE:
+            return True
+    return False
+
+
+def classifyEntries(entries):
+    """按清单对os.scandir得到的目录项分类，复用DirEntry缓存的类型和stat结果
+
+    返回{'link', 'share', 'size_files', 'size', 'feature', 'main_dll', 'frameworks'}：
+    link、share和size_files为按清单顺序排列的文件名，size为size_files的总大小，
+    feature表示是否为Chromium应用，main_dll为清单中最靠前的主DLL的路径。
+    """
+    link = []
+    share = []
+    size_files = []
+    size = 0
+    feature = False
+    main_dll = None
+    frameworks = set()
+    for entry in entries:
+        try:
+            is_dir = entry.is_dir()
+        except OSError:
+            continue
+        manifest_entry = classifyName(entry.name, is_dir)
+        if manifest_entry is None:
+            continue
+        order, roles, _, framework, _ = manifest_entry
+        frameworks.add(framework)
+        if roles & ROLE_LINK:
+            link.append((order, entry.name))
+        if roles & ROLE_SHARE:
+            share.append((order, entry.name))
+        if roles & ROLE_FEATURE:
+            feature = True
+        if roles & ROLE_MAIN and (main_dll is None or order < main_dll[0]):
+            main_dll = (order, entry.path)
+        if roles & ROLE_SIZE:
+            size_files.append((order, entry.name))
+            try:
+                size += entry.stat().st_size
+            except OSError:
+                pass
+    return {
+        'link': [name for _, name in sorted(link)],
+        'share': [name for _, name in sorted(share)],
+        'size_files': [name for _, name in sorted(size_files)],
+        'size': size,
+        'feature': feature,
+        'main_dll': main_dll[1] if main_dll else None,
+        'frameworks': frameworks
+    }
+
+
+def classifyDirectory(path):
+    """用一次os.scandir按清单对目录中的文件分类，目录不存在或无法访问时抛出OSError"""
+    with os.scandir(path) as it:
+        return classifyEntries(list(it))
@@ -0,0 +1,286 @@
+"""按内容寻址的多版本共享内核存储
+
+内核文件按BLAKE2哈希保存在KernelStore/objects中，相同内容只保存一份；
+每个内核版本在KernelStore/versions/<版本>中有一个由链接组成的目录，
+应用链接到版本目录中的文件，切换内核版本只需要重新指向链接。
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+from utils import getAppDataPath, getChromeVersion, getChromeArchitecture
+from fingerprint import getFingerprint, listTreeFiles
+from kernelfiles import getManifestNames, ROLE_MAIN
+
+KERNEL_STORE_DIR_NAME = 'KernelStore'
+KERNEL_STORE_MANIFEST_NAME = 'store.json'
+
+# 用于识别内核版本的DLL，由内核文件清单决定
+KERNEL_VERSION_DLLS = tuple(getManifestNames(ROLE_MAIN))
+
+# 修改存储时持有的锁
+_kernel_store_lock = threading.RLock()
+
+
+def getKernelStorePath():
+    """获取内核存储目录"""
+    return os.path.join(getAppDataPath(), KERNEL_STORE_DIR_NAME)
+
+
+def getObjectsPath():
+    """获取内核文件对象目录"""
+    return os.path.join(getKernelStorePath(), 'objects')
+
+
+def getVersionsPath():
+    """获取版本目录的上级目录"""
+    return os.path.join(getKernelStorePath(), 'versions')
+
+
+def getKernelVersionPath(version):
+    """获取内核版本目录"""
+    return os.path.join(getVersionsPath(), version)
+
+
+def getObjectPath(digest):
+    """获取哈希对应的对象文件路径，按哈希前两位分目录"""
+    return os.path.join(getObjectsPath(), digest[:2], digest)
+
+
+def isKernelStorePath(path):
+    """检查路径是否在内核存储的版本目录中"""
+    if not path:
+        return False
+    versions = os.path.normcase(os.path.abspath(getVersionsPath()))
+    path = os.path.normcase(os.path.abspath(path))
+    return path.startswith(versions + os.sep)
+
+
+def loadStoreManifest():
+    """加载存储清单：{'versions': {版本: {'files': {文件名: 哈希}, 'source', 'added'}}}"""
+    manifest_path = os.path.join(getKernelStorePath(), KERNEL_STORE_MANIFEST_NAME)
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if isinstance(manifest.get('versions'), dict):
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return {'versions': {}}
+
+
+def saveStoreManifest(manifest):
+    """保存存储清单"""
+    store_path = getKernelStorePath()
+    os.makedirs(store_path, exist_ok=True)
+    manifest_path = os.path.join(store_path, KERNEL_STORE_MANIFEST_NAME)
+    temp_path = manifest_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=4, ensure_ascii=False)
+    os.replace(temp_path, manifest_path)
+
+
+def hashFile(path):
+    """计算文件的BLAKE2哈希，使用指纹缓存，文件未变化时不再读取"""
+    return getFingerprint(path)
+
+
+def getStorePath(base_path, name):
+    """将清单中用/分隔的文件名转换为base_path下的路径"""
+    return os.path.join(base_path, *name.split('/'))
+
+
+def expandKernelFiles(source_path, files):
+    """展开内核文件列表中的目录，返回用/分隔的相对路径列表"""
+    expanded = []
+    for name in files:
+        file_path = os.path.join(source_path, name)
+        if os.path.isdir(file_path):
+            expanded.extend(f"{name}/{relative}" for relative, _ in listTreeFiles(file_path))
+        elif os.path.isfile(file_path):
+            expanded.append(name)
+    return expanded
+
+
+def storeObject(path, digest):
+    """将文件保存为对象，已有相同内容的对象时不再保存，返回是否新保存了文件"""
+    object_path = getObjectPath(digest)
+    if os.path.exists(object_path):
+        return False
+    os.makedirs(os.path.dirname(object_path), exist_ok=True)
+    temp_path = f"{object_path}.{os.getpid()}.tmp"
+    shutil.copy2(path, temp_path)
+    os.replace(temp_path, object_path)
+    return True
+
+
+def linkObject(object_path, view_file):
+    """在版本目录中创建指向对象的链接，优先硬链接，其次符号链接，都不支持时复制"""
+    try:
+        os.link(object_path, view_file)
+        return 'hardlink'
+    except OSError:
+        pass
+    try:
+        os.symlink(object_path, view_file)
+        return 'symlink'
+    except OSError:
+        pass
+    shutil.copy2(object_path, view_file)
+    return 'copy'
+
+
+def detectKernelVersion(source_path, files):
+    """根据内核DLL的版本和架构生成版本名称，无法获取版本时返回None"""
+    for dll in KERNEL_VERSION_DLLS:
+        if dll in files:
+            dll_path = os.path.join(source_path, dll)
+            version = getChromeVersion(dll_path)
+            if not version or not version[0].isdigit():
+                continue
+            architecture = getChromeArchitecture(dll_path)
+            return f"{version}-{architecture}" if architecture else version
+    return None
+
+
+def buildVersionView(version, files):
+    """创建由链接组成的版本目录，先在临时目录中创建再整体替换"""
+    view_path = getKernelVersionPath(version)
+    temp_path = os.path.join(getVersionsPath(), f".{version}.{os.getpid()}.tmp")
+    if os.path.exists(temp_path):
+        shutil.rmtree(temp_path)
+    os.makedirs(temp_path)
+    try:
+        for name, digest in files.items():
+            view_file = getStorePath(temp_path, name)
+            os.makedirs(os.path.dirname(view_file), exist_ok=True)
+            linkObject(getObjectPath(digest), view_file)
+        if os.path.exists(view_path):
+            shutil.rmtree(view_path)
+        os.replace(temp_path, view_path)
+    except Exception:
+        shutil.rmtree(temp_path, ignore_errors=True)
+        raise
+    return view_path
+
+
+def addKernelVersion(source_path, files, version=None):
+    """将source_path中的内核文件加入存储，并创建版本目录
+
+    files为要加入的文件名列表，其中的目录（如locales）按其中的文件逐个保存，版本目录中保持相同的结构。
+    version为空时根据内核DLL的版本生成。相同内容的文件只保存一次。返回(成功, 版本名称或错误信息)。
+    """
+    try:
+        hashes = {}
+        for name in expandKernelFiles(source_path, files):
+            hashes[name] = hashFile(getStorePath(source_path, name))
+        if not hashes:
+            return False, "没有找到可以加入内核存储的文件"
+
+        content_id = hashlib.blake2b(
+            json.dumps(hashes, sort_keys=True).encode('utf-8'), digest_size=6).hexdigest()
+        if not version:
+            version = detectKernelVersion(source_path, hashes) or f"unknown-{content_id}"
+
+        with _kernel_store_lock:
+            manifest = loadStoreManifest()
+            existing = manifest['versions'].get(version)
+            if existing and existing['files'] != hashes:
+                # 版本号相同但内容不同，用内容区分
+                version = f"{version}-{content_id}"
+                existing = manifest['versions'].get(version)
+            if existing and os.path.isdir(getKernelVersionPath(version)):
+                return True, version
+
+            for name, digest in hashes.items():
+                storeObject(getStorePath(source_path, name), digest)
+            buildVersionView(version, hashes)
+            manifest['versions'][version] = {
+                'files': hashes,
+                'source': source_path,
+                'added': time.strftime('%Y-%m-%d %H:%M:%S')
+            }
+            saveStoreManifest(manifest)
+        return True, version
+    except Exception as e:
+        return False, f"加入内核存储失败: {str(e)}"
+
+
+def listKernelVersions():
+    """列出存储中的内核版本，包括文件数和占用空间"""
+    with _kernel_store_lock:
+        manifest = loadStoreManifest()
+    versions = []
+    for version, info in sorted(manifest['versions'].items()):
+        size = 0
+        for digest in info['files'].values():
+            try:
+                size += os.path.getsize(getObjectPath(digest))
+            except OSError:
+                pass
+        versions.append({
+            'version': version,
+            'path': getKernelVersionPath(version),
+            'files': len(info['files']),
+            'size': size,
+            'source': info.get('source', ''),
+            'added': info.get('added', '')
+        })
+    return versions
+
+
+def getStoreSize():
+    """获取存储中对象实际占用的空间，相同内容的文件只计算一次"""
+    total = 0
+    objects_path = getObjectsPath()
+    if not os.path.exists(objects_path):
+        return 0
+    for prefix in os.scandir(objects_path):
+        if prefix.is_dir():
+            for entry in os.scandir(prefix.path):
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    total += entry.stat().st_size
+    return total
+
+
+def removeKernelVersion(version):
+    """删除内核版本目录，并删除不再被任何版本使用的对象"""
+    with _kernel_store_lock:
+        manifest = loadStoreManifest()
+        if version not in manifest['versions']:
+            return False, "内核版本不存在"
+        try:
+            view_path = getKernelVersionPath(version)
+            if os.path.exists(view_path):
+                shutil.rmtree(view_path)
+            del manifest['versions'][version]
+            saveStoreManifest(manifest)
+            removed = collectUnusedObjects(manifest)
+            return True, f"已删除内核版本 {version}，释放 {removed} 个文件"
+        except Exception as e:
+            return False, f"删除内核版本失败: {str(e)}"
+
+
+def collectUnusedObjects(manifest=None):
+    """删除不再被任何版本使用的对象，返回删除的对象数"""
+    with _kernel_store_lock:
+        if manifest is None:
+            manifest = loadStoreManifest()
+        used = {digest for info in manifest['versions'].values() for digest in info['files'].values()}
+        objects_path = getObjectsPath()
+        removed = 0
+        if not os.path.exists(objects_path):
+            return 0
+        for prefix in os.scandir(objects_path):
+            if not prefix.is_dir():
+                continue
+            for entry in os.scandir(prefix.path):
+                if entry.name not in used:
+                    try:
+                        os.remove(entry.path)
+                        removed += 1
+                    except OSError:
+                        pass
+        return removed
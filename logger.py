@@ -0,0 +1,332 @@
+import os
+import time
+import queue
+import atexit
+import threading
+from utils import getAppDataPath
+
+LOG_FILE_NAME = 'chromiumto.log'
+
+# 日志文件超过该大小（字节）时轮转，0表示不按大小轮转
+LOG_MAX_SIZE = 5 * 1024 * 1024
+
+# 日志文件打开超过该时间（秒）时轮转，0表示不按时间轮转
+LOG_ROTATE_INTERVAL = 0
+
+# 保留的历史日志文件数，chromiumto.log.1为最新
+LOG_BACKUP_COUNT = 5
+
+# 后台线程批量写入的最长等待时间（秒）
+LOG_FLUSH_INTERVAL = 0.5
+
+# 等待日志写入完成的最长时间（秒）
+LOG_FLUSH_TIMEOUT = 2.0
+
+# 从文件末尾向前读取日志时每次读取的字节数
+LOG_TAIL_BLOCK_SIZE = 64 * 1024
+
+# 日志写入状态，日志先放入队列，由后台线程批量写入文件
+_log_writer = {
+    'queue': queue.Queue(),
+    'thread': None,
+    'lock': threading.RLock(),
+    'file': None,
+    'size': 0,
+    'opened': 0.0,
+    'max_size': LOG_MAX_SIZE,
+    'rotate_interval': LOG_ROTATE_INTERVAL,
+    'backup_count': LOG_BACKUP_COUNT,
+    'stopped': False
+}
+
+
+def getLogPath():
+    """获取日志文件路径"""
+    return os.path.join(getAppDataPath(), LOG_FILE_NAME)
+
+
+def configureLog(max_size=None, rotate_interval=None, backup_count=None):
+    """设置日志轮转参数，未指定的参数保持不变"""
+    with _log_writer['lock']:
+        if max_size is not None:
+            _log_writer['max_size'] = max(0, int(max_size))
+        if rotate_interval is not None:
+            _log_writer['rotate_interval'] = max(0, rotate_interval)
+        if backup_count is not None:
+            _log_writer['backup_count'] = max(0, int(backup_count))
+
+
+def openLogFile():
+    """打开日志文件用于追加，调用方需持有_log_writer['lock']"""
+    if _log_writer['file'] is None:
+        log_path = getLogPath()
+        f = open(log_path, 'a', encoding='utf-8')
+        _log_writer['file'] = f
+        _log_writer['size'] = f.tell()
+        try:
+            # 按时间轮转时从文件创建时间开始计算
+            _log_writer['opened'] = os.stat(log_path).st_ctime if _log_writer['size'] else time.time()
+        except OSError:
+            _log_writer['opened'] = time.time()
+    return _log_writer['file']
+
+
+def closeLogFile():
+    """关闭日志文件，调用方需持有_log_writer['lock']"""
+    if _log_writer['file'] is not None:
+        try:
+            _log_writer['file'].close()
+        finally:
+            _log_writer['file'] = None
+
+
+def rotateLog():
+    """轮转日志文件：chromiumto.log -> chromiumto.log.1 -> ...，超出保留数的文件删除"""
+    with _log_writer['lock']:
+        closeLogFile()
+        log_path = getLogPath()
+        backup_count = _log_writer['backup_count']
+        try:
+            if backup_count > 0:
+                oldest = f"{log_path}.{backup_count}"
+                if os.path.exists(oldest):
+                    os.remove(oldest)
+                for i in range(backup_count - 1, 0, -1):
+                    source = f"{log_path}.{i}"
+                    if os.path.exists(source):
+                        os.replace(source, f"{log_path}.{i + 1}")
+                if os.path.exists(log_path):
+                    os.replace(log_path, f"{log_path}.1")
+            elif os.path.exists(log_path):
+                os.remove(log_path)
+        except OSError:
+            # 文件被占用等原因无法轮转时继续写入当前文件
+            pass
+
+
+def shouldRotate(size, pending_size):
+    """检查文件已有size字节时，写入pending_size字节前是否需要轮转，调用方需持有_log_writer['lock']"""
+    if not size:
+        return False
+    max_size = _log_writer['max_size']
+    if max_size and size + pending_size > max_size:
+        return True
+    rotate_interval = _log_writer['rotate_interval']
+    return bool(rotate_interval) and time.time() - _log_writer['opened'] >= rotate_interval
+
+
+def writeChunk(chunk):
+    """将日志写入当前文件，调用方需持有_log_writer['lock']"""
+    if chunk:
+        f = _log_writer['file']
+        f.write(''.join(chunk))
+        f.flush()
+        _log_writer['size'] = f.tell()
+
+
+def writeEntries(entries):
+    """将一批日志写入文件，逐条检查轮转，在轮转边界处拆分批次"""
+    if not entries:
+        return
+    with _log_writer['lock']:
+        try:
+            openLogFile()
+            size = _log_writer['size']
+            rotate_failed = False
+            chunk = []
+            for entry in entries:
+                entry_size = len(entry.encode('utf-8'))
+                if not rotate_failed and shouldRotate(size, entry_size):
+                    writeChunk(chunk)
+                    chunk = []
+                    rotateLog()
+                    openLogFile()
+                    size = _log_writer['size']
+                    # 轮转失败时本批其余日志继续写入当前文件，不再逐条重试
+                    rotate_failed = size > 0
+                chunk.append(entry)
+                size += entry_size
+            writeChunk(chunk)
+        except Exception:
+            closeLogFile()
+
+
+def logWriterLoop():
+    """后台写入线程：等待日志，取出队列中已有的全部日志后一次写入"""
+    log_queue = _log_writer['queue']
+    while True:
+        try:
+            item = log_queue.get(timeout=LOG_FLUSH_INTERVAL)
+        except queue.Empty:
+            continue
+
+        entries = []
+        waiters = []
+        stop = False
+        while True:
+            if item is None:
+                stop = True
+            elif isinstance(item, threading.Event):
+                waiters.append(item)
+            else:
+                entries.append(item)
+            try:
+                item = log_queue.get_nowait()
+            except queue.Empty:
+                break
+
+        writeEntries(entries)
+        for waiter in waiters:
+            waiter.set()
+        if stop:
+            return
+
+
+def startLogWriter():
+    """启动后台写入线程"""
+    with _log_writer['lock']:
+        thread = _log_writer['thread']
+        if thread is None or not thread.is_alive():
+            thread = threading.Thread(target=logWriterLoop, name='LogWriter', daemon=True)
+            _log_writer['thread'] = thread
+            thread.start()
+        return thread
+
+
+def writeLog(message, level="INFO"):
+    """写入日志，日志先放入队列，由后台线程批量写入文件"""
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+    log_entry = f"[{timestamp}] [{level}] {message}\n"
+
+    try:
+        if _log_writer['stopped']:
+            # 退出后不再有后台线程，直接写入
+            writeEntries([log_entry])
+            return True
+        startLogWriter()
+        _log_writer['queue'].put(log_entry)
+        return True
+    except Exception:
+        return False
+
+
+def flushLog(timeout=LOG_FLUSH_TIMEOUT):
+    """等待队列中的日志全部写入文件"""
+    thread = _log_writer['thread']
+    if thread is None or not thread.is_alive():
+        return True
+    done = threading.Event()
+    _log_writer['queue'].put(done)
+    return done.wait(timeout)
+
+
+def shutdownLog():
+    """写入剩余日志并停止后台线程，退出时调用"""
+    with _log_writer['lock']:
+        _log_writer['stopped'] = True
+        thread = _log_writer['thread']
+    if thread is not None and thread.is_alive():
+        _log_writer['queue'].put(None)
+        thread.join(LOG_FLUSH_TIMEOUT)
+    with _log_writer['lock']:
+        closeLogFile()
+
+
+def clearLog():
+    """清空日志文件"""
+    flushLog()
+    log_path = getLogPath()
+    with _log_writer['lock']:
+        try:
+            closeLogFile()
+            with open(log_path, 'w', encoding='utf-8') as f:
+                f.write("")
+            return True
+        except Exception:
+            return False
+
+
+def getLogContent():
+    """获取日志内容"""
+    flushLog()
+    log_path = getLogPath()
+    try:
+        with open(log_path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except Exception:
+        return ""
+
+
+def getLogFileId(stat):
+    """获取日志文件标识，用于发现日志被轮转或替换"""
+    return (stat.st_dev, stat.st_ino)
+
+
+def readTailLines(f, end, max_lines):
+    """从end位置向前按块读取，返回最后max_lines行（字节）"""
+    data = b''
+    position = end
+    # 多读一个换行符，保证第一行完整
+    while position > 0 and data.count(b'\n') <= max_lines:
+        size = min(LOG_TAIL_BLOCK_SIZE, position)
+        position -= size
+        f.seek(position)
+        data = f.read(size) + data
+    lines = data.splitlines(keepends=True)
+    if position > 0 and len(lines) > max_lines:
+        # 开头可能是不完整的行
+        lines = lines[1:]
+    return lines[-max_lines:] if max_lines else []
+
+
+def getLogTail(max_lines=1000):
+    """获取日志的最后N行，只从文件末尾向前读取，耗时与日志大小无关
+
+    返回(行列表, 游标)，游标传给readLogUpdates可以继续读取之后写入的日志。
+    """
+    flushLog()
+    log_path = getLogPath()
+    try:
+        with open(log_path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            data = b''.join(readTailLines(f, stat.st_size, max_lines))
+            # 最后一行可能还没写完，只返回到最后一个换行符
+            end = stat.st_size - (len(data) - data.rfind(b'\n') - 1)
+            data = data[:data.rfind(b'\n') + 1]
+            cursor = {'offset': end, 'file_id': getLogFileId(stat)}
+            return data.decode('utf-8', 'replace').splitlines(keepends=True), cursor
+    except Exception:
+        return [], {'offset': 0, 'file_id': None}
+
+
+def readLogUpdates(cursor, max_lines=1000):
+    """读取游标之后新写入的日志
+
+    返回(文本, 新游标, 是否重置)。日志被清空或轮转时重置，文本为新日志文件的最后max_lines行。
+    """
+    flushLog()
+    log_path = getLogPath()
+    try:
+        with open(log_path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            if getLogFileId(stat) != cursor.get('file_id') or stat.st_size < cursor.get('offset', 0):
+                lines, new_cursor = getLogTail(max_lines)
+                return ''.join(lines), new_cursor, True
+            f.seek(cursor['offset'])
+            data = f.read(stat.st_size - cursor['offset'])
+    except Exception:
+        return '', cursor, False
+
+    # 只读取完整的行，未写完的行留到下次
+    data = data[:data.rfind(b'\n') + 1]
+    new_cursor = {'offset': cursor['offset'] + len(data), 'file_id': cursor.get('file_id')}
+    return data.decode('utf-8', 'replace'), new_cursor, False
+
+
+def getLogLines(max_lines=1000):
+    """获取日志的最后N行"""
+    return getLogTail(max_lines)[0]
+
+
+# 退出时写入队列中剩余的日志
+atexit.register(shutdownLog)
@@ -1,16 +1,22 @@
 import tkinter as tk
 import os
+import queue
 import ctypes
 import threading
 import requests
 from tkinter import ttk, messagebox, filedialog, PhotoImage
-from utils import getAppDataPath, calculateDirectorySize, calculateChromeFilesSize, formatFileSize
-from config import loadConfig, writeLog
-from scanner import scanSystem, quickScan
+from utils import getAppDataPath, calculateDirectorySize, formatFileSize
+from config import (
+    loadConfig, getConfig, writeLog, configBatch, flushConfig, normalizeAppPath, isAppRedirected, getRedirectedAppPaths,
+    getDetectedApp, getAppsSize, isStateDbEnabled, enableStateDb, disableStateDb
+)
+from scanner import scanSystem, quickScan, throttleProgressCallback
 from redirector import (
     getSharedChromePath, setSharedChromePath,
-    redirectAppToSharedChrome, restoreAppFromSharedChrome,
-    redirectAllApps, restoreAllApps,
+    restoreAppFromSharedChrome,
+    redirectApps, restoreAllApps,
+    planRedirects, summarizeRedirectPlans, isProtectedPath,
+    recoverJournal, getInterruptedBatch, discardInterruptedBatch, checkpointJournal,
     initializeSharedChromeFromApp,
     getBackupDirs, deleteBackup, deleteAllBackups,
     autoDownloadSharedKernel
@@ -26,6 +32,21 @@ CURRENT_VERSION = [1, 1, 2]
 # 版本检查URL
 VERSION_CHECK_URL = 'https://zhuxiaojt.github.io/api/chromiumto/last_version.json'
 
+# 扫描进度每秒最多刷新的次数
+SCAN_PROGRESS_RATE = 20
+
+# 日志窗口显示的最大行数
+LOG_WINDOW_MAX_LINES = 1000
+
+# 日志窗口跟随新日志的刷新间隔（毫秒）
+LOG_WINDOW_FOLLOW_INTERVAL = 1000
+
+# Tk主循环处理后台线程界面更新的间隔（毫秒）
+UI_QUEUE_INTERVAL = 50
+
+# 退出时检查重定向线程是否结束的间隔（毫秒）
+EXIT_CHECK_INTERVAL = 100
+
 # 版本检查结果
 version_check_result = {
     'is_new_version': False,
@@ -91,9 +112,9 @@ def checkVersion():
         version_check_result['message'] = '版本检查失败'
     finally:
         # 更新UI
-        updateVersionLabel()
+        runInUi(updateVersionLabel)
         # 1分钟后重新检查版本
-        root.after(60000,lambda: threading.Thread(target=checkVersion, daemon=True).start())
+        runInUi(root.after, 60000, lambda: threading.Thread(target=checkVersion, daemon=True).start())
 
 # 更新版本标签
 def updateVersionLabel():
@@ -133,14 +154,21 @@ app_tree = None
 status_var = None
 scan_thread = None
 stop_scan_event = None
+redirect_thread = None
+stop_redirect_event = None
 progress_var = None
 progress_bar = None
 progress_frame = None
 shared_dir_label = None
 disk_space_label = None
+state_db_var = None
 # 系统托盘相关变量
 tray_icon = None
 app_in_tray = False
+# 后台线程提交的界面更新，由Tk主循环定时取出执行
+ui_queue = queue.Queue()
+# 磁盘空间统计缓存：共享内核大小和重定向计划汇总，扫描、重定向和恢复后重新计算
+disk_space_cache = {'shared_path': None, 'summary': None}
 
 # 颜色配置 - 完全统一的白色调
 WHITE = '#FFFFFF'  # 纯白色
@@ -308,6 +336,7 @@ def initUI():
     ttk.Button(action_buttons, text="恢复所选", command=restoreSelectedApps).pack(side=tk.LEFT, padx=5)
     ttk.Button(action_buttons, text="重定向全部", command=redirectAll).pack(side=tk.LEFT, padx=5)
     ttk.Button(action_buttons, text="恢复全部", command=restoreAll).pack(side=tk.LEFT, padx=5)
+    ttk.Button(action_buttons, text="停止重定向", command=stopRedirect).pack(side=tk.LEFT, padx=5)
     ttk.Button(action_buttons, text="从所选初始化共享内核", command=initSharedChromeFromSelected).pack(side=tk.LEFT, padx=5)
     ttk.Button(action_buttons, text="自动下载共享内核", command=downloadSharedKernel).pack(side=tk.RIGHT, padx=5)
     ttk.Button(action_buttons, text="选择共享内核路径", command=selectSharedChromePath).pack(side=tk.RIGHT, padx=5)
@@ -329,6 +358,11 @@ def initUI():
     ttk.Button(help_buttons, text="关于", command=lambda: openHelpPage("about.html")).pack(side=tk.RIGHT, padx=5)
     ttk.Button(help_buttons, text="查看日志", command=showLogWindow).pack(side=tk.RIGHT, padx=5)
     
+    # 状态数据库开关
+    global state_db_var
+    state_db_var = tk.BooleanVar(value=isStateDbEnabled())
+    ttk.Checkbutton(help_buttons, text="使用状态数据库", variable=state_db_var, command=toggleStateDb).pack(side=tk.LEFT, padx=5)
+    
     # 版本信息标签
     global version_label
     version_label = ttk.Label(help_buttons, text="")
@@ -343,18 +377,45 @@ def initUI():
     # 初始加载数据
     refreshAppList()
     
+    # 在后台回滚或继续上次中途退出时未完成的重定向和恢复，完成后询问是否继续未完成的批量重定向
+    recoverInterruptedOperations()
+    
     # 启动版本检查线程
     threading.Thread(target=checkVersion, daemon=True).start()
     
     # 绑定窗口关闭事件
     root.protocol("WM_DELETE_WINDOW", onClose)
     
+    # 开始处理后台线程提交的界面更新
+    processUiQueue()
+    
     # 运行主循环
     root.mainloop()
 
+def runInUi(func, *args):
+    """在Tk主线程中执行界面更新
+
+    后台线程不能直接调用Tk：Tk会把调用转交给主线程并等待，主线程在等待后台线程时会互相等待。
+    后台线程只把调用放入队列，由processUiQueue在主循环中执行。
+    """
+    ui_queue.put((func, args))
+
+def processUiQueue():
+    """执行后台线程提交的界面更新，之后定时再次检查"""
+    while True:
+        try:
+            func, args = ui_queue.get_nowait()
+        except queue.Empty:
+            break
+        try:
+            func(*args)
+        except Exception as e:
+            writeLog(f"界面更新失败: {str(e)}", level="ERROR")
+    root.after(UI_QUEUE_INTERVAL, processUiQueue)
+
 def showLogWindow():
     """显示日志窗口"""
-    from config import getLogContent, clearLog
+    from config import getLogTail, readLogUpdates, clearLog
     
     # 创建日志窗口
     log_window = tk.Toplevel(root)
@@ -373,18 +434,47 @@ def showLogWindow():
     scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
     log_text.config(yscrollcommand=scrollbar.set)
     
+    # 已读取到的日志位置，刷新时只读取之后新增的内容
+    log_cursor = {'cursor': None}
+    
+    def showLogText(text, reset):
+        """显示日志文本，reset为True时替换全部内容，否则追加"""
+        if reset:
+            log_text.delete(1.0, tk.END)
+        if text:
+            log_text.insert(tk.END, text)
+            # 只保留最后LOG_WINDOW_MAX_LINES行
+            line_count = int(log_text.index('end-1c').split('.')[0])
+            if line_count > LOG_WINDOW_MAX_LINES + 1:
+                log_text.delete(1.0, f"{line_count - LOG_WINDOW_MAX_LINES}.0")
+        if reset or text:
+            log_text.see(tk.END)
+    
+    def loadLog():
+        """从日志末尾加载最后几行"""
+        lines, log_cursor['cursor'] = getLogTail(LOG_WINDOW_MAX_LINES)
+        showLogText(''.join(lines), True)
+    
     def refreshLog():
-        """刷新日志内容"""
-        log_content = getLogContent()
-        log_text.delete(1.0, tk.END)
-        log_text.insert(tk.END, log_content)
-        log_text.see(tk.END)
+        """刷新日志内容，只读取上次之后新写入的日志"""
+        if log_cursor['cursor'] is None:
+            loadLog()
+            return
+        text, log_cursor['cursor'], reset = readLogUpdates(log_cursor['cursor'], LOG_WINDOW_MAX_LINES)
+        showLogText(text, reset)
+    
+    def followLog():
+        """定时读取新写入的日志，窗口关闭后停止"""
+        if not log_window.winfo_exists():
+            return
+        refreshLog()
+        log_window.after(LOG_WINDOW_FOLLOW_INTERVAL, followLog)
     
     def clearLogContent():
         """清空日志"""
         if messagebox.askyesno("提示", "确定要清空日志吗？"):
             clearLog()
-            refreshLog()
+            loadLog()
     
     # 按钮框架
     button_frame = ttk.Frame(log_window)
@@ -402,8 +492,9 @@ def showLogWindow():
     close_button = ttk.Button(button_frame, text="关闭", command=log_window.destroy)
     close_button.pack(side=tk.RIGHT, padx=5)
     
-    # 初始加载日志
-    refreshLog()
+    # 初始加载日志，之后持续跟随新写入的日志
+    loadLog()
+    log_window.after(LOG_WINDOW_FOLLOW_INTERVAL, followLog)
 
 
 def updateInfoBar():
@@ -420,31 +511,19 @@ def updateInfoBar():
 
 def updateTotalSpaceInfo():
     """更新总占用空间信息"""
-    config = loadConfig()
-    redirected_apps = config['redirected_apps']
-    
     # 计算已重定向应用的总占用空间
-    total_redirected_size = 0
-    for app in redirected_apps:
-        total_redirected_size += app.get('size', 0)
+    total_redirected_size = getAppsSize('redirected_apps')
     
     # 更新信息栏
-    shared_path = getSharedChromePath()
     updateDiskSpaceInfo(total_redirected_size)
 
 
 def updateDiskSpaceInfo(total_redirected_size=0):
     """更新磁盘空间信息 - 只显示已重定向应用节省的空间"""
-    config = loadConfig()
-    detected_apps = config['detected_apps']
-    redirected_apps = config['redirected_apps']
     shared_path = getSharedChromePath()
     
     # 计算未重定向应用的总占用空间
-    total_unredirected_size = 0
-    for app in detected_apps:
-        if app['path'] not in [redirected_app['path'] for redirected_app in redirected_apps]:
-            total_unredirected_size += app.get('size', 0)
+    total_unredirected_size = getAppsSize('detected_apps', exclude_key='redirected_apps')
     
     if not shared_path:
         # 如果没有设置共享内核路径，显示总占用空间
@@ -452,20 +531,41 @@ def updateDiskSpaceInfo(total_redirected_size=0):
         disk_space_label.config(text=f"总占用空间: {formatFileSize(total_space)}")
         return
     
-    # 计算共享内核大小
-    shared_size = calculateDirectorySize(shared_path)
-    
-    # 计算已重定向应用节省的空间
-    if total_redirected_size > 0:
-        saved_space = total_redirected_size - shared_size
-        if saved_space < 0:
-            saved_space = 0
-        # 总占用空间 = 未重定向应用空间 + 共享内核空间
-        total_space = total_unredirected_size + shared_size
-        disk_space_label.config(text=f"总占用空间: {formatFileSize(total_space)} | 已节省空间: {formatFileSize(saved_space)}")
-    else:
-        # 如果没有重定向应用，只显示未重定向应用空间
-        disk_space_label.config(text=f"总占用空间: {formatFileSize(total_unredirected_size)}")
+    shared_size, redirected, pending = getDiskSpaceSummary(shared_path)
+    
+    text = f"总占用空间: {formatFileSize(total_unredirected_size)}"
+    if redirected['redirected'] > 0:
+        # 已节省空间 = 链接到共享内核的文件 - 仍保留的备份 - 共享内核
+        saved_space = max(0, redirected['linked_bytes'] - redirected['backup_bytes'] - shared_size)
+        # 总占用空间 = 未重定向应用空间 + 共享内核空间 + 备份空间
+        total_space = total_unredirected_size + shared_size + redirected['backup_bytes']
+        text = f"总占用空间: {formatFileSize(total_space)} | 已节省空间: {formatFileSize(saved_space)}"
+        if redirected['backup_bytes']:
+            text += f" | 删除备份可释放: {formatFileSize(redirected['backup_bytes'])}"
+    if pending['ready'] > 0:
+        text += f" | 可重定向 {pending['ready']} 个应用，预计节省: {formatFileSize(pending['reclaimable_bytes'])}"
+    disk_space_label.config(text=text)
+
+def getDiskSpaceSummary(shared_path):
+    """获取共享内核大小和已重定向、未重定向应用的计划汇总，返回(共享内核大小, 已重定向, 未重定向)
+
+    需要读取每个内核文件的大小，结果缓存到invalidateDiskSpaceInfo被调用或共享内核路径改变。
+    """
+    if disk_space_cache['summary'] is None or disk_space_cache['shared_path'] != shared_path:
+        shared_size = calculateDirectorySize(shared_path)
+        # 按重定向计划统计实际链接的文件和备份大小，只读取文件大小
+        redirected_paths = getRedirectedAppPaths()
+        redirected = summarizeRedirectPlans(planRedirects(getConfig('redirected_apps'), shared_path, verify_content=False))
+        pending = summarizeRedirectPlans(planRedirects(
+            [app for app in getConfig('detected_apps') if normalizeAppPath(app['path']) not in redirected_paths],
+            shared_path, verify_content=False))
+        disk_space_cache['shared_path'] = shared_path
+        disk_space_cache['summary'] = (shared_size, redirected, pending)
+    return disk_space_cache['summary']
+
+def invalidateDiskSpaceInfo():
+    """扫描、重定向、恢复或删除备份后，下次更新磁盘空间信息时重新计算"""
+    disk_space_cache['summary'] = None
 
 def updateStatus(message):
     """更新状态栏"""
@@ -495,9 +595,7 @@ def addAppToTree(app_info):
         size_display = "-"
     else:
         # 检查是否已经重定向
-        config = loadConfig()
-        redirected_paths = [app['path'] for app in config['redirected_apps']]
-        status = "已重定向" if app_info['path'] in redirected_paths else "未重定向"
+        status = "已重定向" if isAppRedirected(app_info['path']) else "未重定向"
         
         # 根据重定向状态显示占用空间
         if status == "已重定向":
@@ -522,10 +620,10 @@ def clearAppTree():
 def refreshAppList():
     """刷新应用列表"""
     clearAppTree()
-    config = loadConfig()
-    for app in config['detected_apps']:
+    detected_apps = getConfig('detected_apps')
+    for app in detected_apps:
         addAppToTree(app)
-    updateStatus(f"已加载 {len(config['detected_apps'])} 个应用")
+    updateStatus(f"已加载 {len(detected_apps)} 个应用")
     updateInfoBar()
 
 def onScanProgress(data):
@@ -555,6 +653,7 @@ def onScanComplete(apps):
     """扫描完成回调"""
     updateProgress(100, 100)
     updateStatus(f"扫描完成，共发现 {len(apps)} 个Chromium应用")
+    invalidateDiskSpaceInfo()
     updateTotalSpaceInfo()
     hideProgressBar()
     
@@ -566,6 +665,19 @@ def onScanComplete(apps):
             app_name='ChromiumTo'
         )
 
+def createScanCallbacks():
+    """创建扫描回调，扫描进度合并后最多每秒刷新SCAN_PROGRESS_RATE次界面，界面更新在Tk主线程中执行"""
+    progress_callback, flush_progress, progress_stats = throttleProgressCallback(
+        lambda data: runInUi(onScanProgress, data), SCAN_PROGRESS_RATE)
+    
+    def completeCallback(apps):
+        # 送出最后一条进度后再完成
+        flush_progress()
+        writeLog(f"扫描进度刷新 {progress_stats['delivered']} 次，合并 {progress_stats['merged']} 次")
+        runInUi(onScanComplete, apps)
+    
+    return progress_callback, completeCallback
+
 def startQuickScan():
     """开始快速扫描"""
     global scan_thread, stop_scan_event
@@ -581,12 +693,13 @@ def startQuickScan():
     
     # 创建停止事件
     stop_scan_event = threading.Event()
+    progress_callback, complete_callback = createScanCallbacks()
     
     scan_thread = threading.Thread(
         target=quickScan,
         kwargs={
-            'progress_callback': onScanProgress,
-            'complete_callback': onScanComplete,
+            'progress_callback': progress_callback,
+            'complete_callback': complete_callback,
             'stop_event': stop_scan_event
         },
         daemon=True
@@ -609,12 +722,13 @@ def startFullScan():
         
         # 创建停止事件
         stop_scan_event = threading.Event()
+        progress_callback, complete_callback = createScanCallbacks()
         
         scan_thread = threading.Thread(
             target=scanSystem,
             kwargs={
-                'progress_callback': onScanProgress,
-                'complete_callback': onScanComplete,
+                'progress_callback': progress_callback,
+                'complete_callback': complete_callback,
                 'stop_event': stop_scan_event
             },
             daemon=True
@@ -634,7 +748,10 @@ def stopScan():
 
 
 def showMainWindow(icon, item):
-    """显示主界面"""
+    """显示主界面，托盘菜单在托盘线程中调用，交给Tk主线程执行"""
+    if threading.current_thread() is not threading.main_thread():
+        runInUi(showMainWindow, icon, item)
+        return
     global app_in_tray
     if app_in_tray:
         app_in_tray = False
@@ -657,9 +774,25 @@ def openHelpPage(page):
 
 
 def exitApp(icon, item):
-    """退出应用"""
+    """退出应用，托盘菜单在托盘线程中调用，交给Tk主线程执行"""
+    if threading.current_thread() is not threading.main_thread():
+        runInUi(exitApp, icon, item)
+        return
     global app_in_tray
     app_in_tray = False
+    # 取消正在进行的重定向，等待当前应用完成或恢复原始文件
+    # 不在Tk主线程中join，主循环继续处理重定向线程提交的界面更新，线程结束且更新处理完后再退出
+    if redirect_thread and redirect_thread.is_alive():
+        if stop_redirect_event:
+            stop_redirect_event.set()
+        updateStatus("正在停止重定向，完成后退出...")
+        root.after(EXIT_CHECK_INTERVAL, exitApp, icon, item)
+        return
+    if not ui_queue.empty():
+        root.after(EXIT_CHECK_INTERVAL, exitApp, icon, item)
+        return
+    # 写入未保存的配置
+    flushConfig()
     if icon:
         icon.stop()
     if root:
@@ -675,7 +808,7 @@ def createTrayIcon():
     # 创建菜单
     menu = pystray.Menu(
         pystray.MenuItem("显示主界面", showMainWindow),
-        pystray.MenuItem("停止扫描", stopScan),
+        pystray.MenuItem("停止扫描", lambda icon, item: runInUi(stopScan)),
         pystray.MenuItem("退出应用", exitApp)
     )
     # 创建图标
@@ -727,19 +860,144 @@ def getSelectedApps():
     """获取选中的应用"""
     selected_items = app_tree.selection()
     selected_apps = []
-    config = loadConfig()
     
     for item in selected_items:
         values = app_tree.item(item, "values")
         app_path = values[2]  # path列现在是索引2
         # 查找对应的应用信息
-        for app in config['detected_apps']:
-            if app['path'] == app_path:
-                selected_apps.append(app)
-                break
+        app = getDetectedApp(app_path)
+        if app:
+            selected_apps.append(app)
     
     return selected_apps
 
+def recoverInterruptedOperations():
+    """在后台线程中处理上次中途退出时未完成的重定向和恢复，结果记录到日志
+
+    回滚可能需要移动大量文件，不在Tk主线程中执行。处理期间占用redirect_thread，
+    不能开始新的重定向或恢复，退出时等待处理完成。
+    """
+    global redirect_thread, stop_redirect_event
+    
+    def run():
+        results = recoverJournal()
+        for result in results:
+            app = result['app']
+            if result['success']:
+                writeLog(f"{app['name']} ({app['path']}): {result['message']}")
+            else:
+                writeLog(f"{app['name']} ({app['path']}): {result['message']}", level="ERROR")
+        runInUi(onRecoveryComplete, results)
+    
+    updateStatus("正在检查上次未完成的重定向和恢复...")
+    stop_redirect_event = None
+    redirect_thread = threading.Thread(target=run, daemon=True)
+    redirect_thread.start()
+
+def onRecoveryComplete(results):
+    """未完成的操作处理完成，刷新列表后询问是否继续未完成的批量重定向"""
+    if redirect_thread and redirect_thread.is_alive():
+        # 恢复线程提交结果后才结束，等它结束后再开始新的重定向
+        root.after(EXIT_CHECK_INTERVAL, onRecoveryComplete, results)
+        return
+    if results:
+        invalidateDiskSpaceInfo()
+        refreshAppList()
+        updateStatus(f"已处理 {len(results)} 个上次未完成的重定向和恢复，详情见日志")
+    else:
+        updateStatus("就绪")
+    resumeInterruptedBatch()
+
+def resumeInterruptedBatch():
+    """上次批量重定向中途退出时，询问是否继续处理剩余的应用"""
+    tx_ids, remaining = getInterruptedBatch()
+    if not tx_ids:
+        return
+    if remaining and messagebox.askyesno("提示", f"上次批量重定向没有完成，还有 {len(remaining)} 个应用未处理，是否继续？"):
+        writeLog(f"继续上次未完成的批量重定向，共 {len(remaining)} 个")
+        startRedirectBatch(remaining, "继续重定向完成", resume=tx_ids)
+    else:
+        discardInterruptedBatch(tx_ids)
+
+def startRedirectBatch(apps, finish_label, resume=None):
+    """在后台线程中批量重定向应用，不同磁盘上的应用并行处理，可以通过stopRedirect取消
+
+    resume为继续的中断批量任务ID列表。
+    """
+    global redirect_thread, stop_redirect_event
+    
+    if redirect_thread and redirect_thread.is_alive():
+        writeLog("重定向正在进行中", level="WARNING")
+        updateStatus("重定向正在进行中")
+        return
+    
+    total = len(apps)
+    progress = {'done': 0}
+    stop_redirect_event = threading.Event()
+    showProgressBar()
+    updateProgress(0, total)
+    
+    def showResult(result):
+        """在Tk主线程中显示单个应用的处理结果"""
+        progress['done'] += 1
+        updateProgress(progress['done'], total)
+        updateStatus(f"正在重定向 ({progress['done']}/{total}): {result['app']['name']}")
+    
+    def onResult(result):
+        """单个应用处理完成，在工作线程中调用"""
+        app = result['app']
+        if result['success']:
+            writeLog(f"重定向成功：{app['name']} ({app['path']})，耗时 {result['duration']:.2f} 秒")
+        else:
+            writeLog(f"重定向失败：{app['name']} - {result['message']}", level="ERROR")
+        runInUi(showResult, result)
+    
+    def run():
+        # 先生成重定向计划，记录预计释放的空间
+        summary = summarizeRedirectPlans(planRedirects(apps))
+        writeLog(f"重定向计划：可重定向 {summary['ready']} 个，已重定向 {summary['redirected']} 个，"
+                 f"无法重定向 {summary['blocked']} 个，立即释放 {formatFileSize(summary['reclaimed_bytes'])}，"
+                 f"删除备份后共释放 {formatFileSize(summary['reclaimable_bytes'])}")
+        results = redirectApps(apps, stop_event=stop_redirect_event, result_callback=onResult, resume=resume)
+        runInUi(onRedirectBatchComplete, results, finish_label)
+    
+    redirect_thread = threading.Thread(target=run, daemon=True)
+    redirect_thread.start()
+
+def onRedirectBatchComplete(results, finish_label):
+    """批量重定向完成回调"""
+    success_count = sum(1 for r in results if r['success'])
+    cancelled_count = sum(1 for r in results if r['cancelled'])
+    fail_count = len(results) - success_count - cancelled_count
+    
+    # 刷新列表
+    invalidateDiskSpaceInfo()
+    refreshAppList()
+    hideProgressBar()
+    
+    # 记录最终结果到日志
+    result_message = f"{finish_label}：成功 {success_count} 个，失败 {fail_count} 个"
+    if cancelled_count:
+        result_message += f"，取消 {cancelled_count} 个"
+    writeLog(result_message)
+    if fail_count:
+        writeLog("失败详情：", level="ERROR")
+        for result in results:
+            if not result['success'] and not result['cancelled']:
+                writeLog(f"- {result['app']['name']}: {result['message']}", level="ERROR")
+    
+    # 结果已记录到日志，不显示弹窗
+    updateStatus(result_message)
+
+def stopRedirect():
+    """停止批量重定向，正在处理的应用会恢复原始文件"""
+    if redirect_thread and redirect_thread.is_alive() and stop_redirect_event:
+        stop_redirect_event.set()
+        updateStatus("正在停止重定向...")
+    else:
+        writeLog("没有正在进行的重定向", level="INFO")
+        updateStatus("没有正在进行的重定向")
+
 def redirectSelectedApps():
     """重定向所选应用"""
     
@@ -759,45 +1017,14 @@ def redirectSelectedApps():
     # 检查是否以管理员权限运行
     if not isAdmin():
         # 检查目标路径是否需要管理员权限
-        for app in selected_apps:
-            if app['path'].startswith('C:\\Program Files') or app['path'].startswith('C:\\Windows'):
-                writeLog("需要管理员权限执行重定向操作", level="WARNING")
-                restartAsAdmin()
-                return
-    
-    success_count = 0
-    fail_count = 0
-    fail_messages = []
+        if any(isProtectedPath(app['path']) for app in selected_apps):
+            writeLog("需要管理员权限执行重定向操作", level="WARNING")
+            restartAsAdmin()
+            return
     
     # 记录日志
     writeLog(f"开始重定向所选应用，共 {len(selected_apps)} 个")
-    
-    for app in selected_apps:
-        writeLog(f"正在重定向应用：{app['name']} ({app['path']})")
-        success, message = redirectAppToSharedChrome(app)
-        if success:
-            success_count += 1
-            writeLog(f"重定向成功：{app['name']}")
-        else:
-            fail_count += 1
-            # 保存失败信息
-            fail_messages.append(f"{app['name']}: {message}")
-            writeLog(f"重定向失败：{app['name']} - {message}", level="ERROR")
-    
-    # 刷新列表
-    refreshAppList()
-    
-    # 记录最终结果到日志
-    result_message = f"重定向完成：成功 {success_count} 个，失败 {fail_count} 个"
-    writeLog(result_message)
-    if fail_messages:
-        writeLog("失败详情：", level="ERROR")
-        for msg in fail_messages:
-            writeLog(f"- {msg}", level="ERROR")
-    
-    # 结果已记录到日志，不显示弹窗
-    writeLog(f"用户已查看重定向结果：{result_message}")
-    updateStatus(result_message)
+    startRedirectBatch(selected_apps, "重定向完成")
 
 def restoreSelectedApps():
     """恢复所选应用"""
@@ -808,14 +1035,18 @@ def restoreSelectedApps():
         updateStatus("请选择要恢复的应用")
         return
     
+    if redirect_thread and redirect_thread.is_alive():
+        writeLog("重定向正在进行中", level="WARNING")
+        updateStatus("重定向正在进行中")
+        return
+    
     # 检查是否以管理员权限运行
     if not isAdmin():
         # 检查目标路径是否需要管理员权限
-        for app in selected_apps:
-            if app['path'].startswith('C:\Program Files') or app['path'].startswith('C:\Windows'):
-                writeLog("需要管理员权限执行恢复操作", level="WARNING")
-                restartAsAdmin()
-                return
+        if any(isProtectedPath(app['path']) for app in selected_apps):
+            writeLog("需要管理员权限执行恢复操作", level="WARNING")
+            restartAsAdmin()
+            return
     
     success_count = 0
     fail_count = 0
@@ -823,17 +1054,22 @@ def restoreSelectedApps():
     # 记录日志
     writeLog(f"开始恢复所选应用，共 {len(selected_apps)} 个")
     
-    for app in selected_apps:
-        writeLog(f"正在恢复应用：{app['name']} ({app['path']})")
-        success, message = restoreAppFromSharedChrome(app)
-        if success:
-            success_count += 1
-            writeLog(f"恢复成功：{app['name']}")
-        else:
-            fail_count += 1
-            writeLog(f"恢复失败：{app['name']} - {message}", level="ERROR")
+    # 批量修改配置，全部完成后统一写入
+    with configBatch():
+        for app in selected_apps:
+            writeLog(f"正在恢复应用：{app['name']} ({app['path']})")
+            success, message = restoreAppFromSharedChrome(app)
+            if success:
+                success_count += 1
+                writeLog(f"恢复成功：{app['name']}")
+            else:
+                fail_count += 1
+                writeLog(f"恢复失败：{app['name']} - {message}", level="ERROR")
+    # 配置写入后删除预写日志中已结束的恢复
+    checkpointJournal()
     
     # 刷新列表
+    invalidateDiskSpaceInfo()
     refreshAppList()
     
     # 记录最终结果到日志
@@ -856,11 +1092,7 @@ def redirectAll():
     
     # 检查是否需要管理员权限
     config = loadConfig()
-    need_admin = False
-    for app in config['detected_apps']:
-        if app['path'].startswith('C:\Program Files') or app['path'].startswith('C:\Windows'):
-            need_admin = True
-            break
+    need_admin = any(isProtectedPath(app['path']) for app in config['detected_apps'])
     
     if need_admin and not isAdmin():
         writeLog("需要管理员权限执行重定向操作", level="WARNING")
@@ -869,37 +1101,19 @@ def redirectAll():
     
     if messagebox.askyesno("提示", "确定要重定向所有检测到的应用吗？"):
         writeLog("开始重定向所有检测到的应用")
-        results = redirectAllApps()
-        
-        success_count = sum(1 for r in results if r['success'])
-        fail_count = sum(1 for r in results if not r['success'])
-        
-        # 记录详细结果到日志
-        writeLog(f"重定向全部完成：成功 {success_count} 个，失败 {fail_count} 个")
-        if fail_count > 0:
-            writeLog("失败详情：", level="ERROR")
-            for result in results:
-                if not result['success']:
-                    app = result['app']
-                    writeLog(f"- {app['name']}: {result['message']}", level="ERROR")
-        
-        # 刷新列表
-        refreshAppList()
-        
-        # 结果已记录到日志，不显示弹窗
-        writeLog(f"用户已查看全部重定向结果：成功 {success_count} 个，失败 {fail_count} 个")
-        updateStatus(f"重定向全部完成：成功 {success_count} 个，失败 {fail_count} 个")
+        startRedirectBatch(config['detected_apps'], "重定向全部完成")
 
 def restoreAll():
     """恢复所有应用"""
     
+    if redirect_thread and redirect_thread.is_alive():
+        writeLog("重定向正在进行中", level="WARNING")
+        updateStatus("重定向正在进行中")
+        return
+    
     # 检查是否需要管理员权限
     config = loadConfig()
-    need_admin = False
-    for app in config['redirected_apps']:
-        if app['path'].startswith('C:\Program Files') or app['path'].startswith('C:\Windows'):
-            need_admin = True
-            break
+    need_admin = any(isProtectedPath(app['path']) for app in config['redirected_apps'])
     
     if need_admin and not isAdmin():
         writeLog("需要管理员权限执行恢复操作", level="WARNING")
@@ -923,18 +1137,40 @@ def restoreAll():
                     writeLog(f"- {app['name']}: {result['message']}", level="ERROR")
         
         # 刷新列表
+        invalidateDiskSpaceInfo()
         refreshAppList()
         
         # 结果已记录到日志，不显示弹窗
         writeLog(f"用户已查看全部恢复结果：成功 {success_count} 个，失败 {fail_count} 个")
         updateStatus(f"恢复全部完成：成功 {success_count} 个，失败 {fail_count} 个")
 
+def toggleStateDb():
+    """启用或停用SQLite状态数据库，停用时将数据库中的配置导出到config.json"""
+    if (scan_thread and scan_thread.is_alive()) or (redirect_thread and redirect_thread.is_alive()):
+        state_db_var.set(isStateDbEnabled())
+        writeLog("扫描或重定向正在进行中，无法切换状态数据库", level="WARNING")
+        updateStatus("扫描或重定向正在进行中，无法切换状态数据库")
+        return
+    
+    if state_db_var.get():
+        success = enableStateDb()
+        message = "已启用状态数据库" if success else "启用状态数据库失败"
+    else:
+        success = disableStateDb()
+        message = "已停用状态数据库，配置已导出到config.json" if success else "停用状态数据库失败"
+    state_db_var.set(isStateDbEnabled())
+    writeLog(message, level="INFO" if success else "ERROR")
+    updateStatus(message)
+
 def selectSharedChromePath():
     """选择共享内核路径"""
     path = filedialog.askdirectory(title="选择共享Chromium内核目录")
     if path:
-        setSharedChromePath(path)
-        updateStatus(f"共享内核路径已设置：{path}")
+        if setSharedChromePath(path):
+            updateStatus(f"共享内核路径已设置：{path}")
+        else:
+            writeLog(f"无法保存共享内核路径：{path}", level="ERROR")
+            updateStatus("无法保存共享内核路径")
         updateInfoBar()
 
 def downloadSharedKernel():
@@ -945,19 +1181,20 @@ def downloadSharedKernel():
         updateProgress(0, 100)
         updateStatus("开始下载共享内核...")
         
-        def downloadCallback(current, total, type='download'):
-            """下载进度回调"""
+        def showDownloadProgress(current, total, type):
+            """在Tk主线程中显示下载进度"""
             updateProgress(current, total)
             if type == 'download':
                 updateStatus(f"下载中: {formatFileSize(current)} / {formatFileSize(total)}")
             else:
                 updateStatus(f"解压中: {current} / {total} 文件")
         
-        def downloadTask():
-            """下载任务，在独立线程中执行"""
-            # 执行下载
-            success, message = autoDownloadSharedKernel(downloadCallback)
-            
+        def downloadCallback(current, total, type='download'):
+            """下载进度回调，在下载线程中调用"""
+            runInUi(showDownloadProgress, current, total, type)
+        
+        def downloadComplete(success, message):
+            """下载完成，在Tk主线程中执行"""
             # 隐藏进度条
             hideProgressBar()
             
@@ -965,11 +1202,17 @@ def downloadSharedKernel():
             if success:
                 writeLog(f"共享内核下载成功：{message}")
                 updateStatus("共享内核下载成功")
+                invalidateDiskSpaceInfo()
                 updateInfoBar()
             else:
                 writeLog(f"共享内核下载失败：{message}", level="ERROR")
                 updateStatus("共享内核下载失败")
         
+        def downloadTask():
+            """下载任务，在独立线程中执行"""
+            success, message = autoDownloadSharedKernel(downloadCallback)
+            runInUi(downloadComplete, success, message)
+        
         # 创建并启动下载线程
         download_thread = threading.Thread(target=downloadTask, daemon=True)
         download_thread.start()
@@ -987,6 +1230,7 @@ def initSharedChromeFromSelected():
     if success:
         writeLog(f"共享内核初始化成功：{message}")
         updateStatus(f"共享内核已从 {app['name']} 初始化")
+        invalidateDiskSpaceInfo()
         updateInfoBar()
     else:
         writeLog(f"共享内核初始化失败：{message}", level="ERROR")
@@ -1069,6 +1313,8 @@ def clearBackups():
         # 生成结果消息
         result_message = f"备份删除完成：成功 {success_count} 个，失败 {fail_count} 个"
         writeLog(result_message)
+        invalidateDiskSpaceInfo()
+        updateInfoBar()
         
         # 显示结果提示
         messagebox.showinfo("提示", result_message)
@@ -1096,6 +1342,8 @@ def clearBackups():
         # 生成结果消息
         result_message = f"所有备份删除完成：成功 {success_count} 个，失败 {fail_count} 个"
         writeLog(result_message)
+        invalidateDiskSpaceInfo()
+        updateInfoBar()
         
         # 显示结果提示
         messagebox.showinfo("提示", result_message)
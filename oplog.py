@@ -0,0 +1,347 @@
+"""结构化操作日志
+
+每个操作（扫描、重定向、恢复、删除备份等）写入一行JSON到operations.jsonl，
+记录操作类型、应用路径、耗时、移动的字节数、结果和错误类型。
+旁边的operations.idx为定长二进制索引，查询时先在索引中按时间二分查找、
+按应用和操作的哈希过滤，只解析命中的日志行。
+
+用法：
+    python oplog.py --app "C:\\Program Files\\App" --operation redirect --level ERROR
+"""
+import os
+import sys
+import json
+import time
+import mmap
+import zlib
+import struct
+import bisect
+import argparse
+import functools
+import threading
+from utils import getAppDataPath
+from config import getConfig, normalizeAppPath
+
+OPERATION_LOG_FILE_NAME = 'operations.jsonl'
+OPERATION_INDEX_FILE_NAME = 'operations.idx'
+
+# 索引记录：日志行偏移、行长度、时间、应用路径哈希、操作哈希、级别
+INDEX_RECORD = struct.Struct('<QIdIIB3x')
+
+# 日志级别在索引中的编码
+LEVEL_CODES = {'DEBUG': 1, 'INFO': 2, 'WARNING': 3, 'ERROR': 4}
+
+# 操作日志写入状态
+_operation_log = {
+    'lock': threading.RLock(),
+    'local': threading.local()
+}
+
+
+def getOperationLogPath():
+    """获取结构化操作日志路径"""
+    return os.path.join(getAppDataPath(), OPERATION_LOG_FILE_NAME)
+
+
+def getOperationIndexPath():
+    """获取操作日志索引路径"""
+    return os.path.join(getAppDataPath(), OPERATION_INDEX_FILE_NAME)
+
+
+def isOperationLogEnabled():
+    """检查是否启用了结构化操作日志"""
+    return bool(getConfig('structured_log', False))
+
+
+def hashKey(value):
+    """计算索引中使用的哈希，空值为0"""
+    if not value:
+        return 0
+    return zlib.crc32(value.encode('utf-8')) or 1
+
+
+def appKey(app_path):
+    """计算应用路径的哈希"""
+    return hashKey(normalizeAppPath(app_path)) if app_path else 0
+
+
+def makeIndexRecord(offset, length, event):
+    """生成一条索引记录"""
+    return INDEX_RECORD.pack(
+        offset, length, event.get('time', 0.0),
+        appKey(event.get('app_path')), hashKey(event.get('operation')),
+        LEVEL_CODES.get(event.get('level'), 0)
+    )
+
+
+def syncIndex():
+    """补全索引中缺少的日志行，日志被清空或替换后重建索引，返回索引中最后一条记录的时间
+
+    调用方需持有_operation_log['lock']。
+    """
+    log_path = getOperationLogPath()
+    index_path = getOperationIndexPath()
+    try:
+        log_size = os.path.getsize(log_path)
+    except OSError:
+        log_size = 0
+
+    indexed_end = 0
+    last_time = 0.0
+    try:
+        with open(index_path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            index_size = f.tell() - f.tell() % INDEX_RECORD.size
+            if index_size:
+                f.seek(index_size - INDEX_RECORD.size)
+                offset, length, last_time = INDEX_RECORD.unpack(f.read(INDEX_RECORD.size))[:3]
+                indexed_end = offset + length
+    except OSError:
+        index_size = 0
+
+    if indexed_end > log_size:
+        # 日志被清空或替换，重建索引
+        indexed_end = 0
+        index_size = 0
+        last_time = 0.0
+    if indexed_end == log_size and os.path.exists(index_path):
+        return last_time
+
+    records = []
+    if log_size > indexed_end:
+        with open(log_path, 'rb') as f:
+            f.seek(indexed_end)
+            offset = indexed_end
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # 未写完的行留到下次
+                    break
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    event = {}
+                records.append(makeIndexRecord(offset, len(line), event))
+                last_time = max(last_time, event.get('time', 0.0))
+                offset += len(line)
+
+    with open(index_path, 'r+b' if os.path.exists(index_path) else 'wb') as f:
+        f.truncate(index_size)
+        f.seek(index_size)
+        f.write(b''.join(records))
+    return last_time
+
+
+def appendOperation(event):
+    """写入一条操作日志和对应的索引记录
+
+    时间在持有锁时记录，并且不早于索引中最后一条记录，多个线程同时写入或系统时间被调回时，
+    索引仍然按时间排序，查询时可以二分查找。
+    """
+    with _operation_log['lock']:
+        event['time'] = max(time.time(), syncIndex())
+        line = (json.dumps(event, ensure_ascii=False) + '\n').encode('utf-8')
+        with open(getOperationLogPath(), 'ab') as f:
+            offset = f.tell()
+            f.write(line)
+        with open(getOperationIndexPath(), 'ab') as f:
+            f.write(makeIndexRecord(offset, len(line), event))
+
+
+def logOperation(operation, app_path=None, duration=None, bytes_moved=0, outcome='success', error=None, message='', level=None):
+    """记录一次操作，未启用结构化日志时不记录
+
+    outcome为success、failure、cancelled或error，error为异常类型名称。
+    """
+    try:
+        if not isOperationLogEnabled():
+            return False
+        if level is None:
+            level = 'INFO' if outcome == 'success' else 'ERROR'
+        # 时间由appendOperation在写入时记录
+        event = {
+            'time': None,
+            'level': level,
+            'operation': operation,
+            'app_path': app_path or '',
+            'duration': round(duration, 6) if duration is not None else None,
+            'bytes': bytes_moved,
+            'outcome': outcome,
+            'error': error,
+            'message': message
+        }
+        appendOperation(event)
+        return True
+    except Exception:
+        return False
+
+
+def getCurrentOperation():
+    """获取当前线程正在记录的操作，没有时返回None"""
+    return getattr(_operation_log['local'], 'operation', None)
+
+
+def recordOperationBytes(size):
+    """累加当前操作移动的字节数"""
+    operation = getCurrentOperation()
+    if operation is not None:
+        operation['bytes'] += size
+
+
+def recordOperationError(error):
+    """记录当前操作捕获的异常类型"""
+    operation = getCurrentOperation()
+    if operation is not None and operation['error'] is None:
+        operation['error'] = type(error).__name__
+
+
+def loggedOperation(operation):
+    """装饰器：记录函数的耗时和结果
+
+    函数的第一个参数为应用信息字典或应用路径；返回(成功, 消息)或布尔值。
+    函数内部可以调用recordOperationBytes和recordOperationError补充记录。
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            target = args[0] if args else None
+            app_path = target.get('path', '') if isinstance(target, dict) else target
+            local = _operation_log['local']
+            parent = getattr(local, 'operation', None)
+            current = {'bytes': 0, 'error': None}
+            local.operation = current
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                local.operation = parent
+                logOperation(operation, app_path, time.perf_counter() - start, current['bytes'],
+                             'error', type(e).__name__, str(e))
+                raise
+            local.operation = parent
+
+            if isinstance(result, tuple) and result:
+                success, message = bool(result[0]), str(result[1]) if len(result) > 1 else ''
+            else:
+                success, message = bool(result), ''
+            logOperation(operation, app_path, time.perf_counter() - start, current['bytes'],
+                         'success' if success else 'failure', current['error'], message)
+            return result
+        return wrapper
+    return decorator
+
+
+def queryOperations(app_path=None, operation=None, level=None, since=None, until=None, limit=None):
+    """查询操作日志，按写入顺序返回匹配的事件
+
+    since和until为时间戳，limit限制返回最后多少条。
+    时间范围在索引中二分查找，应用、操作和级别先按索引中的哈希过滤，再用解析后的事件确认。
+    """
+    with _operation_log['lock']:
+        syncIndex()
+        log_path = getOperationLogPath()
+        index_path = getOperationIndexPath()
+        if not os.path.exists(log_path) or not os.path.getsize(index_path):
+            return []
+
+        app_hash = appKey(app_path) if app_path else None
+        normalized_app = normalizeAppPath(app_path) if app_path else None
+        operation_hash = hashKey(operation) if operation else None
+        level_code = LEVEL_CODES.get(level, 0) if level else None
+
+        events = []
+        with open(index_path, 'rb') as index_file, open(log_path, 'rb') as log_file:
+            with mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ) as index:
+                count = len(index) // INDEX_RECORD.size
+                times = IndexTimes(index, count)
+                first = bisect.bisect_left(times, since) if since is not None else 0
+                last = bisect.bisect_right(times, until) if until is not None else count
+
+                # 从后向前查找，满足limit后停止
+                for i in range(last - 1, first - 1, -1):
+                    offset, length, _, record_app, record_operation, record_level = INDEX_RECORD.unpack_from(
+                        index, i * INDEX_RECORD.size)
+                    if app_hash is not None and record_app != app_hash:
+                        continue
+                    if operation_hash is not None and record_operation != operation_hash:
+                        continue
+                    if level_code is not None and record_level != level_code:
+                        continue
+                    log_file.seek(offset)
+                    try:
+                        event = json.loads(log_file.read(length))
+                    except ValueError:
+                        continue
+                    # 哈希可能冲突，用事件内容确认
+                    if normalized_app is not None and normalizeAppPath(event.get('app_path') or '') != normalized_app:
+                        continue
+                    if operation is not None and event.get('operation') != operation:
+                        continue
+                    if level is not None and event.get('level') != level:
+                        continue
+                    events.append(event)
+                    if limit and len(events) >= limit:
+                        break
+
+        events.reverse()
+        return events
+
+
+class IndexTimes:
+    """按下标读取索引中的时间，用于bisect二分查找"""
+
+    def __init__(self, index, count):
+        self.index = index
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        return INDEX_RECORD.unpack_from(self.index, i * INDEX_RECORD.size)[2]
+
+
+def clearOperationLog():
+    """清空操作日志和索引"""
+    with _operation_log['lock']:
+        try:
+            for path in (getOperationLogPath(), getOperationIndexPath()):
+                if os.path.exists(path):
+                    os.remove(path)
+            return True
+        except Exception:
+            return False
+
+
+def parseTime(value):
+    """解析命令行中的时间，支持时间戳和YYYY-MM-DD[ HH:MM:SS]"""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
+        try:
+            return time.mktime(time.strptime(value, fmt))
+        except ValueError:
+            continue
+    raise argparse.ArgumentTypeError(f"无法解析时间: {value}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='查询ChromiumTo结构化操作日志')
+    parser.add_argument('--app', help='应用路径')
+    parser.add_argument('--operation', help='操作类型，如scan、redirect、restore')
+    parser.add_argument('--level', help='日志级别，如INFO、ERROR')
+    parser.add_argument('--since', type=parseTime, help='开始时间')
+    parser.add_argument('--until', type=parseTime, help='结束时间')
+    parser.add_argument('--limit', type=int, help='最多返回最后多少条')
+    args = parser.parse_args(argv)
+
+    for event in queryOperations(args.app, args.operation, args.level, args.since, args.until, args.limit):
+        print(json.dumps(event, ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,188 @@
+import os
+import mmap
+import struct
+import threading
+
+# PE文件的机器类型
+MACHINE_TYPES = {
+    0x014c: 'x86',
+    0x8664: 'x64',
+    0xaa64: 'arm64',
+    0x01c4: 'arm',
+}
+
+# 资源类型RT_VERSION
+RT_VERSION = 16
+
+# VS_FIXEDFILEINFO的签名
+VS_FIXEDFILEINFO_SIGNATURE = 0xFEEF04BD
+
+# PE头部最多读取的字节数
+PE_HEADER_READ_SIZE = 4096
+
+# 按(路径, 大小, 修改时间)缓存解析结果
+_pe_info_cache = {}
+_pe_info_cache_lock = threading.Lock()
+
+
+def readPEHeaders(f):
+    """读取PE头部，返回(机器类型, 节表, 资源目录RVA)"""
+    header = f.read(PE_HEADER_READ_SIZE)
+    if len(header) < 64 or header[:2] != b'MZ':
+        raise ValueError("不是有效的PE文件")
+
+    pe_offset = struct.unpack_from('<I', header, 0x3C)[0]
+    if pe_offset + 24 > len(header):
+        # PE头不在开头的4KB内，单独读取
+        if pe_offset > 1024 * 1024:
+            raise ValueError("PE头偏移无效")
+        f.seek(pe_offset)
+        header = b'\0' * pe_offset + f.read(PE_HEADER_READ_SIZE)
+    if header[pe_offset:pe_offset + 4] != b'PE\0\0':
+        raise ValueError("缺少PE签名")
+
+    machine, section_count = struct.unpack_from('<HH', header, pe_offset + 4)
+    optional_size = struct.unpack_from('<H', header, pe_offset + 20)[0]
+    optional_offset = pe_offset + 24
+
+    magic = struct.unpack_from('<H', header, optional_offset)[0]
+    if magic == 0x10b:
+        # PE32
+        directory_offset = optional_offset + 96
+    elif magic == 0x20b:
+        # PE32+
+        directory_offset = optional_offset + 112
+    else:
+        raise ValueError("未知的可选头类型")
+
+    # 资源目录是第3个数据目录
+    directory_count = struct.unpack_from('<I', header, directory_offset - 4)[0]
+    resource_rva = 0
+    if directory_count > 2:
+        resource_rva = struct.unpack_from('<I', header, directory_offset + 2 * 8)[0]
+
+    sections = []
+    section_offset = optional_offset + optional_size
+    if section_offset + section_count * 40 > len(header):
+        raise ValueError("节表超出头部范围")
+    for i in range(section_count):
+        name, virtual_size, virtual_address, raw_size, raw_pointer = struct.unpack_from(
+            '<8sIIII', header, section_offset + i * 40)
+        sections.append({
+            'name': name.rstrip(b'\0').decode('ascii', 'replace'),
+            'virtual_address': virtual_address,
+            'virtual_size': virtual_size,
+            'raw_size': raw_size,
+            'raw_pointer': raw_pointer
+        })
+
+    return machine, sections, resource_rva
+
+
+def findVersionResource(data, base, resource_rva):
+    """在资源目录中查找版本资源，base为资源目录在data中的偏移，返回版本资源在data中的偏移和大小"""
+    def readDirectory(offset):
+        named_count, id_count = struct.unpack_from('<HH', data, base + offset + 12)
+        entries = []
+        for i in range(named_count + id_count):
+            name, target = struct.unpack_from('<II', data, base + offset + 16 + i * 8)
+            entries.append((name, target))
+        return entries
+
+    # 第一层：资源类型
+    offset = None
+    for name, target in readDirectory(0):
+        if not name & 0x80000000 and name == RT_VERSION and target & 0x80000000:
+            offset = target & 0x7FFFFFFF
+            break
+    if offset is None:
+        return None
+
+    # 第二层资源名称和第三层语言，各取第一项
+    for _ in range(2):
+        entries = readDirectory(offset)
+        if not entries:
+            return None
+        target = entries[0][1]
+        offset = target & 0x7FFFFFFF
+        if not target & 0x80000000:
+            break
+
+    data_rva, size = struct.unpack_from('<II', data, base + offset)
+    return base + data_rva - resource_rva, size
+
+
+def parseFixedFileInfo(data, offset, size):
+    """解析VS_VERSIONINFO中的VS_FIXEDFILEINFO，返回文件版本和产品版本"""
+    signature = struct.pack('<I', VS_FIXEDFILEINFO_SIGNATURE)
+    position = data.find(signature, offset, offset + min(size, 256))
+    if position < 0:
+        return None
+    file_ms, file_ls, product_ms, product_ls = struct.unpack_from('<IIII', data, position + 8)
+    return {
+        'file_version': f"{file_ms >> 16}.{file_ms & 0xFFFF}.{file_ls >> 16}.{file_ls & 0xFFFF}",
+        'product_version': f"{product_ms >> 16}.{product_ms & 0xFFFF}.{product_ls >> 16}.{product_ls & 0xFFFF}"
+    }
+
+
+def readPEInfo(path):
+    """读取PE文件的版本和机器类型，只读取头部和资源节
+
+    返回{'file_version', 'product_version', 'machine'}，没有版本资源时版本为None。
+    """
+    with open(path, 'rb') as f:
+        machine, sections, resource_rva = readPEHeaders(f)
+        info = {
+            'file_version': None,
+            'product_version': None,
+            'machine': MACHINE_TYPES.get(machine, hex(machine))
+        }
+        if not resource_rva:
+            return info
+
+        section = None
+        for candidate in sections:
+            start = candidate['virtual_address']
+            if start <= resource_rva < start + max(candidate['virtual_size'], candidate['raw_size']):
+                section = candidate
+                break
+        if section is None or not section['raw_size']:
+            return info
+
+        # 只映射资源节，映射起点需要按分配粒度对齐
+        map_offset = section['raw_pointer'] - section['raw_pointer'] % mmap.ALLOCATIONGRANULARITY
+        base = section['raw_pointer'] - map_offset
+        length = base + section['raw_size']
+        file_size = os.fstat(f.fileno()).st_size
+        length = min(length, file_size - map_offset)
+        with mmap.mmap(f.fileno(), length, offset=map_offset, access=mmap.ACCESS_READ) as data:
+            # 资源目录可能不在节的开头
+            base += resource_rva - section['virtual_address']
+            resource = findVersionResource(data, base, resource_rva)
+            if resource:
+                version = parseFixedFileInfo(data, resource[0], resource[1])
+                if version:
+                    info.update(version)
+        return info
+
+
+def getPEInfo(path):
+    """获取PE文件信息，按(路径, 大小, 修改时间)缓存，无法解析时返回None"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+    with _pe_info_cache_lock:
+        if key in _pe_info_cache:
+            return _pe_info_cache[key]
+
+    try:
+        info = readPEInfo(path)
+    except (OSError, ValueError, struct.error):
+        info = None
+
+    with _pe_info_cache_lock:
+        _pe_info_cache[key] = info
+    return info
@@ -1,126 +1,54 @@
 import os
+import sys
+import json
+import time
+import errno
 import shutil
+import threading
 import subprocess
-from utils import getAppDataPath
-from config import loadConfig, updateConfig, addRedirectedApp, removeRedirectedApp
+import argparse
+import collections
+from utils import calculateDirectorySize, formatFileSize
+from config import (
+    loadConfig, updateConfig, getConfig, normalizeAppPath, addRedirectedApp, removeRedirectedApp, configBatch, flushConfig,
+    recordRedirectEntries, recordBackup, removeBackupRecord, getRedirectEntries, getBackupRecords, getRedirectedApp
+)
+from oplog import loggedOperation, recordOperationBytes, recordOperationError
 from downloader import downloadChromiumKernel, getSharedKernelPath, cleanupDownloadFiles
+from kernelfiles import classifyDirectory
+from kernelstore import addKernelVersion, getKernelVersionPath, removeKernelVersion, detectKernelVersion, listKernelVersions, getStoreSize
+from fingerprint import isSameContent, getFingerprint, flushFingerprintCache
+from journal import (
+    beginTransaction, logStep, commitTransaction, abortTransaction,
+    readTransactions, getIncompleteTransactions, compactJournal, lockJournal
+)
 
-def createSharedChromeDir():
-    """创建共享Chrome目录"""
-    shared_dir = os.path.join(getAppDataPath(), 'SharedChrome')
-    os.makedirs(shared_dir, exist_ok=True)
-    return shared_dir
+# 批量重定向时自动选择的最大线程数
+MAX_REDIRECT_WORKERS = 4
+
+# Windows跨卷移动文件的错误码
+ERROR_NOT_SAME_DEVICE = 17
+
+# Windows目录联接的重解析点标签，Python 3.12之前的stat模块在非Windows平台上没有定义
+IO_REPARSE_TAG_MOUNT_POINT = 0xA0000003
+
+# 备份目录中记录与共享内核内容相同、未备份就直接链接的文件
+IDENTICAL_FILES_NAME = 'identical_files.json'
 
 def getSharedChromePath():
     """获取共享Chrome路径"""
-    return loadConfig().get('shared_chrome_path', '')
+    return getConfig('shared_chrome_path', '')
 
 def setSharedChromePath(path):
-    """设置共享Chrome路径"""
-    return updateConfig('shared_chrome_path', path)
+    """设置共享Chrome路径，立即写入磁盘，返回是否保存成功"""
+    return updateConfig('shared_chrome_path', path, persist=True)
 
-def copyChromeFiles(source_path, target_path):
-    """复制Chrome文件到共享目录，支持Electron和CEF框架"""
-    try:
-        # 确保目标目录存在
-        os.makedirs(target_path, exist_ok=True)
-        
-        # 1. 定义需要复制的Chromium核心文件类型
-        chromium_core_files = [
-            # Chrome/Edge/Brave核心DLL
-            'chrome.dll', 'chrome_elf.dll',
-            'msedge.dll', 'msedge_elf.dll',
-            'brave.dll', 'brave_elf.dll',
-            'libcef.dll', 'cef_sandbox.dll',
-            # 多媒体和安全相关
-            'widevinecdmadapter.dll', 'widevinecdmadapter64.dll',
-            'pdf.dll', 'ui.dll',
-            # V8引擎和核心资源
-            'v8_context_snapshot.bin',
-            'natives_blob.bin', 'snapshot_blob.bin',
-            'icudtl.dat',
-            # 图形相关核心文件
-            'libEGL.dll', 'libGLESv2.dll',
-        ]
-        
-        # 2. 定义需要复制的.pak资源文件
-        chromium_pak_files = [
-            'chrome_100_percent.pak',
-            'chrome_200_percent.pak',
-            'resources.pak',
-        ]
-        
-        # 3. 排除的文件模式
-        excluded_patterns = [
-            # 系统API集文件
-            'api-ms-win-',
-            'ext-ms-win-',
-            # C++运行时库
-            'msvcp',
-            'vcruntime',
-            'concrt140',
-            'ucrtbase',
-            # 第三方库
-            '7-zip.dll',
-            'ffmpeg.dll',
-            'libzmq-',
-            'sqlite3',
-            # 图形驱动相关
-            'd3dcompiler_',
-            'vk_swiftshader.dll',
-            'vulkan-1.dll',
-            # Qt框架
-            'Qt5',
-            # 其他非Chromium核心文件
-            'adj.dll',
-            'aria2c.exe',
-            'CrashHunter_PC3.dll',
-            'FeverGames',
-            'IPCPlugin.dll',
-            'mpay.dll',
-            'NtUniSdk',
-            'OrbitSDK.dll',
-            'QCefView.dll',
-            'rlottie.dll',
-            'TxBugReport.exe',
-            'UniCrashReporter.exe',
-            'WXWorkWeb.exe',
-            'xyvodsdk.dll',
-        ]
-        
-        # 4. 复制核心DLL文件
-        for file in chromium_core_files:
-            source_file = os.path.join(source_path, file)
-            if os.path.exists(source_file):
-                # 检查是否是排除的文件
-                if any(pattern in file for pattern in excluded_patterns):
-                    continue
-                target_file = os.path.join(target_path, file)
-                shutil.copy2(source_file, target_file)
-        
-        # 5. 复制匹配的.pak文件
-        for file in os.listdir(source_path):
-            if file.endswith('.pak'):
-                # 检查是否是需要的pak文件
-                if any(pak in file for pak in chromium_pak_files):
-                    # 检查是否是排除的文件
-                    if any(pattern in file for pattern in excluded_patterns):
-                        continue
-                    source_file = os.path.join(source_path, file)
-                    target_file = os.path.join(target_path, file)
-                    shutil.copy2(source_file, target_file)
-        
-        # 6. 复制通用的核心可执行文件
-        common_exe = ['chrome.exe', 'electron.exe']
-        for file in common_exe:
-            source_file = os.path.join(source_path, file)
-            if os.path.exists(source_file):
-                target_file = os.path.join(target_path, file)
-                shutil.copy2(source_file, target_file)
-        
-        return True
-    except Exception as e:
-        return False
+def getSharedKernelFiles(source_path):
+    """获取共享内核需要的文件，支持Chrome、Edge、Brave、Electron和CEF框架，文件由内核文件清单决定
+
+    目录不存在或无法访问时抛出OSError。
+    """
+    return classifyDirectory(source_path)['share']
 
 def createSymlink(source, target):
     """创建符号链接"""
@@ -137,9 +65,9 @@ def createSymlink(source, target):
         source = os.path.abspath(source)
         target = os.path.abspath(target)
         
-        # 使用Windows格式路径
-        source = source.replace('/', '\\')
-        target = target.replace('/', '\\')
+        # 使用当前系统格式的路径（Windows下为反斜杠）
+        source = os.path.normpath(source)
+        target = os.path.normpath(target)
         
         # 3. 调试信息
         debug_msg = f"创建符号链接: 源={source}, 目标={target}"
@@ -171,6 +99,13 @@ def createSymlink(source, target):
             capture_output=True,
             text=True
         )
+        if result.returncode != 0 and is_dir:
+            # 目录符号链接需要管理员权限，改用不需要权限的目录联接
+            result = subprocess.run(
+                ['cmd', '/c', 'mklink', '/J', target, source],
+                capture_output=True,
+                text=True
+            )
         
         # 7. 检查结果
         if result.returncode == 0:
@@ -184,80 +119,174 @@ def createSymlink(source, target):
     except Exception as e:
         return False, f"创建符号链接失败: {str(e)}"
 
-def backupOriginalFiles(app_path):
-    """备份原始文件"""
+def getKernelFiles(app_path):
+    """获取应用目录中需要备份和重定向的内核文件，文件由内核文件清单决定
+
+    目录不存在或无法访问时抛出OSError，由调用方作为错误报告，不当作没有内核文件。
+    """
+    return classifyDirectory(app_path)['link']
+
+def isLinkPath(path):
+    """检查路径是否是符号链接或目录联接"""
+    if os.path.islink(path):
+        return True
+    isjunction = getattr(os.path, 'isjunction', None)
+    if isjunction:
+        return isjunction(path)
+    # Python 3.12之前没有os.path.isjunction，按重解析点标签识别目录联接
+    try:
+        return getattr(os.lstat(path), 'st_reparse_tag', 0) == IO_REPARSE_TAG_MOUNT_POINT
+    except OSError:
+        return False
+
+def readLinkTarget(path):
+    """读取符号链接或目录联接指向的路径，去掉目录联接返回的\\\\?\\前缀"""
+    target = os.readlink(path)
+    if target.startswith('\\\\?\\'):
+        target = target[4:]
+    return target
+
+def removePath(path):
+    """删除文件、目录或链接，目录链接只删除链接本身"""
+    if isLinkPath(path):
+        try:
+            os.remove(path)
+        except (IsADirectoryError, PermissionError):
+            # Windows上目录符号链接和目录联接需要用rmdir删除
+            os.rmdir(path)
+    elif os.path.isdir(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+def getPathSize(path):
+    """获取文件或目录的大小，链接按指向的内容计算，不存在时返回0"""
+    if os.path.isdir(path):
+        return calculateDirectorySize(path)
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        return 0
+
+def isCrossDeviceError(error):
+    """检查是否是跨卷移动文件的错误"""
+    return error.errno == errno.EXDEV or getattr(error, 'winerror', None) == ERROR_NOT_SAME_DEVICE
+
+def backupOriginalFiles(app_path, files=None, move=False):
+    """备份原始文件
+
+    files为要备份的文件，默认备份全部内核文件。move为True时用os.replace把文件移动到备份目录，
+    不复制文件内容；备份目录在另一个卷上时退回为复制，原文件保留。
+    移动失败时把已移动的文件移回原处并返回空列表。
+    """
     backup_dir = os.path.join(app_path, 'backup_chrome')
     os.makedirs(backup_dir, exist_ok=True)
     
+    backed_up_files = []
+    moved_files = []
     try:
-        # 只备份Chromium相关的核心文件，不备份系统DLL和非Chromium文件
-        # 1. 主要的Chrome/Edge/Brave核心文件
-        chromium_core_files = [
-            # Chrome/Edge/Brave核心DLL
-            'chrome.dll', 'chrome_elf.dll',
-            'msedge.dll', 'msedge_elf.dll',
-            'brave.dll', 'brave_elf.dll',
-            'libcef.dll', 'cef_sandbox.dll',
-            'electron.exe',
-            # 多媒体和安全相关
-            'widevinecdmadapter.dll', 'widevinecdmadapter64.dll',
-            'pdf.dll', 'ui.dll',
-            # V8引擎和核心资源
-            'v8_context_snapshot.bin',
-            'natives_blob.bin', 'snapshot_blob.bin',
-            'icudtl.dat',
-        ]
-        
-        # 2. 只备份特定的.pak资源文件
-        chromium_pak_files = [
-            'chrome_100_percent.pak',
-            'chrome_200_percent.pak',
-            'resources.pak',
-            'locales',
-        ]
-        
-        # 3. 合并所有需要备份的文件
-        all_files = chromium_core_files.copy()
-        
-        # 添加匹配的.pak文件
-        for file in os.listdir(app_path):
-            if file.endswith('.pak') and any(pak in file for pak in chromium_pak_files):
-                if file not in all_files:
-                    all_files.append(file)
+        if files is None:
+            files = getKernelFiles(app_path)
         
-        # 4. 排除系统API集文件和其他非Chromium文件
-        excluded_patterns = [
-            'api-ms-win-',
-            'ext-ms-win-',
-            'msvcp',
-            'vcruntime',
-            'd3dcompiler_',
-            '7-zip.dll',
-            'ffmpeg.dll',
-        ]
-        
-        # 过滤文件列表
-        filtered_files = []
-        for file in all_files:
-            # 检查是否是排除的文件
-            if any(pattern in file for pattern in excluded_patterns):
-                continue
-            filtered_files.append(file)
-        
-        backed_up_files = []
-        for file in filtered_files:
+        for file in files:
             source_file = os.path.join(app_path, file)
-            if os.path.exists(source_file):
-                target_file = os.path.join(backup_dir, file)
+            if not os.path.exists(source_file):
+                continue
+            target_file = os.path.join(backup_dir, file)
+            if move:
+                try:
+                    os.replace(source_file, target_file)
+                    moved_files.append(file)
+                    backed_up_files.append(file)
+                    continue
+                except OSError as e:
+                    if not isCrossDeviceError(e):
+                        raise
+            if os.path.isdir(source_file):
+                shutil.copytree(source_file, target_file)
+            else:
                 shutil.copy2(source_file, target_file)
-                backed_up_files.append(file)
+            recordOperationBytes(getPathSize(target_file))
+            backed_up_files.append(file)
         
         return backed_up_files
     except Exception as e:
+        recordOperationError(e)
+        # 把已移动的文件移回原处
+        for file in moved_files:
+            try:
+                os.replace(os.path.join(backup_dir, file), os.path.join(app_path, file))
+            except OSError:
+                pass
         return []
 
-def restoreOriginalFiles(app_path):
-    """恢复原始文件"""
+def replacePath(source, target):
+    """用source替换target；目录不能原子替换链接，先删除target处的链接再移动"""
+    if os.path.isdir(source) and os.path.lexists(target):
+        removePath(target)
+    os.replace(source, target)
+
+def restoreFile(backup_file, original_file):
+    """恢复单个文件或目录：同一个卷上直接用备份替换链接，跨卷时先复制到原文件旁再替换
+
+    文件的替换是原子的，任何时刻原位置上不是链接就是原始文件。
+    目录先删除链接再移动，中途退出时由预写日志继续恢复。
+    """
+    try:
+        replacePath(backup_file, original_file)
+        return
+    except OSError as e:
+        if not isCrossDeviceError(e):
+            raise
+    temp_file = original_file + '.chromiumto-restore'
+    if os.path.isdir(backup_file):
+        shutil.copytree(backup_file, temp_file)
+    else:
+        shutil.copy2(backup_file, temp_file)
+    try:
+        replacePath(temp_file, original_file)
+    except OSError:
+        removePath(temp_file)
+        raise
+    recordOperationBytes(getPathSize(original_file))
+    removePath(backup_file)
+
+def loadIdenticalFiles(backup_dir):
+    """读取与共享内核内容相同的文件记录：{文件名: {'digest', 'source'}}"""
+    try:
+        with open(os.path.join(backup_dir, IDENTICAL_FILES_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def saveIdenticalFiles(backup_dir, identical_files):
+    """保存与共享内核内容相同的文件记录"""
+    with open(os.path.join(backup_dir, IDENTICAL_FILES_NAME), 'w', encoding='utf-8') as f:
+        json.dump(identical_files, f, indent=4, ensure_ascii=False)
+
+def restoreIdenticalFile(source_file, original_file, digest):
+    """恢复未备份的相同文件：从共享内核复制到原文件旁，确认内容未变后再原子替换"""
+    temp_file = original_file + '.chromiumto-restore'
+    if os.path.isdir(source_file):
+        shutil.copytree(source_file, temp_file)
+    else:
+        shutil.copy2(source_file, temp_file)
+    try:
+        if digest and getFingerprint(temp_file) != digest:
+            raise ValueError(f"共享内核中的文件已改变: {source_file}")
+        replacePath(temp_file, original_file)
+    except Exception:
+        removePath(temp_file)
+        raise
+    recordOperationBytes(getPathSize(original_file))
+
+def restoreOriginalFiles(app_path, tx=None):
+    """恢复原始文件
+
+    逐个用备份文件原子替换链接，全部恢复后才删除备份目录。中途失败时已恢复的文件保持原始文件，
+    未恢复的文件仍是链接，剩余的备份保留，可以再次恢复。
+    与共享内核内容相同、没有备份的文件从共享内核复制恢复。tx为预写日志中的事务，每个文件恢复前记录。
+    """
     backup_dir = os.path.join(app_path, 'backup_chrome')
     
     if not os.path.exists(backup_dir):
@@ -266,131 +295,571 @@ def restoreOriginalFiles(app_path):
     try:
         # 恢复所有备份的文件
         for file in os.listdir(backup_dir):
-            backup_file = os.path.join(backup_dir, file)
-            original_file = os.path.join(app_path, file)
-            
-            # 删除符号链接或现有文件
-            if os.path.exists(original_file):
-                if os.path.islink(original_file):
-                    os.unlink(original_file)
-                else:
-                    os.remove(original_file)
-            
-            # 恢复原始文件
-            shutil.copy2(backup_file, original_file)
+            if file == IDENTICAL_FILES_NAME:
+                continue
+            if tx:
+                logStep(tx, 'restore', file)
+            restoreFile(os.path.join(backup_dir, file), os.path.join(app_path, file))
+        
+        # 恢复没有备份的相同文件，已恢复的文件从记录中删除，失败后可以再次恢复
+        identical_files = loadIdenticalFiles(backup_dir)
+        for file, info in list(identical_files.items()):
+            if tx:
+                logStep(tx, 'restore_identical', file)
+            restoreIdenticalFile(info['source'], os.path.join(app_path, file), info.get('digest'))
+            del identical_files[file]
+            saveIdenticalFiles(backup_dir, identical_files)
         
-        # 删除备份目录
+        # 全部恢复后删除备份目录
         shutil.rmtree(backup_dir)
         return True
-    except Exception:
+    except Exception as e:
+        recordOperationError(e)
         return False
 
-def redirectAppToSharedChrome(app_info):
-    """将应用重定向到共享Chrome内核"""
-    try:
+def rollbackRedirect(app_path, tx):
+    """回滚重定向事务：恢复原始文件后结束事务，恢复失败时事务保持未结束，下次启动时再回滚"""
+    if os.path.exists(os.path.join(app_path, 'backup_chrome')) and not restoreOriginalFiles(app_path):
+        return False
+    abortTransaction(tx)
+    return True
+
+def isProtectedPath(path):
+    """检查路径是否在Program Files或Windows目录下，修改这些目录需要管理员权限"""
+    path = os.path.normcase(os.path.abspath(path))
+    for name, default in (('ProgramFiles', 'C:\\Program Files'), ('ProgramFiles(x86)', 'C:\\Program Files (x86)'),
+                          ('ProgramW6432', None), ('SystemRoot', 'C:\\Windows')):
+        protected = os.environ.get(name, default)
+        if protected:
+            protected = os.path.normcase(os.path.abspath(protected))
+            if path == protected or path.startswith(protected.rstrip(os.sep) + os.sep):
+                return True
+    return False
+
+def planRedirect(app_info, shared_chrome_path=None, verify_content=True):
+    """生成应用的重定向计划，只读取文件信息，不修改磁盘
+
+    返回计划字典：
+        status: ready（可以重定向）、redirected（已经重定向）或blocked（无法重定向，原因见reason）
+        link_files: 将链接到共享内核的文件
+        identical_files / changed_files: link_files中与共享内核内容相同 / 不同的文件，
+            相同的文件直接链接不备份，不同的文件移动到备份目录
+        missing_files: 共享内核中没有、保持不变的内核文件
+        app_version / shared_version / version_mismatch: 应用和共享内核的内核版本、两者是否不同
+        content_mismatch: link_files中是否有与共享内核内容不同的文件，verify_content为False时为False
+        backup_bytes: 备份目录占用的字节数
+        reclaimed_bytes: 重定向后立即释放的字节数
+        reclaimable_bytes: 删除备份后总共释放的字节数
+        linked_bytes: 已重定向应用中链接到共享内核的文件大小
+        writable / needs_admin: 应用目录是否可写、是否需要管理员权限
+    verify_content为False时不比较文件内容，全部按内容不同计算，只需要读取文件大小。
+    """
+    app_path = app_info['path']
+    if shared_chrome_path is None:
         shared_chrome_path = getSharedChromePath()
+    plan = {
+        'app': app_info,
+        'status': 'blocked',
+        'reason': '',
+        'link_files': [],
+        'identical_files': [],
+        'changed_files': [],
+        'missing_files': [],
+        'app_version': None,
+        'shared_version': None,
+        'version_mismatch': False,
+        'content_mismatch': False,
+        'backup_bytes': 0,
+        'reclaimed_bytes': 0,
+        'reclaimable_bytes': 0,
+        'linked_bytes': 0,
+        'writable': False,
+        'needs_admin': isProtectedPath(app_path)
+    }
+    try:
         if not shared_chrome_path or not os.path.exists(shared_chrome_path):
-            return False, "共享Chrome路径未设置或不存在"
+            plan['reason'] = "共享Chrome路径未设置或不存在"
+            return plan
+        if not os.path.exists(app_path):
+            plan['reason'] = f"应用路径不存在: {app_path}"
+            return plan
+        plan['writable'] = os.access(app_path, os.W_OK)
         
-        app_path = app_info['path']
+        # 已经重定向的应用（备份已删除时内核文件仍是链接）：统计链接的文件和备份占用的空间
+        backup_dir = os.path.join(app_path, 'backup_chrome')
+        kernel_files = getKernelFiles(app_path)
+        if os.path.exists(backup_dir) or any(isLinkPath(os.path.join(app_path, file)) for file in kernel_files):
+            plan['status'] = 'redirected'
+            plan['reason'] = "应用已经被重定向"
+            for entry in os.scandir(app_path):
+                if isLinkPath(entry.path):
+                    plan['link_files'].append(entry.name)
+                    plan['linked_bytes'] += getPathSize(entry.path)
+            backup_info = getBackupInfo(app_path)
+            plan['backup_bytes'] = backup_info['total_size'] if backup_info else 0
+            plan['reclaimable_bytes'] = plan['backup_bytes']
+            return plan
         
-        # 检查应用路径是否存在
-        if not os.path.exists(app_path):
-            return False, f"应用路径不存在: {app_path}"
+        # 只处理共享内核中有对应文件的内核文件，其他文件保持不变
+        if not kernel_files:
+            plan['reason'] = "无法备份原始文件，可能没有找到要备份的文件"
+            return plan
+        shared_files = set(os.listdir(shared_chrome_path))
+        plan['link_files'] = [file for file in kernel_files if file in shared_files]
+        plan['missing_files'] = [file for file in kernel_files if file not in shared_files]
+        if not plan['link_files']:
+            plan['reason'] = f"共享内核中没有可链接的文件: {', '.join(plan['missing_files'])}"
+            return plan
+        
+        plan['app_version'] = detectKernelVersion(app_path, kernel_files)
+        plan['shared_version'] = detectKernelVersion(shared_chrome_path, plan['link_files'])
         
-        # 检查是否已经重定向
+        # 按内容比较，与共享内核相同的文件不需要备份
+        for file in plan['link_files']:
+            app_file = os.path.join(app_path, file)
+            size = getPathSize(app_file)
+            if verify_content and isSameContent(app_file, os.path.join(shared_chrome_path, file)):
+                plan['identical_files'].append(file)
+                plan['reclaimed_bytes'] += size
+            else:
+                plan['changed_files'].append(file)
+                plan['backup_bytes'] += size
+            plan['reclaimable_bytes'] += size
+        
+        plan['version_mismatch'] = plan['app_version'] != plan['shared_version']
+        plan['content_mismatch'] = verify_content and bool(plan['changed_files'])
+        if (plan['version_mismatch'] or plan['content_mismatch']) and plan['missing_files']:
+            # 内核版本或内容不同时只替换部分文件，会混用两个版本的内核文件
+            plan['reason'] = f"共享内核与应用的内核版本或内容不同，且缺少文件: {', '.join(plan['missing_files'])}"
+            return plan
+        
+        plan['status'] = 'ready'
+        return plan
+    except Exception as e:
+        plan['reason'] = f"无法生成重定向计划: {str(e)}"
+        return plan
+
+def planRedirects(apps, shared_chrome_path=None, verify_content=True):
+    """生成多个应用的重定向计划，不修改磁盘，文件哈希使用指纹缓存"""
+    if shared_chrome_path is None:
+        shared_chrome_path = getSharedChromePath()
+    plans = [planRedirect(app, shared_chrome_path, verify_content) for app in apps]
+    flushFingerprintCache()
+    return plans
+
+def summarizeRedirectPlans(plans):
+    """汇总重定向计划：各状态的应用数和字节数"""
+    summary = {
+        'ready': 0,
+        'redirected': 0,
+        'blocked': 0,
+        'needs_admin': False,
+        'backup_bytes': 0,
+        'reclaimed_bytes': 0,
+        'reclaimable_bytes': 0,
+        'linked_bytes': 0
+    }
+    for plan in plans:
+        summary[plan['status']] += 1
+        if plan['status'] == 'blocked':
+            continue
+        if plan['status'] == 'ready' and plan['needs_admin']:
+            summary['needs_admin'] = True
+        for key in ('backup_bytes', 'reclaimed_bytes', 'reclaimable_bytes', 'linked_bytes'):
+            summary[key] += plan[key]
+    return summary
+
+@loggedOperation('redirect')
+def redirectAppToSharedChrome(app_info, stop_event=None):
+    """将应用重定向到共享Chrome内核
+
+    每个应用要么全部重定向成功，要么恢复原始文件；stop_event被设置时取消并恢复原始文件。
+    每个文件的备份和链接在执行前写入预写日志，进程中途退出时由recoverJournal回滚。
+    """
+    tx = None
+    try:
+        shared_chrome_path = getSharedChromePath()
+        app_path = app_info['path']
         backup_dir = os.path.join(app_path, 'backup_chrome')
-        if os.path.exists(backup_dir):
-            return False, "应用已经被重定向"
         
-        # 1. 备份原始文件
-        backed_up_files = backupOriginalFiles(app_path)
-        if not backed_up_files:
-            return False, "无法备份原始文件，可能没有找到要备份的文件"
+        # 1. 生成重定向计划：只处理共享内核中有对应文件的内核文件，按内容区分相同和不同的文件
+        plan = planRedirect(app_info, shared_chrome_path)
+        if plan['status'] != 'ready':
+            return False, plan['reason']
+        kernel_files = plan['link_files'] + plan['missing_files']
+        skipped_files = plan['missing_files']
+        changed_files = plan['changed_files']
+        
+        # 2. 与共享内核相同的文件不需要备份，记录哈希用于恢复时校验
+        identical_files = {}
+        for file in plan['identical_files']:
+            source = os.path.join(shared_chrome_path, file)
+            identical_files[file] = {'digest': getFingerprint(source), 'source': source}
+        
+        tx = beginTransaction('redirect', app_info, shared=shared_chrome_path,
+                              files=plan['link_files'], changed=changed_files, identical=identical_files)
         
-        # 2. 创建符号链接
-        failed_files = []
+        # 3. 备份内容不同的原始文件，同一个卷上直接移动到备份目录，不复制文件内容
+        backed_up_files = []
+        if changed_files:
+            for file in changed_files:
+                logStep(tx, 'backup', file)
+            backed_up_files = backupOriginalFiles(app_path, changed_files, move=True)
+            if not backed_up_files:
+                if os.path.exists(backup_dir) and not os.listdir(backup_dir):
+                    os.rmdir(backup_dir)
+                # 备份失败时已移动的文件已经移回
+                abortTransaction(tx)
+                return False, "无法备份原始文件，可能没有找到要备份的文件"
+        else:
+            os.makedirs(backup_dir, exist_ok=True)
+        # 先记录相同的文件再删除，中途失败时可以从共享内核恢复
+        saveIdenticalFiles(backup_dir, identical_files)
+        
+        # 4. 创建符号链接，任何一个文件失败或被取消时恢复全部原始文件，应用不会处于部分重定向的状态
         success_files = []
-        for file in backed_up_files:
+        redirect_entries = []
+        for file in backed_up_files + list(identical_files):
+            if stop_event and stop_event.is_set():
+                rollbackRedirect(app_path, tx)
+                return False, "重定向已取消，已恢复原始文件"
+            
             source = os.path.join(shared_chrome_path, file)
             target = os.path.join(app_path, file)
             
-            # 检查源文件是否存在
-            if not os.path.exists(source):
-                # 跳过不存在的源文件，但继续处理其他文件
-                failed_files.append(f"{file} (源文件不存在)")
-                continue
-            
+            error = None
             try:
-                # 检查目标文件是否存在
-                if not os.path.exists(target):
-                    failed_files.append(f"{file} (目标文件不存在，可能已被删除)")
-                    continue
-                
-                # 删除原始文件
-                os.remove(target)
+                logStep(tx, 'link', file, source=source)
+                # 跨卷备份时或内容相同的原始文件还在，先删除
+                if os.path.lexists(target):
+                    removePath(target)
                 
                 # 创建符号链接
                 success, error_msg = createSymlink(source, target)
                 if success:
                     success_files.append(file)
+                    redirect_entries.append({'file': file, 'source': source, 'target': target, 'mode': 'symlink'})
                 else:
-                    failed_files.append(f"{file} (创建符号链接失败: {error_msg})")
+                    error = f"{file} (创建符号链接失败: {error_msg})"
             except PermissionError as e:
-                failed_files.append(f"{file} (权限不足: {str(e)})")
+                recordOperationError(e)
+                error = f"{file} (权限不足: {str(e)})"
             except FileNotFoundError as e:
-                failed_files.append(f"{file} (文件未找到: {str(e)})")
+                recordOperationError(e)
+                error = f"{file} (文件未找到: {str(e)})"
             except Exception as e:
-                failed_files.append(f"{file} (未知错误: {str(e)})")
-        
-        # 如果所有文件都失败了，恢复备份
-        if len(failed_files) == len(backed_up_files):
-            restoreOriginalFiles(app_path)
-            return False, f"所有文件都无法创建符号链接: {'; '.join(failed_files)}"
+                recordOperationError(e)
+                error = f"{file} (未知错误: {str(e)})"
+            
+            if error:
+                rollbackRedirect(app_path, tx)
+                return False, f"重定向失败，已恢复原始文件: {error}"
         
-        # 3. 更新配置
+        # 5. 更新配置
         addRedirectedApp(app_info)
+        recordRedirectEntries(app_path, redirect_entries)
+        recordBackup(app_path, backup_dir, sum(
+            getPathSize(os.path.join(backup_dir, file)) for file in backed_up_files))
+        commitTransaction(tx)
         
-        if failed_files:
-            return True, f"重定向部分成功 ({len(success_files)}/{len(backed_up_files)}): {'; '.join(failed_files)}"
-        else:
-            return True, f"重定向成功 ({len(success_files)}/{len(backed_up_files)})"
+        message = f"重定向成功 ({len(success_files)}/{len(kernel_files)})"
+        if identical_files:
+            message += f"，{len(identical_files)} 个文件与共享内核相同，未备份"
+        if skipped_files:
+            message += f"，共享内核中没有的文件保持不变: {', '.join(skipped_files)}"
+        return True, message
     except Exception as e:
+        recordOperationError(e)
         # 恢复备份
         app_path = app_info.get('path', '')
-        if app_path and os.path.exists(os.path.join(app_path, 'backup_chrome')):
+        if tx:
+            rollbackRedirect(app_path, tx)
+        elif app_path and os.path.exists(os.path.join(app_path, 'backup_chrome')):
             restoreOriginalFiles(app_path)
         return False, f"重定向失败: {str(e)}"
 
-def redirectAllApps():
-    """重定向所有检测到的应用"""
-    config = loadConfig()
-    detected_apps = config['detected_apps']
-    results = []
+def getVolumeKey(path):
+    """获取路径所在的卷，同一个卷上的应用不同时处理，避免磁盘来回寻道"""
+    drive = os.path.splitdrive(os.path.abspath(path))[0]
+    if drive:
+        return os.path.normcase(drive)
+    # 没有盘符时按设备号区分，路径不存在时向上查找
+    current = os.path.abspath(path)
+    while True:
+        try:
+            return os.stat(current).st_dev
+        except OSError:
+            parent = os.path.dirname(current)
+            if parent == current:
+                return None
+            current = parent
+
+def getRedirectWorkers(volume_count):
+    """获取批量重定向的线程数，配置为0时每个卷一个线程，最多MAX_REDIRECT_WORKERS个"""
+    try:
+        workers = int(getConfig('redirect_workers', 0) or 0)
+    except (TypeError, ValueError):
+        workers = 0
+    if workers <= 0:
+        workers = MAX_REDIRECT_WORKERS
+    return max(1, min(workers, volume_count))
+
+def runAppBatch(apps, operation, workers=None, stop_event=None, result_callback=None):
+    """批量处理应用，按卷调度：不同卷上的应用并行处理，同一个卷上的应用依次处理
+
+    operation(app, stop_event)返回(成功, 消息)。返回与apps顺序相同的结果列表，每个结果为
+    {'app', 'success', 'message', 'cancelled', 'volume', 'started', 'duration'}，
+    started为开始处理的时间戳，duration为耗时（秒）。stop_event被设置后不再开始新的应用，
+    未开始的应用结果中cancelled为True。result_callback在每个应用处理完成后从工作线程中调用。
+    """
+    pending = {}
+    volumes = []
+    for index, app in enumerate(apps):
+        volume = getVolumeKey(app['path'])
+        volumes.append(volume)
+        pending.setdefault(volume, collections.deque()).append(index)
     
-    for app in detected_apps:
-        success, message = redirectAppToSharedChrome(app)
-        results.append({
-            'app': app,
-            'success': success,
-            'message': message
-        })
+    if workers is None:
+        workers = getRedirectWorkers(len(pending))
+    workers = max(1, min(workers, len(pending) or 1))
     
+    results = [None] * len(apps)
+    active = set()
+    condition = threading.Condition()
+    
+    def takeNext():
+        """取出下一个可以处理的应用，没有时等待，全部处理完或已取消时返回None"""
+        with condition:
+            while True:
+                if stop_event and stop_event.is_set():
+                    return None
+                for volume, queue in pending.items():
+                    if queue and volume not in active:
+                        active.add(volume)
+                        return queue.popleft()
+                if not any(pending.values()):
+                    return None
+                condition.wait()
+    
+    def worker():
+        while True:
+            index = takeNext()
+            if index is None:
+                return
+            app = apps[index]
+            started = time.time()
+            start = time.perf_counter()
+            try:
+                success, message = operation(app, stop_event)
+            except Exception as e:
+                success, message = False, f"处理失败: {str(e)}"
+            result = {
+                'app': app,
+                'success': success,
+                'message': message,
+                'cancelled': bool(stop_event and stop_event.is_set() and not success),
+                'volume': volumes[index],
+                'started': started,
+                'duration': round(time.perf_counter() - start, 6)
+            }
+            with condition:
+                results[index] = result
+                active.discard(volumes[index])
+                condition.notify_all()
+            if result_callback:
+                result_callback(result)
+    
+    # 批量修改配置，全部完成后统一写入
+    with configBatch():
+        threads = [threading.Thread(target=worker, name=f'RedirectWorker-{i}', daemon=True) for i in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    flushFingerprintCache()
+    
+    # 取消后未开始的应用
+    for index, app in enumerate(apps):
+        if results[index] is None:
+            results[index] = {
+                'app': app,
+                'success': False,
+                'message': "已取消",
+                'cancelled': True,
+                'volume': volumes[index],
+                'started': None,
+                'duration': 0.0
+            }
+    return results
+
+def redirectApps(apps, workers=None, stop_event=None, result_callback=None, resume=None):
+    """批量重定向应用，不同卷上的应用并行处理，每个应用要么全部成功要么保持原样
+
+    批量任务记录在预写日志中，进程中途退出后可以通过getInterruptedBatch继续未处理的应用。
+    resume为被本次任务继续的中断任务ID列表，本次任务开始后结束这些任务。
+    """
+    tx = beginTransaction('redirect_batch', apps=apps)
+    for old_tx in resume or []:
+        abortTransaction(old_tx)
+    
+    def onResult(result):
+        if not result['cancelled']:
+            logStep(tx, 'app_done', result['app']['path'])
+        if result_callback:
+            result_callback(result)
+    
+    results = runAppBatch(
+        apps, lambda app, stop: redirectAppToSharedChrome(app, stop_event=stop),
+        workers, stop_event, onResult
+    )
+    commitTransaction(tx)
+    checkpointJournal()
     return results
 
+def getInterruptedBatch():
+    """获取进程中途退出时未完成的批量重定向，返回(任务ID列表, 未处理的应用列表)"""
+    tx_ids = []
+    remaining = []
+    seen = set()
+    for transaction in getIncompleteTransactions('redirect_batch'):
+        tx_ids.append(transaction['tx'])
+        done = {step['file'] for step in transaction['steps'] if step.get('action') == 'app_done'}
+        for app in transaction['data'].get('apps', []):
+            if app['path'] not in done and app['path'] not in seen:
+                seen.add(app['path'])
+                remaining.append(app)
+    return tx_ids, remaining
+
+def discardInterruptedBatch(tx_ids):
+    """放弃继续中断的批量重定向"""
+    for tx in tx_ids:
+        abortTransaction(tx)
+    checkpointJournal()
+
+def checkpointJournal():
+    """配置写入磁盘后删除预写日志中已结束的事务"""
+    if flushConfig():
+        return compactJournal()
+    return False
+
+def cleanupTempFiles(app_path, files):
+    """删除恢复和切换内核时中途退出留下的临时文件"""
+    for file in files:
+        for suffix in ('.chromiumto-restore', '.chromiumto-link'):
+            temp_file = os.path.join(app_path, file + suffix)
+            if os.path.lexists(temp_file):
+                removePath(temp_file)
+
+def recoverRedirect(transaction):
+    """恢复未完成的重定向：全部链接已创建时补全配置，否则回滚到原始文件"""
+    app_info = transaction['app']
+    app_path = app_info['path']
+    files = transaction['data'].get('files', [])
+    cleanupTempFiles(app_path, files)
+    
+    linked = {step['file']: step['data'].get('source') for step in transaction['steps'] if step.get('action') == 'link'}
+    if files and set(linked) == set(files) and all(
+            isLinkPath(os.path.join(app_path, file)) and os.path.exists(os.path.join(app_path, file))
+            for file in files):
+        backup_dir = os.path.join(app_path, 'backup_chrome')
+        addRedirectedApp(app_info)
+        recordRedirectEntries(app_path, [
+            {'file': file, 'source': source, 'target': os.path.join(app_path, file), 'mode': 'symlink'}
+            for file, source in linked.items()
+        ])
+        recordBackup(app_path, backup_dir, sum(
+            getPathSize(os.path.join(backup_dir, file)) for file in transaction['data'].get('changed', [])))
+        commitTransaction(transaction['tx'])
+        return True, "重定向已完成，补全配置"
+    
+    if not rollbackRedirect(app_path, transaction['tx']):
+        return False, "回滚重定向失败，下次启动时重试"
+    removeRedirectedApp(app_path)
+    recordRedirectEntries(app_path, [])
+    removeBackupRecord(app_path)
+    return True, "已回滚未完成的重定向，恢复原始文件"
+
+def recoverRestore(transaction):
+    """继续未完成的恢复"""
+    app_path = transaction['app']['path']
+    backup_dir = os.path.join(app_path, 'backup_chrome')
+    if os.path.exists(backup_dir):
+        cleanupTempFiles(app_path, [file for file in os.listdir(backup_dir) if file != IDENTICAL_FILES_NAME]
+                         + list(loadIdenticalFiles(backup_dir)))
+        if not restoreOriginalFiles(app_path):
+            return False, "继续恢复失败，下次启动时重试"
+    removeRedirectedApp(app_path)
+    recordRedirectEntries(app_path, [])
+    removeBackupRecord(app_path)
+    commitTransaction(transaction['tx'])
+    return True, "已完成未完成的恢复"
+
+def recoverJournal():
+    """启动时处理预写日志：回滚或继续进程中途退出时未完成的重定向和恢复
+
+    已提交的事务按顺序重新应用配置修改（配置延迟写入，退出前可能没有写入磁盘）。
+    未完成的批量重定向保留，由getInterruptedBatch继续。返回处理过的未完成事务结果列表。
+    只处理已退出的进程留下的事务。恢复期间持有预写日志的跨进程锁，其他进程不会同时恢复同一个事务；
+    其他进程长时间持有锁时不做处理，下次启动时再恢复。
+    """
+    results = []
+    try:
+        with lockJournal():
+            incomplete = {transaction['tx'] for transaction in getIncompleteTransactions()}
+            with configBatch():
+                for transaction in readTransactions():
+                    operation = transaction['operation']
+                    app_info = transaction['app']
+                    if transaction['state'] == 'commit':
+                        if operation == 'redirect':
+                            addRedirectedApp(app_info)
+                        elif operation == 'restore':
+                            removeRedirectedApp(app_info['path'])
+                        continue
+                    if transaction['tx'] not in incomplete or operation not in ('redirect', 'restore'):
+                        continue
+                    try:
+                        if operation == 'redirect':
+                            success, message = recoverRedirect(transaction)
+                        else:
+                            success, message = recoverRestore(transaction)
+                    except Exception as e:
+                        success, message = False, f"恢复未完成的操作失败: {str(e)}"
+                    results.append({'app': app_info, 'operation': operation, 'success': success, 'message': message})
+            checkpointJournal()
+    except TimeoutError:
+        pass
+    return results
+
+def redirectAllApps(workers=None, stop_event=None, result_callback=None):
+    """重定向所有检测到的应用"""
+    config = loadConfig()
+    return redirectApps(config['detected_apps'], workers, stop_event, result_callback)
+
+@loggedOperation('restore')
 def restoreAppFromSharedChrome(app_info):
     """取消应用的重定向"""
     app_path = app_info['path']
+    tx = None
     
     try:
-        # 恢复原始文件
-        if restoreOriginalFiles(app_path):
+        # 恢复原始文件，进程中途退出时由recoverJournal继续恢复
+        tx = beginTransaction('restore', app_info)
+        if restoreOriginalFiles(app_path, tx):
             # 更新配置
             removeRedirectedApp(app_path)
+            recordRedirectEntries(app_path, [])
+            removeBackupRecord(app_path)
+            commitTransaction(tx)
             return True, "恢复成功"
         else:
+            # 每个文件不是链接就是原始文件，剩余的备份保留，可以再次恢复
+            abortTransaction(tx)
             return False, "无法恢复原始文件"
     except Exception as e:
+        recordOperationError(e)
+        if tx:
+            abortTransaction(tx)
         return False, f"恢复失败: {str(e)}"
 
 def restoreAllApps():
@@ -399,34 +868,160 @@ def restoreAllApps():
     redirected_apps = config['redirected_apps']
     results = []
     
-    for app in redirected_apps:
-        success, message = restoreAppFromSharedChrome(app)
-        results.append({
-            'app': app,
-            'success': success,
-            'message': message
-        })
+    # 批量修改配置，全部完成后统一写入
+    with configBatch():
+        for app in redirected_apps:
+            success, message = restoreAppFromSharedChrome(app)
+            results.append({
+                'app': app,
+                'success': success,
+                'message': message
+            })
+    checkpointJournal()
     
     return results
 
+@loggedOperation('initialize')
 def initializeSharedChromeFromApp(app_info):
-    """从现有应用初始化共享Chrome"""
+    """从现有应用初始化共享Chrome，内核文件加入内核存储，并使用该版本作为共享内核"""
     app_path = app_info['path']
-    shared_dir = createSharedChromeDir()
     
-    # 复制Chrome文件到共享目录
-    if copyChromeFiles(app_path, shared_dir):
-        # 设置共享Chrome路径
-        if setSharedChromePath(shared_dir):
-            return True, "共享Chrome初始化成功"
-        else:
-            return False, "无法设置共享Chrome路径"
+    # 加入内核存储，已有相同内容的文件不再复制
+    try:
+        files = getSharedKernelFiles(app_path)
+    except OSError as e:
+        recordOperationError(e)
+        return False, f"无法读取应用目录: {str(e)}"
+    success, result = addKernelVersion(app_path, files)
+    if not success:
+        return False, f"无法将Chrome文件加入内核存储: {result}"
+    
+    # 设置共享Chrome路径
+    if setSharedChromePath(getKernelVersionPath(result)):
+        return True, f"共享Chrome初始化成功，内核版本: {result}"
     else:
-        return False, "无法复制Chrome文件到共享目录"
+        return False, "无法设置共享Chrome路径"
+
+def setActiveKernelVersion(version):
+    """使用内核存储中的版本作为共享内核，之后重定向的应用链接到该版本"""
+    view_path = getKernelVersionPath(version)
+    if not os.path.isdir(view_path):
+        return False, f"内核版本不存在: {version}"
+    if not setSharedChromePath(view_path):
+        return False, "无法保存共享内核路径"
+    return True, f"共享内核已切换到 {version}"
+
+def deleteKernelVersion(version):
+    """删除内核存储中的版本，当前共享内核或仍有应用链接的版本不能删除"""
+    view_path = os.path.normcase(os.path.abspath(getKernelVersionPath(version)))
+    if os.path.normcase(os.path.abspath(getSharedChromePath() or '')) == view_path:
+        return False, "不能删除正在使用的共享内核版本"
+    for app in loadConfig()['redirected_apps']:
+        # 启用状态数据库时按记录的链接来源判断，不需要读取应用目录
+        entries = getRedirectEntries(app['path'])
+        if entries:
+            if any(os.path.normcase(os.path.dirname(os.path.abspath(entry['source']))) == view_path
+                   for entry in entries):
+                return False, f"应用仍在使用该内核版本: {app['name']}"
+            continue
+        try:
+            for entry in os.scandir(app['path']):
+                if isLinkPath(entry.path):
+                    link_dir = os.path.dirname(os.path.abspath(readLinkTarget(entry.path)))
+                    if os.path.normcase(link_dir) == view_path:
+                        return False, f"应用仍在使用该内核版本: {app['name']}"
+        except OSError:
+            continue
+    return removeKernelVersion(version)
+
+def replaceLink(temp_link, target):
+    """用旁边创建好的新链接替换旧链接"""
+    try:
+        os.replace(temp_link, target)
+    except OSError:
+        # Windows上目录链接不能直接替换
+        removePath(target)
+        os.replace(temp_link, target)
+
+def relinkFiles(links):
+    """将一组链接重新指向新的路径，links为[(链接路径, 新路径)]，返回(成功, 错误信息)
+
+    先在每个链接旁边创建全部新链接，再逐个替换；任何一步失败时删除临时链接，
+    已替换的链接重新指向原来的路径，所有链接仍然指向同一个版本。
+    """
+    created = []
+    replaced = []
+    try:
+        for target, source in links:
+            temp_link = target + '.chromiumto-link'
+            if os.path.lexists(temp_link):
+                removePath(temp_link)
+            success, error_msg = createSymlink(source, temp_link)
+            if not success:
+                raise OSError(error_msg)
+            created.append(temp_link)
+        for target, source in links:
+            old_source = readLinkTarget(target)
+            replaceLink(target + '.chromiumto-link', target)
+            replaced.append((target, old_source))
+        return True, ''
+    except Exception as e:
+        recordOperationError(e)
+        for temp_link in created:
+            if os.path.lexists(temp_link):
+                removePath(temp_link)
+        for target, old_source in replaced:
+            temp_link = target + '.chromiumto-link'
+            success, _ = createSymlink(old_source, temp_link)
+            if success:
+                replaceLink(temp_link, target)
+        return False, str(e)
+
+@loggedOperation('switch_kernel')
+def switchAppKernel(app_info, version):
+    """将已重定向的应用切换到内核存储中的另一个版本，只重新指向链接，不复制文件
+
+    只切换链接到共享内核的内核文件。新版本缺少应用正在链接的文件或切换失败时，
+    所有链接仍然指向原来的版本。
+    """
+    app_path = app_info['path']
+    view_path = getKernelVersionPath(version)
+    if not os.path.isdir(view_path):
+        return False, f"内核版本不存在: {version}"
+    
+    # 找出链接到共享内核的内核文件，启用状态数据库时使用重定向时记录的文件
+    entries = getRedirectEntries(app_path)
+    try:
+        kernel_files = [entry['file'] for entry in entries] if entries else getKernelFiles(app_path)
+    except OSError as e:
+        recordOperationError(e)
+        return False, f"无法读取应用目录: {str(e)}"
+    links = []
+    for file in kernel_files:
+        target = os.path.join(app_path, file)
+        if not isLinkPath(target):
+            continue
+        new_source = os.path.join(view_path, file)
+        if not os.path.exists(new_source):
+            return False, f"内核版本 {version} 中没有文件: {file}"
+        links.append((target, new_source))
+    if not links:
+        return False, "应用没有链接到共享内核的文件"
+    
+    success, error_msg = relinkFiles(links)
+    if not success:
+        return False, f"切换内核失败，已恢复原来的链接: {error_msg}"
+    
+    recordRedirectEntries(app_path, [
+        {'file': os.path.basename(target), 'source': source, 'target': target, 'mode': 'symlink'}
+        for target, source in links
+    ])
+    return True, f"已切换到内核版本 {version} ({len(links)} 个文件)"
 
 def getBackupDirs():
-    """获取所有备份目录"""
+    """获取所有备份目录，启用状态数据库时备份大小使用记录的值"""
     config = loadConfig()
+    backup_records = getBackupRecords() or {}
     backup_dirs = []
     
     # 检查已重定向的应用
@@ -434,11 +1029,14 @@ def getBackupDirs():
         backup_dir = os.path.join(app['path'], 'backup_chrome')
         if os.path.exists(backup_dir):
             # 获取备份大小
-            backup_size = 0
-            for file in os.listdir(backup_dir):
-                file_path = os.path.join(backup_dir, file)
-                if os.path.isfile(file_path):
-                    backup_size += os.path.getsize(file_path)
+            record = backup_records.get(normalizeAppPath(app['path']))
+            if record is not None:
+                backup_size = record['size']
+            else:
+                backup_size = 0
+                for file in os.listdir(backup_dir):
+                    if file != IDENTICAL_FILES_NAME:
+                        backup_size += getPathSize(os.path.join(backup_dir, file))
             
             backup_dirs.append({
                 'app': app,
@@ -448,14 +1046,17 @@ def getBackupDirs():
     
     return backup_dirs
 
+@loggedOperation('delete_backup')
 def deleteBackup(app_path):
     """删除特定应用的备份"""
     backup_dir = os.path.join(app_path, 'backup_chrome')
     if os.path.exists(backup_dir):
         try:
             shutil.rmtree(backup_dir)
+            removeBackupRecord(app_path)
             return True, "备份删除成功"
         except Exception as e:
+            recordOperationError(e)
             return False, f"备份删除失败: {str(e)}"
     return False, "备份目录不存在"
 
@@ -485,8 +1086,8 @@ def getBackupInfo(app_path):
     
     for file in os.listdir(backup_dir):
         file_path = os.path.join(backup_dir, file)
-        if os.path.isfile(file_path):
-            size = os.path.getsize(file_path)
+        if file != IDENTICAL_FILES_NAME:
+            size = getPathSize(file_path)
             total_size += size
             files.append({
                 'name': file,
@@ -505,12 +1106,61 @@ def autoDownloadSharedKernel(progress_callback=None):
     success, result = downloadChromiumKernel(progress_callback)
     
     if success:
+        # 加入内核存储后使用存储中的版本，失败时直接使用解压目录
+        try:
+            stored, version = addKernelVersion(result, getSharedKernelFiles(result))
+        except OSError:
+            stored = False
+        if stored:
+            result = getKernelVersionPath(version)
+        
         # 设置共享内核路径
-        setSharedChromePath(result)
+        saved = setSharedChromePath(result)
         
         # 清理下载文件
         cleanupDownloadFiles()
         
+        if not saved:
+            return False, "共享内核已下载，但无法保存共享内核路径"
         return True, "共享内核下载并设置成功"
     else:
         return False, f"共享内核下载失败: {result}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='管理ChromiumTo内核存储中的内核版本')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help='列出内核版本和存储占用空间')
+    use_parser = commands.add_parser('use', help='使用指定版本作为共享内核')
+    use_parser.add_argument('version')
+    delete_parser = commands.add_parser('delete', help='删除没有应用使用的内核版本')
+    delete_parser.add_argument('version')
+    switch_parser = commands.add_parser('switch', help='将已重定向的应用切换到指定版本')
+    switch_parser.add_argument('app', help='应用路径')
+    switch_parser.add_argument('version')
+    args = parser.parse_args(argv)
+
+    if args.command == 'list':
+        shared_path = os.path.normcase(os.path.abspath(getSharedChromePath() or ''))
+        for info in listKernelVersions():
+            active = '*' if os.path.normcase(os.path.abspath(info['path'])) == shared_path else ' '
+            print(f"{active} {info['version']}  {info['files']} 个文件  {formatFileSize(info['size'])}  {info['added']}")
+        print(f"存储实际占用: {formatFileSize(getStoreSize())}")
+        return 0
+
+    if args.command == 'use':
+        success, message = setActiveKernelVersion(args.version)
+    elif args.command == 'delete':
+        success, message = deleteKernelVersion(args.version)
+    else:
+        app_info = getRedirectedApp(args.app)
+        if app_info is None:
+            success, message = False, f"应用未重定向: {args.app}"
+        else:
+            success, message = switchAppKernel(app_info, args.version)
+            flushConfig()
+    print(message)
+    return 0 if success else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
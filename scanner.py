@@ -1,18 +1,79 @@
 import os
+import re
+import json
 import time
+import functools
+import queue
 import threading
-from utils import getDiskPartitions, isChromiumApp, getAppName, getChromeVersion, calculateChromeFilesSize
-from config import getConfig, clearDetectedApps, addDetectedApp
+from collections import deque
+from utils import getAppDataPath, getDiskPartitions, isChromiumFileList, getAppName, getChromeVersion
+from kernelfiles import classifyEntries
+from kernelstore import isKernelStorePath
+from oplog import logOperation
+from config import getConfig, updateConfig, clearDetectedApps, addDetectedApp, flushConfig, startScanRun, finishScanRun
+
+def translateExclusion(exclusion):
+    """将单个排除规则转换为正则表达式片段
+
+    支持三种写法：
+    - 绝对路径（如 C:\\Windows）：从路径开头匹配的前缀，以\\开头时匹配任意盘符下的该路径
+    - 相对路径（如 Windows、AppData\\Local\\Temp）：匹配完整的一段或连续几段目录名
+    - 通配符（* ? **）：*和?不跨越路径分隔符，**可以匹配多级目录
+    """
+    exclusion = exclusion.replace('/', '\\').rstrip('\\')
+    anchored = exclusion.startswith('\\') or (len(exclusion) >= 2 and exclusion[1] == ':')
+    
+    parts = []
+    for segment in exclusion.split('\\'):
+        if segment == '**':
+            parts.append('.*')
+            continue
+        segment_regex = ''
+        for char in segment:
+            if char == '*':
+                segment_regex += r'[^\\/]*'
+            elif char == '?':
+                segment_regex += r'[^\\/]'
+            else:
+                segment_regex += re.escape(char)
+        parts.append(segment_regex)
+    
+    body = r'[\\/]'.join(parts)
+    if exclusion.startswith('\\'):
+        # 以\开头的规则没有盘符，从可选的盘符之后开始匹配
+        return r'^(?:[A-Za-z]:)?' + body + r'(?:[\\/]|$)'
+    if anchored:
+        return '^' + body + r'(?:[\\/]|$)'
+    return r'(?:^|[\\/])' + body + r'(?:[\\/]|$)'
+
+@functools.lru_cache(maxsize=32)
+def compileExclusionTuple(exclusions):
+    """将排除规则编译为单个正则表达式"""
+    fragments = [translateExclusion(exclusion) for exclusion in exclusions if exclusion and exclusion.strip('\\/')]
+    if not fragments:
+        return None
+    # Windows路径不区分大小写
+    flags = re.IGNORECASE if os.name == 'nt' else 0
+    return re.compile('|'.join('(?:%s)' % fragment for fragment in fragments), flags)
+
+def compileExclusions(exclusions):
+    """编译排除列表，每次扫描只编译一次，没有排除规则时返回None"""
+    if not exclusions:
+        return None
+    if isinstance(exclusions, re.Pattern):
+        return exclusions
+    return compileExclusionTuple(tuple(exclusions))
 
 def shouldExclude(path, exclusions):
-    """检查路径是否应该被排除"""
-    for exclusion in exclusions:
-        if exclusion in path:
-            return True
-    return False
+    """检查路径是否应该被排除，exclusions可以是排除列表或compileExclusions的结果"""
+    matcher = compileExclusions(exclusions)
+    if matcher is None:
+        return False
+    return matcher.search(path) is not None
 
 def calculateTotalFiles(directories, exclusions):
     """计算所有目录的总文件数"""
+    exclusions = compileExclusions(exclusions)
     total_files = 0
     for directory in directories:
         if not os.path.exists(directory):
@@ -27,111 +88,586 @@ def calculateTotalFiles(directories, exclusions):
             pass
     return total_files
 
-def scanDirectory(directory, exclusions, progress_callback=None, stop_event=None, cumulative_progress=None):
-    """扫描单个目录"""
-    chromium_apps = []
+def loadScanEstimate(directories):
+    """根据上次扫描保存的文件数估算总文件数，返回(估算总数, 是否所有目录都有记录)"""
+    saved_counts = getConfig('scan_file_counts', {}) or {}
+    total_files = 0
+    complete = True
+    for directory in directories:
+        if directory in saved_counts:
+            total_files += saved_counts[directory]
+        else:
+            complete = False
+    return total_files, complete
+
+def saveScanEstimate(file_counts):
+    """保存本次扫描各目录的文件数，供下次扫描估算进度"""
+    if not file_counts:
+        return False
+    saved_counts = dict(getConfig('scan_file_counts', {}) or {})
+    saved_counts.update(file_counts)
+    return updateConfig('scan_file_counts', saved_counts)
+
+def createCumulativeProgress(directories, exclusions, exact_total=False):
+    """初始化累积进度
+
+    exact_total为True时先完整遍历一遍统计总文件数（旧的两遍扫描方式），
+    否则使用上次扫描保存的文件数作为估算，并在扫描过程中逐步修正。
+    """
+    if exact_total:
+        total_files, complete = calculateTotalFiles(directories, exclusions), True
+    else:
+        total_files, complete = loadScanEstimate(directories)
+    return {
+        'total': total_files,
+        'scanned': 0,
+        'estimate_complete': complete,
+        'counts': {}
+    }
+
+def refineScanEstimate(cumulative_progress):
+    """逐步修正估算的总文件数，保证进度不会超过100%"""
+    scanned = cumulative_progress['scanned']
+    total = cumulative_progress['total']
+    if not cumulative_progress.get('estimate_complete', True) or scanned > total:
+        # 没有可靠的历史数据时，在已扫描数量的基础上预留余量
+        cumulative_progress['total'] = max(total, int(scanned * 1.25) + 1)
+
+SCAN_INDEX_FILE_NAME = 'scan_index.json'
+
+def getScanIndexPath():
+    """获取扫描索引文件路径"""
+    return os.path.join(getAppDataPath(), SCAN_INDEX_FILE_NAME)
+
+def loadScanIndex():
+    """加载扫描索引，记录了每个目录的修改时间和检查结果
+
+    索引只能省去未变化目录的列出和检查，不能跳过整个子树：目录的修改时间只随直接子项变化，
+    深层目录的变化不会反映到上级目录，因此子目录仍需逐个stat和遍历。
+    """
+    entries = {}
+    try:
+        with open(getScanIndexPath(), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') == 1:
+            entries = data.get('entries', {})
+    except Exception:
+        pass
+    return {
+        'entries': entries,
+        'visited': {}
+    }
+
+def saveScanIndex(scan_index, directories, complete=True):
+    """保存扫描索引
+
+    complete为True时，扫描过的目录下本次没有访问到的记录（已删除或已排除的目录）会被清理。
+    """
+    if scan_index is None:
+        return False
+    
+    entries = scan_index['entries']
+    if complete:
+        prefixes = [os.path.join(directory, '') for directory in directories]
+        entries = {
+            path: entry for path, entry in entries.items()
+            if not any(path == directory or path.startswith(prefix) for directory, prefix in zip(directories, prefixes))
+        }
+    entries.update(scan_index['visited'])
     
+    index_path = getScanIndexPath()
+    temp_path = index_path + '.tmp'
     try:
-        for root, dirs, files in os.walk(directory):
-            # 检查是否需要停止扫描
-            if stop_event and stop_event.is_set():
-                break
-            
-            # 检查是否排除该目录
-            if shouldExclude(root, exclusions):
-                # 跳过子目录
-                dirs.clear()
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'entries': entries}, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(temp_path, index_path)
+        scan_index['entries'] = entries
+        scan_index['visited'] = {}
+        return True
+    except Exception:
+        return False
+
+def lookupScanIndex(scan_index, root, mtime):
+    """查找未变化目录的索引记录，目录已变化或没有记录时返回None"""
+    entry = scan_index['entries'].get(root)
+    if not entry or entry.get('mtime') != mtime:
+        return None
+    
+    app_info = entry.get('app')
+    if app_info:
+        # 目录未变化，但内核文件可能被原地更新，核对DLL的大小和修改时间
+        if app_info.get('chrome_dll'):
+            try:
+                stat = os.stat(app_info['chrome_dll'])
+            except OSError:
+                return None
+            if entry.get('dll_stat') != [stat.st_size, stat.st_mtime_ns]:
+                return None
+        app_info = dict(app_info)
+        app_info['last_scan'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    
+    scan_index['visited'][root] = entry
+    return {
+        'subdirs': [os.path.join(root, name) for name in entry.get('subdirs', [])],
+        'file_count': entry.get('file_count', 0),
+        'app': app_info
+    }
+
+def recordScanIndex(scan_index, root, mtime, visit):
+    """记录目录的检查结果"""
+    entry = {
+        'mtime': mtime,
+        'subdirs': [os.path.basename(path) for path in visit['subdirs']],
+        'file_count': visit['file_count'],
+        'app': visit['app']
+    }
+    app_info = visit['app']
+    if app_info and app_info.get('chrome_dll'):
+        try:
+            stat = os.stat(app_info['chrome_dll'])
+            entry['dll_stat'] = [stat.st_size, stat.st_mtime_ns]
+        except OSError:
+            return
+    scan_index['visited'][root] = entry
+
+def createScanIndex(incremental=None):
+    """根据配置创建本次扫描使用的索引，未启用增量扫描时返回None"""
+    if incremental is None:
+        incremental = getConfig('scan_incremental', True)
+    return loadScanIndex() if incremental else None
+
+# 扫描事件类型
+SCAN_EVENT_APP = 'app'
+SCAN_EVENT_PROGRESS = 'progress'
+SCAN_EVENT_SKIPPED = 'skipped'
+SCAN_EVENT_ERROR = 'error'
+
+def listDirectory(root):
+    """列出目录内容，返回(dirs, file_entries, dir_entries)，无法访问时抛出OSError"""
+    with os.scandir(root) as it:
+        entries = list(it)
+    
+    dirs = []
+    file_entries = []
+    dir_entries = {}
+    for entry in entries:
+        try:
+            is_dir = entry.is_dir()
+        except OSError:
+            is_dir = False
+        if is_dir:
+            dirs.append(entry.name)
+            dir_entries[entry.name] = entry
+        else:
+            file_entries.append(entry)
+    return dirs, file_entries, dir_entries
+
+def getSubdirectories(root, dirs, dir_entries):
+    """获取需要继续遍历的子目录，与os.walk一致，不进入指向目录的符号链接"""
+    subdirs = []
+    for name in dirs:
+        entry = dir_entries.get(name)
+        try:
+            if entry is not None and entry.is_symlink():
+                continue
+        except OSError:
+            continue
+        subdirs.append(os.path.join(root, name))
+    return subdirs
+
+def inspectDirectory(root, dirs, file_entries):
+    """根据目录列表判断是否为Chromium应用，是则返回应用信息，否则返回None"""
+    # 按内核文件清单一次完成识别、查找主DLL和计算大小
+    kernel = classifyEntries(file_entries)
+    if not kernel['feature'] and not isChromiumFileList(dirs):
+        return None
+    
+    # 内核存储中的版本目录是共享内核，不是应用
+    if isKernelStorePath(root):
+        return None
+    
+    # 查找Chrome DLL文件
+    chrome_dll = kernel['main_dll']
+    
+    # 获取版本信息
+    version = "未知版本"
+    if chrome_dll:
+        version = getChromeVersion(chrome_dll)
+    
+    # 计算Chromium文件大小
+    chromium_size = kernel['size']
+    
+    # 创建应用信息
+    return {
+        'name': getAppName(root),
+        'path': root,
+        'version': version,
+        'chrome_dll': chrome_dll,
+        'size': chromium_size,
+        'last_scan': time.strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+def visitDirectory(root, scan_index=None):
+    """列出并检查单个目录
+
+    返回{'subdirs', 'file_count', 'app'}，subdirs为需要继续遍历的子目录，无法访问时抛出OSError。
+    提供scan_index时，修改时间未变化的目录直接使用索引中的结果，不再列出内容，
+    但返回的子目录仍需继续访问，未变化目录的子树不会被整体跳过。
+    """
+    mtime = None
+    if scan_index is not None:
+        mtime = os.stat(root).st_mtime_ns
+        visit = lookupScanIndex(scan_index, root, mtime)
+        if visit is not None:
+            return visit
+    
+    dirs, file_entries, dir_entries = listDirectory(root)
+    
+    # 检查是否为Chromium应用，直接使用已列出的目录内容
+    app_info = inspectDirectory(root, dirs, file_entries)
+    visit = {
+        # Chromium应用通常在一个目录中，不再遍历其子目录
+        'subdirs': [] if app_info else getSubdirectories(root, dirs, dir_entries),
+        'file_count': len(file_entries),
+        'app': app_info
+    }
+    
+    if scan_index is not None:
+        recordScanIndex(scan_index, root, mtime, visit)
+    return visit
+
+def throttleProgressCallback(callback, max_rate=20):
+    """合并和限速扫描进度回调
+
+    发现应用的回调立即送达；扫描进度回调（元组）最多每秒送达max_rate次，
+    期间的进度只保留最新一条。返回(包装后的回调, 送出剩余进度的flush函数, 统计信息)，
+    统计信息中delivered为送达的进度数，merged为被合并的进度数，apps为发现应用的回调数。
+    """
+    interval = 1.0 / max_rate if max_rate and max_rate > 0 else 0
+    stats = {'delivered': 0, 'merged': 0, 'apps': 0}
+    state = {'last_time': 0.0, 'pending': None}
+    lock = threading.Lock()
+    
+    def throttledCallback(data):
+        if not isinstance(data, tuple):
+            # 发现应用立即送达
+            stats['apps'] += 1
+            callback(data)
+            return
+        
+        with lock:
+            now = time.monotonic()
+            if now - state['last_time'] < interval:
+                # 间隔内的进度只保留最新一条
+                if state['pending'] is not None:
+                    stats['merged'] += 1
+                state['pending'] = data
+                return
+            if state['pending'] is not None:
+                stats['merged'] += 1
+            state['pending'] = None
+            state['last_time'] = now
+            stats['delivered'] += 1
+        callback(data)
+    
+    def flush():
+        with lock:
+            data = state['pending']
+            state['pending'] = None
+            if data is not None:
+                state['last_time'] = time.monotonic()
+                stats['delivered'] += 1
+        if data is not None:
+            callback(data)
+    
+    return throttledCallback, flush, stats
+
+def getScanWorkers():
+    """获取并行扫描的线程数，配置为0时根据CPU数量自动选择"""
+    try:
+        workers = int(getConfig('scan_workers', 0) or 0)
+    except (TypeError, ValueError):
+        workers = 0
+    if workers <= 0:
+        workers = min(8, (os.cpu_count() or 1) + 4)
+    return workers
+
+def iterScan(directories, exclusions=None, stop_event=None, workers=1, scan_index=None, cumulative_progress=None):
+    """以生成器方式扫描目录，逐个返回扫描事件
+
+    事件为字典，'type'字段表示事件类型：
+    - 'app'：发现应用，'app'为应用信息，'order'为遍历顺序键，按其排序即为串行扫描顺序
+    - 'progress'：扫描完一个目录，包含'path'、'file_count'、'scanned'、'total'
+    - 'skipped'：目录被排除，包含'path'和'reason'
+    - 'error'：目录无法访问，包含'path'和'error'
+    
+    扫描进度由调用方控制，调用方停止迭代（如break）即停止扫描，不会在内存中累积结果。
+    workers大于1时使用工作窃取线程池并行扫描，事件顺序不固定。
+    完整扫描后会在cumulative_progress['counts']中记录各目录的文件数。
+    """
+    exclusions = compileExclusions(exclusions)
+    if cumulative_progress is None:
+        cumulative_progress = {'total': 0, 'scanned': 0, 'estimate_complete': False}
+    file_counts = [0] * len(directories)
+    
+    if workers and workers > 1:
+        events = iterParallelVisits(directories, exclusions, stop_event, workers, scan_index)
+    else:
+        events = iterSerialVisits(directories, exclusions, stop_event, scan_index)
+    
+    try:
+        for event_type, order, root, payload in events:
+            if event_type == SCAN_EVENT_SKIPPED:
+                yield {'type': SCAN_EVENT_SKIPPED, 'path': root, 'reason': payload}
+                continue
+            if event_type == SCAN_EVENT_ERROR:
+                yield {'type': SCAN_EVENT_ERROR, 'path': root, 'error': payload}
                 continue
             
             # 更新累积进度
-            if cumulative_progress:
-                cumulative_progress['scanned'] += len(files)
-                current = cumulative_progress['scanned']
-                total = cumulative_progress['total']
+            file_counts[order[0]] += payload['file_count']
+            cumulative_progress['scanned'] += payload['file_count']
+            refineScanEstimate(cumulative_progress)
+            
+            if payload['app']:
+                yield {'type': SCAN_EVENT_APP, 'app': payload['app'], 'order': order}
             
-            # 检查是否为Chromium应用
-            if isChromiumApp(root):
-                # 查找Chrome DLL文件
-                chrome_dll = None
-                for file in files:
-                    if file.lower() in ['chrome.dll', 'msedge.dll', 'brave.dll']:
-                        chrome_dll = os.path.join(root, file)
+            yield {
+                'type': SCAN_EVENT_PROGRESS,
+                'path': root,
+                'file_count': payload['file_count'],
+                'scanned': cumulative_progress['scanned'],
+                'total': cumulative_progress['total']
+            }
+    finally:
+        events.close()
+    
+    # 完整扫描后记录各目录的文件数，供下次估算进度
+    if not (stop_event and stop_event.is_set()):
+        counts = cumulative_progress.setdefault('counts', {})
+        for directory, file_count in zip(directories, file_counts):
+            counts[directory] = file_count
+
+def iterSerialVisits(directories, exclusions, stop_event=None, scan_index=None):
+    """串行深度优先遍历，返回(事件类型, 遍历顺序键, 目录, 内容)"""
+    # 栈中元素为(遍历顺序键, 目录)，顺序键为从顶层目录开始的子目录序号路径
+    stack = [((i,), directory) for i, directory in reversed(list(enumerate(directories)))]
+    while stack:
+        # 检查是否需要停止遍历
+        if stop_event and stop_event.is_set():
+            return
+        
+        order, root = stack.pop()
+        
+        # 检查是否排除该目录，排除的目录不再列出内容
+        if exclusions and shouldExclude(root, exclusions):
+            yield SCAN_EVENT_SKIPPED, order, root, 'excluded'
+            continue
+        
+        try:
+            visit = visitDirectory(root, scan_index)
+        except OSError as e:
+            yield SCAN_EVENT_ERROR, order, root, str(e)
+            continue
+        
+        yield 'visit', order, root, visit
+        
+        subdirs = visit['subdirs']
+        for child_index in range(len(subdirs) - 1, -1, -1):
+            stack.append((order + (child_index,), subdirs[child_index]))
+
+def iterParallelVisits(directories, exclusions, stop_event=None, workers=4, scan_index=None):
+    """使用工作窃取线程池并行遍历，返回(事件类型, 遍历顺序键, 目录, 内容)
+
+    每个目录作为一个任务，工作线程优先处理自己队列尾部的任务（深度优先），
+    空闲时从其他线程队列头部窃取任务（通常是较大的子树）。
+    事件队列有容量上限，调用方处理较慢时工作线程会等待。
+    """
+    work_queues = [deque() for _ in range(workers)]
+    pending = {'count': 0}
+    pending_lock = threading.Lock()
+    done_event = threading.Event()
+    closed_event = threading.Event()
+    events = queue.Queue(maxsize=workers * 64)
+    
+    for i, directory in enumerate(directories):
+        work_queues[i % workers].append(((i,), directory))
+        pending['count'] += 1
+    if not pending['count']:
+        done_event.set()
+    
+    def isStopped():
+        return closed_event.is_set() or (stop_event is not None and stop_event.is_set())
+    
+    def takeTask(worker_id):
+        """取出任务，自己的队列为空时从其他线程窃取"""
+        try:
+            return work_queues[worker_id].pop()
+        except IndexError:
+            pass
+        for offset in range(1, workers):
+            try:
+                return work_queues[(worker_id + offset) % workers].popleft()
+            except IndexError:
+                continue
+        return None
+    
+    def finishTask():
+        with pending_lock:
+            pending['count'] -= 1
+            if pending['count'] == 0:
+                done_event.set()
+    
+    def emit(event):
+        """放入事件队列，队列已满时等待调用方处理"""
+        while not isStopped():
+            try:
+                events.put(event, timeout=0.05)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def worker(worker_id):
+        while not done_event.is_set() and not isStopped():
+            task = takeTask(worker_id)
+            if task is None:
+                done_event.wait(0.01)
+                continue
+            order, root = task
+            try:
+                # 检查是否排除该目录
+                if exclusions and shouldExclude(root, exclusions):
+                    emit((SCAN_EVENT_SKIPPED, order, root, 'excluded'))
+                    continue
+                try:
+                    visit = visitDirectory(root, scan_index)
+                except OSError as e:
+                    emit((SCAN_EVENT_ERROR, order, root, str(e)))
+                    continue
+                subdirs = visit['subdirs']
+                with pending_lock:
+                    pending['count'] += len(subdirs)
+                # 倒序入队，使本线程按目录顺序深度优先处理
+                for child_index in range(len(subdirs) - 1, -1, -1):
+                    work_queues[worker_id].append((order + (child_index,), subdirs[child_index]))
+                emit(('visit', order, root, visit))
+            except Exception as e:
+                emit((SCAN_EVENT_ERROR, order, root, str(e)))
+            finally:
+                finishTask()
+    
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    
+    try:
+        while True:
+            try:
+                event = events.get(timeout=0.05)
+            except queue.Empty:
+                if isStopped() or done_event.is_set() or not any(t.is_alive() for t in threads):
+                    if events.empty():
                         break
-                
-                # 获取版本信息
-                version = "未知版本"
-                if chrome_dll:
-                    version = getChromeVersion(chrome_dll)
-                
-                # 计算Chromium文件大小
-                chromium_size = calculateChromeFilesSize(root)
-                
-                # 创建应用信息
-                app_info = {
-                    'name': getAppName(root),
-                    'path': root,
-                    'version': version,
-                    'chrome_dll': chrome_dll,
-                    'size': chromium_size,
-                    'last_scan': time.strftime('%Y-%m-%d %H:%M:%S')
-                }
-                
-                chromium_apps.append(app_info)
+                continue
+            yield event
+    finally:
+        # 调用方提前结束迭代时通知工作线程退出
+        closed_event.set()
+        for thread in threads:
+            thread.join()
+
+def scanDirectory(directory, exclusions, progress_callback=None, stop_event=None, cumulative_progress=None, scan_index=None):
+    """扫描单个目录"""
+    return scanDirectories([directory], exclusions, progress_callback, stop_event, cumulative_progress, 1, scan_index)
+
+def scanDirectories(directories, exclusions, progress_callback=None, stop_event=None, cumulative_progress=None, workers=1, scan_index=None):
+    """扫描多个目录，workers大于1时并行扫描，返回的应用列表与串行扫描的顺序一致"""
+    found_apps = []
+    
+    try:
+        for event in iterScan(directories, exclusions, stop_event, workers, scan_index, cumulative_progress):
+            if event['type'] == SCAN_EVENT_APP:
+                found_apps.append((event['order'], event['app']))
                 
                 # 回调进度
                 if progress_callback:
-                    progress_callback(app_info)
-                
-                # 跳过子目录，因为Chromium应用通常在一个目录中
-                dirs.clear()
-            
-            # 回调扫描进度，包含当前扫描目录和累积进度
-            if progress_callback and cumulative_progress:
-                # 发送进度信息，格式：(current, total, type, current_dir)
-                progress_callback((cumulative_progress['scanned'], cumulative_progress['total'], 'scan', root))
-    except PermissionError:
-        # 忽略权限错误
-        pass
+                    progress_callback(event['app'])
+            elif event['type'] == SCAN_EVENT_PROGRESS:
+                # 回调扫描进度，包含当前扫描目录和累积进度
+                if progress_callback and cumulative_progress:
+                    # 发送进度信息，格式：(current, total, type, current_dir)
+                    progress_callback((event['scanned'], event['total'], 'scan', event['path']))
     except Exception:
         # 忽略其他错误
         pass
     
-    return chromium_apps
+    # 按遍历顺序排序，保证结果与串行扫描一致
+    found_apps.sort(key=lambda item: item[0])
+    return [app_info for _, app_info in found_apps]
+
+def parallelScanDirectories(directories, exclusions, progress_callback=None, stop_event=None, cumulative_progress=None, workers=None, scan_index=None):
+    """使用工作窃取线程池并行扫描多个目录
+
+    回调在调用线程中执行，返回的应用列表与串行扫描的顺序一致。
+    """
+    if workers is None:
+        workers = getScanWorkers()
+    return scanDirectories(directories, exclusions, progress_callback, stop_event, cumulative_progress, max(1, workers), scan_index)
 
-def scanSystem(progress_callback=None, complete_callback=None, stop_event=None):
+def scanSystem(progress_callback=None, complete_callback=None, stop_event=None, exact_total=False, incremental=None):
     """全盘扫描系统"""
+    # 记录扫描开始
+    scan_run = startScanRun('system')
+    scan_start = time.perf_counter()
+    
     # 清空已检测应用列表
     clearDetectedApps()
     
-    # 获取扫描排除列表
-    exclusions = getConfig('scan_exclusions', [])
+    # 获取扫描排除列表，编译为单个匹配器
+    exclusions = compileExclusions(getConfig('scan_exclusions', []))
     
     # 获取所有磁盘分区
     partitions = getDiskPartitions()
     
-    # 计算总文件数
-    total_files = calculateTotalFiles(partitions, exclusions)
-    
     all_chromium_apps = []
     
-    # 初始化累积进度
-    cumulative_progress = {
-        'total': total_files,
-        'scanned': 0
-    }
+    # 初始化累积进度，默认只遍历一遍，总数由上次扫描的记录估算
+    cumulative_progress = createCumulativeProgress(partitions, exclusions, exact_total)
     
-    for i, partition in enumerate(partitions):
-        # 检查是否需要停止扫描
-        if stop_event and stop_event.is_set():
-            break
-        
-        # 扫描当前分区，传递累积进度
-        apps = scanDirectory(partition, exclusions, progress_callback, stop_event, cumulative_progress)
-        all_chromium_apps.extend(apps)
-        
-        # 添加到配置中
-        for app in apps:
+    # 加载增量扫描索引，未变化的目录不再重新列出
+    scan_index = createScanIndex(incremental)
+    
+    workers = getScanWorkers()
+    if workers > 1:
+        # 多个分区和子目录并行扫描
+        all_chromium_apps = parallelScanDirectories(partitions, exclusions, progress_callback, stop_event, cumulative_progress, workers, scan_index)
+        for app in all_chromium_apps:
             addDetectedApp(app)
+    else:
+        for i, partition in enumerate(partitions):
+            # 检查是否需要停止扫描
+            if stop_event and stop_event.is_set():
+                break
+            
+            # 扫描当前分区，传递累积进度
+            apps = scanDirectory(partition, exclusions, progress_callback, stop_event, cumulative_progress, scan_index)
+            all_chromium_apps.extend(apps)
+            
+            # 添加到配置中
+            for app in apps:
+                addDetectedApp(app)
+    
+    # 保存各目录文件数和扫描索引
+    saveScanEstimate(cumulative_progress['counts'])
+    saveScanIndex(scan_index, partitions, not (stop_event and stop_event.is_set()))
+    flushConfig()
+    finishScanRun(scan_run, len(all_chromium_apps), cumulative_progress['scanned'], not (stop_event and stop_event.is_set()))
+    logOperation(
+        'scan', duration=time.perf_counter() - scan_start,
+        outcome='cancelled' if stop_event and stop_event.is_set() else 'success', level='INFO',
+        message=f"system: {len(all_chromium_apps)} apps, {cumulative_progress['scanned']} files"
+    )
     
     # 调用完成回调
     if complete_callback:
@@ -139,44 +675,68 @@ def scanSystem(progress_callback=None, complete_callback=None, stop_event=None):
     
     return all_chromium_apps
 
-def quickScan(progress_callback=None, complete_callback=None, stop_event=None):
-    """快速扫描，只扫描常见应用目录"""
-    # 清空已检测应用列表
-    clearDetectedApps()
-    
-    # 常见应用安装目录
-    common_dirs = [
+def getQuickScanDirectories():
+    """获取快速扫描的常见应用安装目录"""
+    return [
         os.path.join(os.environ.get('ProgramFiles', r'C:\Program Files'), ''),
         os.path.join(os.environ.get('ProgramFiles(x86)', r'C:\Program Files (x86)'), ''),
         os.path.join(os.environ.get('LOCALAPPDATA', r'C:\Users\Default\AppData\Local'), ''),
         os.path.join(os.environ.get('APPDATA', r'C:\Users\Default\AppData\Roaming'), '')
     ]
+
+def quickScan(progress_callback=None, complete_callback=None, stop_event=None, exact_total=False, incremental=None):
+    """快速扫描，只扫描常见应用目录"""
+    # 记录扫描开始
+    scan_run = startScanRun('quick')
+    scan_start = time.perf_counter()
+    
+    # 清空已检测应用列表
+    clearDetectedApps()
     
-    # 计算总文件数
-    total_files = calculateTotalFiles(common_dirs, [])
+    # 常见应用安装目录，只扫描存在的目录
+    common_dirs = getQuickScanDirectories()
+    existing_dirs = [dir_path for dir_path in common_dirs if os.path.exists(dir_path)]
     
     all_chromium_apps = []
     
-    # 初始化累积进度
-    cumulative_progress = {
-        'total': total_files,
-        'scanned': 0
-    }
+    # 初始化累积进度，默认只遍历一遍，总数由上次扫描的记录估算
+    # 估算只包含实际扫描的目录，不存在的目录不会有记录，不能让估算一直不完整
+    cumulative_progress = createCumulativeProgress(existing_dirs, [], exact_total)
     
-    for dir_path in common_dirs:
-        # 检查是否需要停止扫描
-        if stop_event and stop_event.is_set():
-            break
+    # 加载增量扫描索引，未变化的目录不再重新列出
+    scan_index = createScanIndex(incremental)
+    
+    workers = getScanWorkers()
+    if workers > 1:
+        # 多个目录和子目录并行扫描
+        all_chromium_apps = parallelScanDirectories(existing_dirs, [], progress_callback, stop_event, cumulative_progress, workers, scan_index)
+        for app in all_chromium_apps:
+            addDetectedApp(app)
+    else:
+        for dir_path in existing_dirs:
+            # 检查是否需要停止扫描
+            if stop_event and stop_event.is_set():
+                break
             
-        if os.path.exists(dir_path):
             # 扫描当前目录，传递累积进度
-            apps = scanDirectory(dir_path, [], progress_callback, stop_event, cumulative_progress)
+            apps = scanDirectory(dir_path, [], progress_callback, stop_event, cumulative_progress, scan_index)
             all_chromium_apps.extend(apps)
             
             # 添加到配置中
             for app in apps:
                 addDetectedApp(app)
     
+    # 保存各目录文件数和扫描索引
+    saveScanEstimate(cumulative_progress['counts'])
+    saveScanIndex(scan_index, common_dirs, not (stop_event and stop_event.is_set()))
+    flushConfig()
+    finishScanRun(scan_run, len(all_chromium_apps), cumulative_progress['scanned'], not (stop_event and stop_event.is_set()))
+    logOperation(
+        'scan', duration=time.perf_counter() - scan_start,
+        outcome='cancelled' if stop_event and stop_event.is_set() else 'success', level='INFO',
+        message=f"quick: {len(all_chromium_apps)} apps, {cumulative_progress['scanned']} files"
+    )
+    
     # 调用完成回调
     if complete_callback:
         complete_callback(all_chromium_apps)
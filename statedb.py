@@ -0,0 +1,295 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import contextlib
+from utils import getAppDataPath
+
+STATE_DB_FILE_NAME = 'state.db'
+
+# 记录已从config.json导入的设置项
+MIGRATION_MARKER = '_migrated_from_json'
+
+# 应用列表在apps表中的类型
+APP_KINDS = {
+    'detected_apps': 'detected',
+    'redirected_apps': 'redirected'
+}
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS apps (
+    kind TEXT NOT NULL,
+    path_key TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (kind, path_key)
+);
+CREATE INDEX IF NOT EXISTS apps_position ON apps (kind, position);
+CREATE TABLE IF NOT EXISTS redirect_entries (
+    app_key TEXT NOT NULL,
+    file TEXT NOT NULL,
+    source TEXT NOT NULL,
+    target TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    PRIMARY KEY (app_key, file)
+);
+CREATE TABLE IF NOT EXISTS backups (
+    app_key TEXT PRIMARY KEY,
+    backup_path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS scan_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    started TEXT NOT NULL,
+    finished TEXT,
+    apps_found INTEGER NOT NULL DEFAULT 0,
+    files_scanned INTEGER NOT NULL DEFAULT 0,
+    completed INTEGER NOT NULL DEFAULT 0
+);
+'''
+
+# 数据库连接，所有线程共用一个连接，通过锁串行访问
+_state_db = {
+    'connection': None,
+    'lock': threading.RLock()
+}
+
+
+def getStateDbPath():
+    """获取状态数据库路径"""
+    return os.path.join(getAppDataPath(), STATE_DB_FILE_NAME)
+
+
+def isStateDbEnabled():
+    """检查是否启用了SQLite状态数据库：数据库存在，且其中的state_db设置为true"""
+    if not os.path.exists(getStateDbPath()):
+        return False
+    with _state_db['lock']:
+        try:
+            row = getConnection().execute("SELECT value FROM settings WHERE key = 'state_db'").fetchone()
+        except sqlite3.Error:
+            return False
+    return row is not None and json.loads(row[0]) is True
+
+
+def getConnection():
+    """获取数据库连接，首次调用时创建表并启用WAL模式，调用方需持有_state_db['lock']"""
+    if _state_db['connection'] is None:
+        connection = sqlite3.connect(getStateDbPath(), check_same_thread=False, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.executescript(SCHEMA)
+        _state_db['connection'] = connection
+    return _state_db['connection']
+
+
+def closeStateDb():
+    """关闭数据库连接"""
+    with _state_db['lock']:
+        if _state_db['connection'] is not None:
+            _state_db['connection'].close()
+            _state_db['connection'] = None
+
+
+@contextlib.contextmanager
+def stateTransaction():
+    """数据库事务，正常结束时提交，出错时回滚"""
+    with _state_db['lock']:
+        connection = getConnection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+
+def loadState():
+    """从数据库加载配置，返回与config.json相同格式的字典"""
+    with _state_db['lock']:
+        connection = getConnection()
+        config = {}
+        for key, value in connection.execute('SELECT key, value FROM settings'):
+            if key != MIGRATION_MARKER:
+                config[key] = json.loads(value)
+        for config_key, kind in APP_KINDS.items():
+            rows = connection.execute('SELECT data FROM apps WHERE kind = ? ORDER BY position', (kind,))
+            config[config_key] = [json.loads(data) for (data,) in rows]
+        return config
+
+
+def saveState(config, keys, normalize, dirty_apps=None):
+    """在一个事务中保存修改过的配置项，normalize用于生成应用路径的索引键
+
+    dirty_apps为{配置项: 应用路径索引键集合}，只更新或删除这些应用，不影响其他进程写入的应用。
+    """
+    try:
+        with stateTransaction() as connection:
+            for key, path_keys in (dirty_apps or {}).items():
+                if key in keys or key not in APP_KINDS:
+                    continue
+                kind = APP_KINDS[key]
+                apps = {normalize(app.get('path', '')): app for app in config.get(key) or []}
+                for path_key in path_keys:
+                    app = apps.get(path_key)
+                    if app is None:
+                        connection.execute('DELETE FROM apps WHERE kind = ? AND path_key = ?', (kind, path_key))
+                        continue
+                    row = connection.execute(
+                        'SELECT position FROM apps WHERE kind = ? AND path_key = ?', (kind, path_key)).fetchone()
+                    if row is None:
+                        # 新的应用排在最后
+                        row = connection.execute(
+                            'SELECT COALESCE(MAX(position), -1) + 1 FROM apps WHERE kind = ?', (kind,)).fetchone()
+                    connection.execute(
+                        'INSERT OR REPLACE INTO apps (kind, path_key, position, data) VALUES (?, ?, ?, ?)',
+                        (kind, path_key, row[0], json.dumps(app, ensure_ascii=False))
+                    )
+            for key in keys:
+                if key in APP_KINDS:
+                    kind = APP_KINDS[key]
+                    connection.execute('DELETE FROM apps WHERE kind = ?', (kind,))
+                    connection.executemany(
+                        'INSERT OR REPLACE INTO apps (kind, path_key, position, data) VALUES (?, ?, ?, ?)',
+                        [
+                            (kind, normalize(app.get('path', '')), position, json.dumps(app, ensure_ascii=False))
+                            for position, app in enumerate(config.get(key) or [])
+                        ]
+                    )
+                elif key in config:
+                    connection.execute(
+                        'INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)',
+                        (key, json.dumps(config[key], ensure_ascii=False))
+                    )
+                else:
+                    connection.execute('DELETE FROM settings WHERE key = ?', (key,))
+        return True
+    except Exception:
+        return False
+
+
+def removeStateDb():
+    """关闭连接并删除数据库文件，之后重新使用config.json"""
+    with _state_db['lock']:
+        closeStateDb()
+        for suffix in ('', '-wal', '-shm'):
+            path = getStateDbPath() + suffix
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def migrateFromJson(config, normalize):
+    """将config.json中的配置一次性导入数据库，已经导入过时不再导入
+
+    返回数据库中是否有导入的配置。导入失败时删除数据库，继续使用config.json。
+    停用后未能删除的数据库已经过时，先删除再重新导入。
+    """
+    with _state_db['lock']:
+        try:
+            connection = getConnection()
+            if connection.execute("SELECT 1 FROM settings WHERE key = ?", (MIGRATION_MARKER,)).fetchone():
+                if isStateDbEnabled():
+                    return True
+                removeStateDb()
+        except sqlite3.Error:
+            removeStateDb()
+            return False
+        except OSError:
+            return False
+        config = dict(config)
+        config[MIGRATION_MARKER] = time.strftime('%Y-%m-%d %H:%M:%S')
+        if saveState(config, list(config), normalize):
+            return True
+        removeStateDb()
+        return False
+
+
+def replaceRedirectEntries(app_key, entries):
+    """保存应用的逐文件重定向记录，entries为[{'file', 'source', 'target', 'mode'}]"""
+    try:
+        with stateTransaction() as connection:
+            connection.execute('DELETE FROM redirect_entries WHERE app_key = ?', (app_key,))
+            connection.executemany(
+                'INSERT INTO redirect_entries (app_key, file, source, target, mode) VALUES (?, ?, ?, ?, ?)',
+                [(app_key, entry['file'], entry['source'], entry['target'], entry['mode']) for entry in entries]
+            )
+        return True
+    except Exception:
+        return False
+
+
+def getRedirectEntries(app_key):
+    """获取应用的逐文件重定向记录"""
+    with _state_db['lock']:
+        rows = getConnection().execute(
+            'SELECT file, source, target, mode FROM redirect_entries WHERE app_key = ? ORDER BY file', (app_key,))
+        return [{'file': file, 'source': source, 'target': target, 'mode': mode} for file, source, target, mode in rows]
+
+
+def recordBackup(app_key, backup_path, size):
+    """记录应用的备份"""
+    try:
+        with stateTransaction() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO backups (app_key, backup_path, size, created) VALUES (?, ?, ?, ?)',
+                (app_key, backup_path, size, time.strftime('%Y-%m-%d %H:%M:%S'))
+            )
+        return True
+    except Exception:
+        return False
+
+
+def removeBackupRecord(app_key):
+    """删除应用的备份记录"""
+    try:
+        with stateTransaction() as connection:
+            connection.execute('DELETE FROM backups WHERE app_key = ?', (app_key,))
+        return True
+    except Exception:
+        return False
+
+
+def getBackupRecords():
+    """获取所有备份记录"""
+    with _state_db['lock']:
+        rows = getConnection().execute('SELECT app_key, backup_path, size, created FROM backups ORDER BY app_key')
+        return [
+            {'app_key': app_key, 'backup_path': backup_path, 'size': size, 'created': created}
+            for app_key, backup_path, size, created in rows
+        ]
+
+
+def startScanRun(kind):
+    """记录扫描开始，返回扫描记录ID"""
+    try:
+        with stateTransaction() as connection:
+            cursor = connection.execute(
+                'INSERT INTO scan_runs (kind, started) VALUES (?, ?)',
+                (kind, time.strftime('%Y-%m-%d %H:%M:%S'))
+            )
+            return cursor.lastrowid
+    except Exception:
+        return None
+
+
+def finishScanRun(run_id, apps_found, files_scanned, completed):
+    """记录扫描结束"""
+    if run_id is None:
+        return False
+    try:
+        with stateTransaction() as connection:
+            connection.execute(
+                'UPDATE scan_runs SET finished = ?, apps_found = ?, files_scanned = ?, completed = ? WHERE id = ?',
+                (time.strftime('%Y-%m-%d %H:%M:%S'), apps_found, files_scanned, 1 if completed else 0, run_id)
+            )
+        return True
+    except Exception:
+        return False
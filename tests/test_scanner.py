@@ -0,0 +1,22 @@
+from scanner import shouldExclude
+
+
+def test_root_exclusion_matches_drive_letter_path():
+    exclusions = ['\\Windows']
+    assert shouldExclude('C:\\Windows', exclusions)
+    assert shouldExclude('C:\\Windows\\System32', exclusions)
+    assert shouldExclude('\\Windows\\System32', exclusions)
+    assert not shouldExclude('C:\\Users\\Windows', exclusions)
+    assert not shouldExclude('C:\\WindowsApps', exclusions)
+
+
+def test_drive_exclusion_matches_prefix():
+    exclusions = ['C:\\Windows']
+    assert shouldExclude('C:\\Windows\\System32', exclusions)
+    assert not shouldExclude('D:\\Windows', exclusions)
+
+
+def test_relative_exclusion_matches_any_segment():
+    exclusions = ['AppData\\Local\\Temp']
+    assert shouldExclude('C:\\Users\\a\\AppData\\Local\\Temp\\x', exclusions)
+    assert not shouldExclude('C:\\Users\\a\\AppData\\Local\\Temp2', exclusions)
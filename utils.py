@@ -1,9 +1,11 @@
 import os
 import appdirs
+from peinfo import getPEInfo
+from kernelfiles import hasFeatureName
 
 def getAppDataPath():
-    """获取应用数据目录"""
-    config_dir = appdirs.user_data_dir("ChromiumTo", "ZhuxiaoGroup")
+    """获取应用数据目录，可以通过环境变量CHROMIUMTO_DATA_DIR指定"""
+    config_dir = os.environ.get('CHROMIUMTO_DATA_DIR') or appdirs.user_data_dir("ChromiumTo", "ZhuxiaoGroup")
     os.makedirs(config_dir, exist_ok=True)
     return config_dir
 
@@ -20,26 +22,9 @@ def getDiskPartitions():
             partitions.append(path)
     return partitions
 
-def isChromiumApp(path):
-    """检查是否为Chromium应用"""
-    # 常见的Chromium应用特征文件
-    chromium_features = [
-        'chrome.dll',
-        'chrome.exe',
-        'msedge.dll',
-        'msedge.exe',
-        'brave.exe',
-        'brave.dll',
-        'chrome_elf.dll',
-        'widevinecdmadapter.dll'
-    ]
-    
-    # 检查目录下是否存在Chromium特征文件
-    for feature in chromium_features:
-        if os.path.exists(os.path.join(path, feature)):
-            return True
-    
-    return False
+def isChromiumFileList(names):
+    """根据已列出的目录项名称检查是否为Chromium应用，不再访问磁盘"""
+    return hasFeatureName(names)
 
 def getAppName(path):
     """从路径中提取应用名称"""
@@ -47,6 +32,11 @@ def getAppName(path):
 
 def getChromeVersion(dll_path):
     """获取Chrome DLL版本信息"""
+    # 优先直接解析PE文件的版本资源，不依赖pywin32
+    info = getPEInfo(dll_path)
+    if info and info['file_version']:
+        return info['file_version']
+    
     try:
         import win32api
         info = win32api.GetFileVersionInfo(dll_path, '\\')
@@ -59,6 +49,13 @@ def getChromeVersion(dll_path):
     except Exception:
         return "未知版本"
 
+def getChromeArchitecture(dll_path):
+    """获取Chrome DLL的架构（x86/x64/arm64），无法获取时返回None"""
+    info = getPEInfo(dll_path)
+    if info:
+        return info['machine']
+    return None
+
 def calculateDirectorySize(path):
     """计算目录大小"""
     total_size = 0
@@ -72,66 +69,6 @@ def calculateDirectorySize(path):
         pass
     return total_size
 
-def calculateChromeFilesSize(path):
-    """计算Chrome相关文件的大小"""
-    # 常见的Chromium应用核心文件
-    chrome_files = [
-        'chrome.dll',
-        'chrome.exe',
-        'chrome_elf.dll',
-        'widevinecdmadapter.dll',
-        'msedge.dll',
-        'msedge.exe',
-        'brave.dll',
-        'brave.exe',
-        'chrome_child.dll',
-        'msedge_child.dll',
-        'brave_child.dll',
-        'icudtl.dat',
-        'libEGL.dll',
-        'libGLESv2.dll',
-        'natives_blob.bin',
-        'snapshot_blob.bin',
-        'v8_context_snapshot.bin'
-    ]
-    
-    total_size = 0
-    for file in chrome_files:
-        file_path = os.path.join(path, file)
-        if os.path.exists(file_path):
-            total_size += os.path.getsize(file_path)
-    return total_size
-
-def getChromiumFiles(path):
-    """获取Chromium相关文件列表"""
-    chrome_files = [
-        'chrome.dll',
-        'chrome.exe',
-        'chrome_elf.dll',
-        'widevinecdmadapter.dll',
-        'msedge.dll',
-        'msedge.exe',
-        'brave.dll',
-        'brave.exe',
-        'chrome_child.dll',
-        'msedge_child.dll',
-        'brave_child.dll',
-        'icudtl.dat',
-        'libEGL.dll',
-        'libGLESv2.dll',
-        'natives_blob.bin',
-        'snapshot_blob.bin',
-        'v8_context_snapshot.bin'
-    ]
-    
-    found_files = []
-    for file in chrome_files:
-        file_path = os.path.join(path, file)
-        if os.path.exists(file_path):
-            found_files.append(file)
-    
-    return found_files
-
 def formatFileSize(size_bytes):
     """格式化文件大小"""
     if size_bytes == 0: